@@ -0,0 +1,190 @@
+"""
+This module contains the deterministic in-process stand-ins of the OpenAI models used by the benchmarks.
+
+The stand-ins emulate the latency, the token throughput and the error rate of the API without the network.
+The recognizer stand-in returns one task per speaker turn of the transcript,
+the paraphraser stand-in returns one story per prompt, both derived from the input text only.
+"""
+
+import asyncio
+import dataclasses
+import random
+import re as regex
+import threading
+import time
+from typing import AsyncIterator, Iterator
+
+from openai import error as openai_error
+from openai.openai_object import OpenAIObject
+
+from scrumit.transcript import estimate_tokens
+
+STREAM_PIECE_CHARS = 64
+
+
+@dataclasses.dataclass(frozen=True)
+class Call:
+    """
+    This class contains a single call of the stand-in.
+    """
+
+    kind: str
+    duration: float
+    prompt_tokens: int
+    completion_tokens: int
+    failed: bool
+
+
+class _Encoder:
+    def encode(self, text: str) -> list[int]:
+        return [0] * estimate_tokens(text)
+
+
+class FakeAPI:
+    """
+    This class emulates the completion API shared by the recognizer and the paraphraser stand-ins.
+    """
+
+    def __init__(
+        self, latency: float = 0.05, tokens_per_second: float = 20_000, error_rate: float = 0.0, seed: int = 0
+    ):
+        """
+        This method initializes the stand-in.
+
+        :param latency: The latency of every call in seconds (time to the first token).
+        :param tokens_per_second: The completion throughput of a call.
+        :param error_rate: The probability of a call failing with the rate limit error.
+        :param seed: The seed of the errors.
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.calls: list[Call] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.model = FakeModel(self)
+        self.recognizer_completion = FakeCompletion(self, "recognizer", recognize)
+        self.completion = FakeCompletion(self, "paraphraser", paraphrase)
+
+    def reset(self):
+        """
+        This method forgets the recorded calls.
+        """
+        with self._lock:
+            self.calls.clear()
+
+    def respond(self, kind: str, prompts: list[str], complete) -> tuple[list[str], float, dict]:
+        """
+        This method completes the prompts and records the call.
+
+        :param kind: The kind of the call (recognizer or paraphraser).
+        :param prompts: The prompts.
+        :param complete: The function completing a single prompt.
+        :return: The completions, the emulated duration of the call in seconds and the token usage.
+        :raises openai.error.RateLimitError: If the call is drawn to fail.
+        """
+        texts = [complete(prompt) for prompt in prompts]
+        prompt_tokens = sum(estimate_tokens(prompt) for prompt in prompts)
+        completion_tokens = sum(estimate_tokens(text) for text in texts)
+        duration = self.latency + completion_tokens / self.tokens_per_second
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            self.calls.append(Call(kind, duration, prompt_tokens, completion_tokens, failed))
+        if failed:
+            raise openai_error.RateLimitError("Rate limit reached (emulated).", headers={"retry-after": "0"})
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return texts, duration, usage
+
+
+def recognize(prompt: str) -> str:
+    """
+    This function returns the NER completion of the prompt: one task per speaker turn of its passage.
+    """
+    passage = prompt.rsplit("Input:", 1)[-1].rsplit("Output:", 1)[0]
+    tasks = [
+        "{'Task': '%s', 'Persona': 'user', 'Deadline': 'none'}" % regex.sub(r"[^\w ,.]", "", line.strip())[:80]
+        for line in passage.splitlines()
+        if line.strip()
+    ]
+    return "[" + ", ".join(tasks) + "]"
+
+
+def paraphrase(prompt: str) -> str:
+    """
+    This function returns the user story of the prompt.
+    """
+    text = prompt.rsplit('"', 2)[-2] if prompt.count('"') >= 2 else prompt
+    return f" As a user I want {text.strip()[:80].lower()} so that it works."
+
+
+class FakeModel:
+    """
+    This class stands in for the Promptify OpenAI model used by the recognizer.
+    """
+
+    def __init__(self, api: FakeAPI):
+        self.api = api
+        self.encoder = _Encoder()
+
+    def run(self, prompts: list[str], model_name: str = None, temperature: float = 0.7, max_tokens: int = 4000):
+        texts, duration, usage = self.api.respond("recognizer", prompts, recognize)
+        time.sleep(duration)
+        return [{**usage, "text": text} for text in texts]
+
+
+class FakeCompletion:
+    """
+    This class stands in for the openai.Completion client.
+    """
+
+    def __init__(self, api: FakeAPI, kind: str, complete):
+        self.api = api
+        self.kind = kind
+        self.complete = complete
+
+    def create(self, prompt: str | list[str], n: int = 1, stream: bool = False, **kwargs):
+        prompts = prompt if isinstance(prompt, list) else [prompt]
+        texts, duration, usage = self.api.respond(self.kind, prompts, self.complete)
+        if stream:
+            return self.stream(texts[0], duration)
+        time.sleep(duration)
+        return self.response(texts, n, usage)
+
+    async def acreate(self, prompt: str | list[str], n: int = 1, stream: bool = False, **kwargs):
+        prompts = prompt if isinstance(prompt, list) else [prompt]
+        texts, duration, usage = self.api.respond(self.kind, prompts, self.complete)
+        if stream:
+            return self.astream(texts[0], duration)
+        await asyncio.sleep(duration)
+        return self.response(texts, n, usage)
+
+    def stream(self, text: str, duration: float) -> Iterator[OpenAIObject]:
+        time.sleep(self.api.latency)
+        for piece, delay in self.pieces(text, duration):
+            time.sleep(delay)
+            yield OpenAIObject.construct_from({"choices": [{"index": 0, "text": piece}]})
+
+    async def astream(self, text: str, duration: float) -> AsyncIterator[OpenAIObject]:
+        await asyncio.sleep(self.api.latency)
+        for piece, delay in self.pieces(text, duration):
+            await asyncio.sleep(delay)
+            yield OpenAIObject.construct_from({"choices": [{"index": 0, "text": piece}]})
+
+    def pieces(self, text: str, duration: float) -> list[tuple[str, float]]:
+        """
+        This method splits the completion to the streamed pieces with their share of the generation time.
+        """
+        size = STREAM_PIECE_CHARS
+        delay = (duration - self.api.latency) * size / max(1, len(text))
+        return [(text[start : start + size], delay) for start in range(0, len(text), size)]
+
+    @staticmethod
+    def response(texts: list[str], n: int, usage: dict) -> OpenAIObject:
+        choices = [
+            {"index": index * n + sample, "text": text} for index, text in enumerate(texts) for sample in range(n)
+        ]
+        return OpenAIObject.construct_from({"choices": choices, "usage": usage})
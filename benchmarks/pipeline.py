@@ -0,0 +1,175 @@
+"""
+This module contains the offline benchmark of the whole conversion pipeline.
+
+The Scrumer with the OpenAI backends converts conversation.sample repeated up to 100 times,
+the models are replaced by the in-process stand-ins of the benchmarks.fake module (no network).
+It reports the throughput, the latency percentiles of the conversions and of the model calls,
+the prompt tokens sent to the models and the peak traced memory for every transcript size
+(and the instrumentation of the last conversion per stage with --stages).
+
+Run it with `python -m benchmarks.pipeline [--help]`.
+"""
+
+import argparse
+import asyncio
+import math
+import time
+import tracemalloc
+
+from promptify import Prompter
+
+from benchmarks.fake import Call, FakeAPI
+from scrumit.config import BASE_DIR
+from scrumit.dedup import TaskDeduplicator
+from scrumit.entity.scrumit import Input, Output
+from scrumit.paraphraser.backends import ParaphraserOpenAI
+from scrumit.ratelimit import RateLimiter
+from scrumit.recognizer.backends import RecognizerOpenAI
+from scrumit.recognizer.prefilter import PrefilterRecognizer
+from scrumit.recognizer.streaming import StreamingRecognizer
+from scrumit.scrumer import Scrumer
+
+SAMPLE = BASE_DIR.parent / "conversation.sample"
+SCALES = (1, 10, 100)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    This function returns the q-th percentile of the values (nearest rank).
+
+    :param values: The values.
+    :param q: The percentile (0-100).
+    :return: The percentile or NaN if there are no values.
+    """
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def describe(name: str, values: list[float]) -> str:
+    """
+    This function formats the latency percentiles of the values in milliseconds.
+    """
+    p50, p95, p99 = (percentile(values, q) * 1000 for q in (50, 95, 99))
+    return f"{name} p50/p95/p99 {p50:.0f}/{p95:.0f}/{p99:.0f} ms"
+
+
+def build_scrumer(api: FakeAPI, args: argparse.Namespace) -> Scrumer:
+    """
+    This function builds the scrumer with the OpenAI backends talking to the stand-in.
+    """
+    # the limiter only retries the emulated errors, the quota of the stand-in is unlimited
+    limiter = (
+        RateLimiter(requests_per_minute=10**9, tokens_per_minute=10**12, max_retries=10, base_delay=0.01)
+        if args.error_rate
+        else None
+    )
+    recognizer = RecognizerOpenAI(
+        api.model,
+        Prompter(api.model),
+        limiter=limiter,
+        client=api.recognizer_completion,
+        max_examples=args.max_examples,
+    )
+    if args.window_tokens:
+        recognizer = StreamingRecognizer(recognizer, window_tokens=args.window_tokens, max_workers=args.workers)
+    if args.prefilter is not None:
+        recognizer = PrefilterRecognizer(recognizer, threshold=args.prefilter)
+    paraphraser = ParaphraserOpenAI(
+        api.completion, limiter=limiter, max_examples=args.max_examples, candidates=args.candidates
+    )
+    deduplicator = TaskDeduplicator(args.dedup) if args.dedup is not None else None
+    return Scrumer(recognizer, paraphraser, max_workers=args.workers, fail_fast=False, deduplicator=deduplicator)
+
+
+def convert(scrumer: Scrumer, inp: Input, use_asyncio: bool) -> Output:
+    """
+    This function converts the input with the sync or the asyncio pipeline.
+    """
+    if not use_asyncio:
+        return scrumer.convert(inp)
+
+    async def aconvert() -> Output:
+        try:
+            return await scrumer.aconvert(inp)
+        finally:
+            await scrumer.aclose()
+
+    return asyncio.run(aconvert())
+
+
+def run(scale: int, args: argparse.Namespace) -> str:
+    """
+    This function benchmarks the conversion of the sample repeated scale times.
+
+    :param scale: The number of the repetitions of the sample in the transcript.
+    :param args: The options of the benchmark.
+    :return: The report line.
+    """
+    text = "\n\n".join([SAMPLE.read_text()] * scale)
+    api = FakeAPI(args.latency, args.tokens_per_second, args.error_rate, args.seed)
+    scrumer = build_scrumer(api, args)
+    inp = Input(text=text, domain="software")
+
+    latencies: list[float] = []
+    stories = failures = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        output = convert(scrumer, inp, args.asyncio)
+        latencies.append(time.perf_counter() - start)
+        stories += len(output.stories)
+        failures += len(output.failures)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    calls: dict[str, list[Call]] = {"recognizer": [], "paraphraser": []}
+    for call in api.calls:
+        calls[call.kind].append(call)
+    report = (
+        f"x{scale} ({len(text)} chars): {args.repeats / elapsed:.2f} transcripts/s, {stories / elapsed:.1f} stories/s, "
+        f"{describe('convert', latencies)}, "
+        + ", ".join(
+            f"{describe(kind, [call.duration for call in kind_calls])} over {len(kind_calls)} calls "
+            f"({sum(call.prompt_tokens for call in kind_calls) // args.repeats} prompt tokens per transcript)"
+            for kind, kind_calls in calls.items()
+        )
+        + f", {stories // args.repeats} stories, {failures // args.repeats} failures per transcript, "
+        f"{sum(call.failed for call in api.calls)} model errors, peak traced memory {peak / 2**20:.1f} MiB"
+    )
+    if args.stages:
+        report += "".join(f"\n  {name}: {stats}" for name, stats in sorted(output.stages.items()))
+    return report
+
+
+def main():
+    """
+    This method is the entry point for the script.
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES, help="Repetitions of the sample")
+    parser.add_argument("--repeats", type=int, default=3, help="Conversions per transcript size")
+    parser.add_argument("--workers", type=int, default=4, help="Scrumer (and windows) workers")
+    parser.add_argument("--window-tokens", type=int, default=None, help="Recognize in windows of this many tokens")
+    parser.add_argument("--max-examples", type=int, default=None, help="Most relevant examples per prompt")
+    parser.add_argument("--prefilter", type=float, default=None, help="Forward only the turns scoring this much")
+    parser.add_argument("--dedup", type=float, default=None, help="Merge the tasks this similar before paraphrasing")
+    parser.add_argument("--candidates", type=int, default=1, help="Story candidates reranked per task")
+    parser.add_argument("--asyncio", action="store_true", help="Benchmark the asyncio pipeline")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latency of a model call in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=20_000, help="Completion throughput of a call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a rate limit error")
+    parser.add_argument("--stages", action="store_true", help="Report the stages of the last conversion")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the errors")
+    args = parser.parse_args()
+
+    for scale in args.scales:
+        print(run(scale, args), flush=True)
+
+
+if __name__ == "__main__":
+    main()
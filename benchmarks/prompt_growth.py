@@ -0,0 +1,101 @@
+"""
+This module contains the regression benchmark for the prompt size of the OpenAI backends.
+
+The prompts (and the memory of the backends) must stay flat no matter how many calls were made.
+Run it with `python -m benchmarks.prompt_growth [calls]`, it exits with non-zero status on regression.
+The memory tolerance absorbs the allocator noise (e.g. of jinja rendering the templates),
+a leaked example set grows by kilobytes per call.
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from promptify import Prompter
+
+from scrumit.config import BASE_DIR, settings
+from scrumit.entity.paraphraser import ParaphraserExample, ParaphraserInput
+from scrumit.entity.recognizer import RecognizerExample, RecognizerInput
+from scrumit.paraphraser.backends import ParaphraserOpenAI
+from scrumit.recognizer.backends import RecognizerOpenAI
+
+CALLS = 10_000
+WARMUP = 100
+MEMORY_TOLERANCE = 1024 * 1024
+
+
+class _Model:
+    """
+    Model stand-in, the prompts are built without calling it.
+    """
+
+    def run(self, prompts: list[str], **kwargs) -> list[dict]:
+        return [{"text": ""} for _ in prompts]
+
+
+def _traced_memory() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def measure(build_prompt, calls: int) -> tuple[int, int, int, int]:
+    """
+    This function builds the prompt the given number of times.
+
+    :param build_prompt: Callable returning the prompt of a single call.
+    :param calls: The number of calls.
+    :return: The prompt length and traced memory after the warmup and after the last call.
+    """
+    for _ in range(WARMUP):
+        build_prompt()
+    tracemalloc.start()
+    first_length = len(build_prompt())
+    first_memory = _traced_memory()
+    for _ in range(calls - WARMUP - 2):
+        build_prompt()
+    last_length = len(build_prompt())
+    last_memory = _traced_memory()
+    tracemalloc.stop()
+    return first_length, last_length, first_memory, last_memory
+
+
+def main():
+    """
+    This method is the entry point for the script.
+    """
+
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else CALLS
+
+    settings.paraphraser_examples_json = str(BASE_DIR.parent / "sample_paraphraser_examples.json")
+    settings.recognizer_examples_json = str(BASE_DIR.parent / "sample_recognizer_examples.json")
+
+    paraphraser = ParaphraserOpenAI(
+        client=None,
+        include_global_examples=True,
+        examples=[ParaphraserExample(original_text="Fix login.", paraphrased_text="As a user I want to log in")],
+    )
+    paraphraser_input = ParaphraserInput(text="The metrics should be calculated correctly.")
+    recognizer = RecognizerOpenAI(
+        _Model(),
+        Prompter(_Model()),
+        examples=[RecognizerExample(task="Fix login", raw="The login is broken, please fix it.")],
+    )
+    recognizer_input = RecognizerInput(text="The login is broken, please fix it by Friday.", domain="software")
+
+    regressions = 0
+    for name, build_prompt in [
+        ("paraphraser", lambda: paraphraser.get_request(paraphraser_input)["prompt"]),
+        ("recognizer", lambda: recognizer.get_prompt(recognizer_input)),
+    ]:
+        first_length, last_length, first_memory, last_memory = measure(build_prompt, calls)
+        flat = first_length == last_length and last_memory - first_memory < MEMORY_TOLERANCE
+        regressions += not flat
+        print(
+            f"{name}: {calls} calls, prompt length {first_length} -> {last_length} chars, "
+            f"traced memory {first_memory} -> {last_memory} bytes [{'ok' if flat else 'REGRESSION'}]"
+        )
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+This module contains the regression benchmark for the startup time of the CLI.
+
+Each command is run in a fresh interpreter several times, the median wall time is reported.
+Importing the CLI must not load the backends dependencies (they are imported by the commands that need them).
+Run it with `python -m benchmarks.startup [--max-ms MS]`, it exits with non-zero status on regression.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ["openai", "promptify", "pandas", "numpy", "aiohttp", "scrumit.recognizer.backends.openai"]
+COMMANDS = {
+    "import scrumit.cmd": [sys.executable, "-c", "import scrumit.cmd"],
+    "scrumit --help": [sys.executable, "-m", "scrumit.cmd", "--help"],
+    "scrumit-batch --help": [sys.executable, "-c", "from scrumit.cmd import batch_app; batch_app()", "--help"],
+}
+MAX_MS = 300
+
+
+def measure(command: list[str], repeats: int) -> float:
+    """
+    This function returns the median wall time of the command in milliseconds.
+    """
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        durations.append((time.perf_counter() - started) * 1000)
+    return statistics.median(durations)
+
+
+def loaded_heavy_modules() -> list[str]:
+    """
+    This function returns the heavy modules loaded by importing the CLI.
+    """
+    probe = f"import sys, scrumit.cmd; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    return subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True).stdout.split()
+
+
+def main():
+    """
+    This method is the entry point for the script.
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per command")
+    parser.add_argument("--max-ms", type=float, default=MAX_MS, help="Budget of the median startup time")
+    args = parser.parse_args()
+
+    regressions = 0
+    baseline = measure([sys.executable, "-c", "pass"], args.repeats)
+    print(f"interpreter: {baseline:.0f} ms")
+    for name, command in COMMANDS.items():
+        duration = measure(command, args.repeats)
+        fast = duration <= args.max_ms
+        regressions += not fast
+        print(f"{name}: {duration:.0f} ms [{'ok' if fast else 'REGRESSION'}]")
+
+    heavy = loaded_heavy_modules()
+    regressions += bool(heavy)
+    print(f"heavy modules loaded by the CLI: {', '.join(heavy) or 'none'} [{'REGRESSION' if heavy else 'ok'}]")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+This module contains the asyncio helpers shared by the OpenAI backends.
+"""
+
+import contextlib
+from typing import Iterator
+
+import aiohttp
+import openai
+
+
+class OpenAISession:
+    """
+    This class holds the aiohttp session the OpenAI async calls are made with.
+
+    Without a bound session the OpenAI client opens (and closes) a new session for every call,
+    so no connection is ever reused.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession = None):
+        """
+        This method initializes the session holder.
+
+        :param session: The aiohttp session to use.
+        If not provided, one is created on the first call and owned (closed) by the holder.
+        """
+        self._session = session
+        self._owned = session is None
+
+    def get(self) -> aiohttp.ClientSession:
+        """
+        This method returns the held session, creating it if needed.
+        Must be called from within the running event loop.
+        """
+        if self._session is None or (self._owned and self._session.closed):
+            self._session = aiohttp.ClientSession()
+            self._owned = True
+        return self._session
+
+    @contextlib.contextmanager
+    def bind(self) -> Iterator[aiohttp.ClientSession]:
+        """
+        This method binds the held session to the OpenAI client for the current context.
+        """
+        session = self.get()
+        token = openai.aiosession.set(session)
+        try:
+            yield session
+        finally:
+            openai.aiosession.reset(token)
+
+    async def close(self):
+        """
+        This method closes the held session if it is owned by the holder.
+        """
+        if self._owned and self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._owned:
+            self._session = None
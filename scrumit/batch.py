@@ -0,0 +1,304 @@
+"""
+This module contains the batch mode of the scrumit application.
+
+Many transcripts (a directory, a glob pattern or a JSONL manifest) are converted with one set of backends,
+several at a time. Every transcript gets its own output file and the transcripts whose output already exists
+are skipped, so an interrupted batch is resumed by running it again.
+
+The local stages (parsing, deduplication, example selection, pre-filtering) hold the GIL, so a large batch
+can be sharded across worker processes, each with its own set of backends built (and warmed up) once.
+"""
+
+import dataclasses
+import glob
+import io
+import multiprocessing
+import os
+from concurrent import futures
+from typing import Callable, Iterable, Iterator, TextIO
+
+from scrumit import instrumentation
+from scrumit.entity import batch as batch_entities, scrumit as entities
+from scrumit.scrumer import base
+
+OUTPUT_SUFFIX = ".txt"
+PARTIAL_SUFFIX = ".partial"
+
+
+@dataclasses.dataclass(frozen=True)
+class Job:
+    """
+    This class contains a single transcript of the batch.
+    """
+
+    name: str
+    domain: str
+    source: str = None
+    text: str = None
+
+    def open(self) -> TextIO:
+        """
+        This method opens the transcript for reading.
+        """
+        return open(self.source) if self.source is not None else io.StringIO(self.text)
+
+    def output_path(self, output_dir: str) -> str:
+        """
+        This method returns the path to the output file of the transcript.
+        """
+        return os.path.join(output_dir, self.name + OUTPUT_SUFFIX)
+
+
+@dataclasses.dataclass(frozen=True)
+class Result:
+    """
+    This class contains the result of a single transcript of the batch.
+    """
+
+    job: Job
+    stories: int = 0
+    failures: list[entities.TaskFailure] = dataclasses.field(default_factory=list)
+    skipped: bool = False
+    error: str = None
+
+    def to_record(self) -> tuple:
+        """
+        This method returns the result as a compact record of plain values (sent between the processes).
+        """
+        failures = [(failure.task, failure.reason) for failure in self.failures]
+        return self.job.name, self.stories, failures, self.skipped, self.error
+
+    @classmethod
+    def from_record(cls, job: Job, record: tuple) -> "Result":
+        """
+        This method returns the result of the job from its record.
+        """
+        _, stories, failures, skipped, error = record
+        failures = [entities.TaskFailure(task=task, reason=reason) for task, reason in failures]
+        return cls(job=job, stories=stories, failures=failures, skipped=skipped, error=error)
+
+
+def discover(path: str, domain: str = None) -> list[Job]:
+    """
+    This function finds the transcripts of the batch.
+
+    :param path: A directory (its files), a glob pattern or a JSONL manifest (a BatchItem per line).
+    :param domain: Domain of the transcripts (the manifest items may override it).
+    :return: The transcripts sorted by path (or in the order of the manifest).
+    """
+    if os.path.isfile(path) and path.endswith(".jsonl"):
+        jobs = read_manifest(path, domain)
+    else:
+        if os.path.isdir(path):
+            sources = (entry.path for entry in os.scandir(path) if not entry.name.startswith("."))
+        else:
+            sources = glob.iglob(path, recursive=True)
+        jobs = [
+            Job(name=os.path.splitext(os.path.basename(source))[0], domain=domain, source=source)
+            for source in sorted(sources)
+            if os.path.isfile(source)
+        ]
+    _check_jobs(jobs)
+    return jobs
+
+
+def read_manifest(path: str, domain: str = None) -> list[Job]:
+    """
+    This function reads the JSONL manifest of the batch.
+
+    :param path: Path to the manifest.
+    :param domain: Domain of the items that do not provide their own.
+    :return: The transcripts in the order of the manifest.
+    """
+    root = os.path.dirname(os.path.abspath(path))
+    jobs: list[Job] = []
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            item = batch_entities.BatchItem.parse_raw(line)
+            source = os.path.join(root, item.source) if item.source is not None else None
+            jobs.append(Job(name=item.id, domain=item.domain or domain, source=source, text=item.text))
+    return jobs
+
+
+def _check_jobs(jobs: list[Job]):
+    names: set[str] = set()
+    for job in jobs:
+        if not job.domain:
+            raise ValueError(f"No domain provided for the transcript {job.name}")
+        if job.name in names:
+            raise ValueError(f"Several transcripts share the output name {job.name}")
+        names.add(job.name)
+
+
+def write_stories(stories: Iterable[base.StreamItem], file: TextIO) -> tuple[int, list[entities.TaskFailure]]:
+    """
+    This function appends the user stories to the output file as they arrive.
+
+    :param stories: The user stories (and the task failures).
+    :param file: The output file.
+    :return: The number of the written stories and the task failures.
+    """
+    index = 0
+    failures: list[entities.TaskFailure] = []
+    for item in stories:
+        if isinstance(item, entities.TaskFailure):
+            failures.append(item)
+            continue
+        index += 1
+        file.write(f"{index}) {item.story}\n")
+        file.flush()
+    return index, failures
+
+
+def convert_job(scrumer: base.ScrumerBase, job: Job, output_dir: str, ordered: bool = False) -> Result:
+    """
+    This function converts a single transcript of the batch.
+
+    The stories are written to a partial file renamed to the output once the transcript is done,
+    so a failed or interrupted transcript is converted again on the next run.
+    Any error of the transcript is its result, so it does not abort the rest of the batch.
+
+    :param scrumer: The scrumer shared by the batch.
+    :param job: The transcript.
+    :param output_dir: The directory of the output files.
+    :param ordered: Whether to write the stories in the order of the recognized tasks.
+    :return: The result of the transcript.
+    """
+    path = job.output_path(output_dir)
+    partial = path + PARTIAL_SUFFIX
+    try:
+        with job.open() as transcript, open(partial, "w") as file:
+            inp = entities.Input(text="", domain=job.domain)
+            stories, failures = write_stories(scrumer.convert_stream(inp, ordered=ordered, lines=transcript), file)
+        os.replace(partial, path)
+    except Exception as e:
+        if os.path.exists(partial):
+            os.remove(partial)
+        return Result(job=job, error=getattr(e, "message", None) or str(e) or type(e).__name__)
+    return Result(job=job, stories=stories, failures=failures)
+
+
+def run_batch(
+    scrumer: base.ScrumerBase, jobs: Iterable[Job], output_dir: str, workers: int = 1, ordered: bool = False
+) -> Iterator[Result]:
+    """
+    This function converts the transcripts of the batch, at most workers of them concurrently.
+
+    The transcripts whose output already exists are skipped.
+
+    :param scrumer: The scrumer shared by all the transcripts.
+    :param jobs: The transcripts.
+    :param output_dir: The directory of the output files (created if missing).
+    :param workers: The maximum number of transcripts converted concurrently.
+    :param ordered: Whether to write the stories in the order of the recognized tasks.
+    :return: The results of the transcripts (the skipped ones first, then as they are done).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending: list[futures.Future] = []
+        for job in jobs:
+            if os.path.exists(job.output_path(output_dir)):
+                yield Result(job=job, skipped=True)
+            else:
+                pending.append(instrumentation.submit(executor, convert_job, scrumer, job, output_dir, ordered))
+        try:
+            for future in futures.as_completed(pending):
+                yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+_scrumer: base.ScrumerBase | None = None
+
+
+def _init_shard(factory: Callable[[], base.ScrumerBase], domains: list[str]):
+    """
+    This function builds the scrumer of the worker process once and warms it up.
+    """
+    global _scrumer
+    _scrumer = factory()
+    _scrumer.warm_up(domains)
+
+
+def _convert_shard(jobs: list[Job], output_dir: str, workers: int, ordered: bool) -> list[tuple]:
+    """
+    This function converts a chunk of the transcripts in the worker process.
+
+    Every transcript of the chunk gets its record, the ones left without a result by an error fail with it.
+    """
+    records: dict[str, tuple] = {}
+    try:
+        for result in run_batch(_scrumer, jobs, output_dir, workers=workers, ordered=ordered):
+            records[result.job.name] = result.to_record()
+    except Exception as e:
+        for job in jobs:
+            records.setdefault(job.name, Result(job=job, error=str(e) or type(e).__name__).to_record())
+    return list(records.values())
+
+
+def run_batch_sharded(
+    factory: Callable[[], base.ScrumerBase],
+    jobs: Iterable[Job],
+    output_dir: str,
+    processes: int = 2,
+    workers: int = 1,
+    chunk_size: int = 4,
+    ordered: bool = False,
+) -> Iterator[Result]:
+    """
+    This function converts the transcripts of the batch sharded across worker processes.
+
+    Every process builds its scrumer once (the examples loaded, the prompts compiled) and converts
+    the chunks of the transcripts it takes, writing their output files itself.
+    Only the compact records of the results are sent back. The transcripts whose output already exists are skipped.
+
+    :param factory: The picklable function building the scrumer of a process (e.g. a functools.partial).
+    The processes do not share their rate limiters, so each scrumer must get its share of the API quota
+    (the quota divided by the number of the processes).
+    :param jobs: The transcripts.
+    :param output_dir: The directory of the output files (created if missing).
+    :param processes: The number of the worker processes.
+    :param workers: The maximum number of transcripts converted concurrently by a process.
+    :param chunk_size: The number of transcripts a process takes at a time.
+    :param ordered: Whether to write the stories in the order of the recognized tasks.
+    :return: The results of the transcripts (the skipped ones first, then as their chunks are done).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pending: list[Job] = []
+    for job in jobs:
+        if os.path.exists(job.output_path(output_dir)):
+            yield Result(job=job, skipped=True)
+        else:
+            pending.append(job)
+    if not pending:
+        return
+    by_name = {job.name: job for job in pending}
+    chunks = [pending[start : start + chunk_size] for start in range(0, len(pending), max(1, chunk_size))]
+    domains = sorted({job.domain for job in pending})
+    with futures.ProcessPoolExecutor(
+        max_workers=min(max(1, processes), len(chunks)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_shard,
+        initargs=(factory, domains),
+    ) as executor:
+        submitted = {executor.submit(_convert_shard, chunk, output_dir, workers, ordered): chunk for chunk in chunks}
+        try:
+            for future in futures.as_completed(submitted):
+                yield from _shard_results(future, submitted[future], by_name)
+        finally:
+            for future in submitted:
+                future.cancel()
+
+
+def _shard_results(future: futures.Future, chunk: list[Job], by_name: dict[str, Job]) -> list[Result]:
+    """
+    This function returns the results of the chunk, all of them failed if the worker process failed
+    (e.g. building the scrumer or dying).
+    """
+    try:
+        return [Result.from_record(by_name[record[0]], record) for record in future.result()]
+    except Exception as e:
+        return [Result(job=job, error=str(e) or type(e).__name__) for job in chunk]
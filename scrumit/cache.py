@@ -0,0 +1,184 @@
+"""
+This module contains the response cache of the scrumit application.
+
+The backends cache the model completions keyed on the final prompt, the model and the sampling parameters,
+so the identical requests (e.g. the same task description) are served without calling the model.
+"""
+
+import abc
+import collections
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any
+
+
+def make_key(**request) -> str:
+    """
+    This function returns the cache key of the request.
+
+    :param request: The final prompt, the model and the sampling parameters of the request.
+    :return: The cache key.
+    """
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class CacheBase(abc.ABC):
+    """
+    This is an abstract class for the response caches.
+
+    The values must be JSON-serializable.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Any:
+        """
+        This method returns the cached value or None if the key is missing (or expired).
+        """
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any):
+        """
+        This method caches the value under the key.
+        """
+        ...
+
+
+class MemoryCache(CacheBase):
+    """
+    This class implements the in-memory LRU cache.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = None):
+        """
+        This method initializes the cache.
+
+        :param max_entries: The maximum number of entries, the least recently used ones are evicted first.
+        :param ttl: Time to live of the entries in seconds. The entries never expire if not provided.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: collections.OrderedDict[str, tuple[Any, float]] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            value, expires_at = self._entries[key]
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCache(CacheBase):
+    """
+    This class implements the on-disk cache backed by SQLite.
+
+    It can be shared by several processes.
+    The expired and the least recently used entries are evicted every EVICT_EVERY writes.
+    """
+
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, ttl: float = None, max_entries: int = 100_000):
+        """
+        This method initializes the cache.
+
+        :param path: Path to the SQLite database file (created if missing).
+        :param ttl: Time to live of the entries in seconds. The entries never expire if not provided.
+        :param max_entries: The maximum number of entries, the least recently used ones are evicted first.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def get(self, key: str) -> Any:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and row[1] + self.ttl < now:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(now)
+
+    def close(self):
+        """
+        This method closes the database connection.
+        """
+        with self._lock:
+            self._connection.close()
+
+    def _evict(self, now: float):
+        if self.ttl is not None:
+            self._connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        self._connection.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+class TieredCache(CacheBase):
+    """
+    This class combines the in-memory tier with the on-disk one.
+
+    The values found on disk are promoted to memory.
+    """
+
+    def __init__(self, memory: MemoryCache, disk: CacheBase):
+        """
+        This method initializes the cache.
+
+        :param memory: The in-memory tier.
+        :param disk: The on-disk tier.
+        """
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        self.disk.set(key, value)
@@ -1,14 +1,21 @@
-import openai
+"""
+This module contains the CLI of the scrumit application.
+
+The backends and their dependencies (openai, promptify, aiohttp) are imported by the commands,
+so the CLI starts (e.g. --help) without loading them.
+"""
+from typing import TYPE_CHECKING
+
 import typer
-from promptify import OpenAI, Prompter
 
-from scrumit.config import settings
-from scrumit.entity.scrumit import Input
-from scrumit.paraphraser.backends import ParaphraserOpenAI
-from scrumit.recognizer.backends import RecognizerOpenAI
-from scrumit.scrumer import Scrumer
+if TYPE_CHECKING:
+    from scrumit.batch import Result
+    from scrumit.scrumer import Scrumer
 
 app = typer.Typer()
+batch_app = typer.Typer()
+serve_app = typer.Typer()
+jobs_app = typer.Typer(help="Durable job queue of the batch conversions (a SQLite file shared by the workers).")
 
 
 @app.command()
@@ -23,24 +30,49 @@ def main(
     ),
     output: str = typer.Option(None, "--output", "-o", help="Path to the output file where the results will be saved"),
     domain: str = typer.Option(..., "--domain", "-d", help="Domain name"),
+    workers: int = typer.Option(1, "--workers", "-w", help="Number of task batches paraphrased concurrently", min=1),
+    keep_going: bool = typer.Option(
+        False, "--keep-going", help="Keep converting the remaining tasks when a task fails instead of aborting"
+    ),
+    cache: str = typer.Option(
+        None, "--cache", help="Path to the SQLite file caching the model responses (overrides RESPONSE_CACHE_PATH)"
+    ),
+    window_tokens: int = typer.Option(
+        None,
+        "--window-tokens",
+        help="Recognize long transcripts in overlapping windows of this many tokens (the whole text at once if not set)",
+        min=1,
+    ),
+    ordered: bool = typer.Option(
+        False, "--ordered", help="Write the stories in the order of the recognized tasks instead of as soon as ready"
+    ),
+    state: str = typer.Option(
+        None,
+        "--state",
+        help="Path to the state file of the previous runs, only the new or edited parts of the transcript are converted",
+    ),
 ):
     """
     CLI application for processing files.
     """
 
-    if not settings.openai_api_key:
-        settings.openai_api_key = typer.prompt("OpenAI API key")
-
-    openai.api_key = settings.openai_api_key
-    model = OpenAI(settings.openai_api_key)
+    from scrumit.batch import write_stories
+    from scrumit.entity.scrumit import Input
 
-    prompter = Prompter(model)
-    recognizer = RecognizerOpenAI(model, prompter)
+    scrumer = build_scrumer(workers, keep_going, cache, window_tokens)
 
-    client = openai.Completion
-    paraphraser = ParaphraserOpenAI(client)
+    if state:
+        _convert_incremental(scrumer, source, domain, state, output)
+        return
 
-    scrumer = Scrumer(recognizer, paraphraser)
+    if output:
+        # the transcript is streamed from the source and the stories are appended as soon as they are ready
+        with open(source) as transcript, open(output, "w") as file:
+            stories = scrumer.convert_stream(Input(text="", domain=domain), ordered=ordered, lines=transcript)
+            _, failures = write_stories(stories, file)
+        for failure in failures:
+            typer.echo(f"Failed to convert the task {failure.task}: {failure.reason}", err=True)
+        return
 
     with open(source) as file:
         content = file.read()
@@ -51,12 +83,350 @@ def main(
     )
 
     outputs = scrumer.convert(conversation)
-    if output:
-        with open(output, "w") as file:
-            for index, story in enumerate(outputs.stories, start=1):
-                file.write(f"{index}) {story.story}\n")
+    typer.echo(outputs.dict())
+
+
+@batch_app.command()
+def batch(
+    inputs: str = typer.Option(
+        ...,
+        "--input",
+        "-i",
+        help="Directory, glob pattern or JSONL manifest (id, source or text, domain per line) of the transcripts",
+    ),
+    output_dir: str = typer.Option(
+        ..., "--output-dir", "-o", help="Directory where the results will be saved (one file per transcript)"
+    ),
+    domain: str = typer.Option(None, "--domain", "-d", help="Domain name (the manifest items may override it)"),
+    workers: int = typer.Option(4, "--workers", "-w", help="Number of transcripts converted concurrently", min=1),
+    keep_going: bool = typer.Option(
+        False, "--keep-going", help="Keep converting the remaining tasks when a task fails instead of aborting"
+    ),
+    cache: str = typer.Option(
+        None, "--cache", help="Path to the SQLite file caching the model responses (overrides RESPONSE_CACHE_PATH)"
+    ),
+    window_tokens: int = typer.Option(
+        None,
+        "--window-tokens",
+        help="Recognize long transcripts in overlapping windows of this many tokens (the whole text at once if not set)",
+        min=1,
+    ),
+    ordered: bool = typer.Option(
+        False, "--ordered", help="Write the stories in the order of the recognized tasks instead of as soon as ready"
+    ),
+    processes: int = typer.Option(
+        1,
+        "--processes",
+        "-p",
+        help="Number of worker processes (each converting --workers transcripts, the API quota is split among them)",
+        min=1,
+    ),
+    chunk_size: int = typer.Option(4, "--chunk-size", help="Number of transcripts a worker process takes", min=1),
+):
+    """
+    CLI application for processing many files with one set of backends.
+
+    The transcripts that already have an output are skipped, so an interrupted batch is resumed by running it again.
+    """
+
+    import functools
+
+    from scrumit.batch import discover, run_batch, run_batch_sharded
+
+    try:
+        jobs = discover(inputs, domain)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--input")
+
+    if processes > 1:
+        _export_api_key()
+        factory = functools.partial(build_scrumer, 1, keep_going, cache, window_tokens, processes)
+        results = run_batch_sharded(factory, jobs, output_dir, processes, workers, chunk_size, ordered)
     else:
+        results = run_batch(build_scrumer(1, keep_going, cache, window_tokens), jobs, output_dir, workers, ordered)
+
+    errors = 0
+    for result in results:
+        errors += result.error is not None
+        typer.echo(_describe(result), err=result.error is not None)
+    if errors:
+        raise typer.Exit(1)
+
+
+@serve_app.command()
+def serve(
+    host: str = typer.Option("127.0.0.1", "--host", help="Interface the service listens on"),
+    port: int = typer.Option(8080, "--port", "-p", help="Port the service listens on"),
+    workers: int = typer.Option(8, "--workers", "-w", help="Number of conversions run concurrently", min=1),
+    max_queue: int = typer.Option(
+        64, "--max-queue", help="Number of conversions waiting for a worker before the requests are rejected", min=1
+    ),
+    task_workers: int = typer.Option(
+        1, "--task-workers", help="Number of task batches paraphrased concurrently per conversion", min=1
+    ),
+    keep_going: bool = typer.Option(
+        False, "--keep-going", help="Keep converting the remaining tasks when a task fails instead of aborting"
+    ),
+    cache: str = typer.Option(
+        None, "--cache", help="Path to the SQLite file caching the model responses (overrides RESPONSE_CACHE_PATH)"
+    ),
+    window_tokens: int = typer.Option(
+        None,
+        "--window-tokens",
+        help="Recognize long transcripts in overlapping windows of this many tokens (the whole text at once if not set)",
+        min=1,
+    ),
+    domains: list[str] = typer.Option(
+        None, "--domain", "-d", help="Domain whose prompt is compiled on startup (repeatable, the others on first use)"
+    ),
+):
+    """
+    HTTP service converting the transcripts (POST /convert with the Input as JSON) with one set of warm backends.
+
+    The identical requests in flight share one conversion, the requests beyond the queue are rejected with 503.
+    """
+
+    from aiohttp import web
+
+    from scrumit.server import create_app
+
+    scrumer = build_scrumer(task_workers, keep_going, cache, window_tokens)
+    app = create_app(scrumer, workers=workers, max_queue=max_queue, domains=domains)
+    web.run_app(app, host=host, port=port)
+
+
+@jobs_app.command()
+def submit(
+    queue: str = typer.Option(..., "--queue", "-q", help="Path to the SQLite file of the queue (created if missing)"),
+    inputs: str = typer.Option(
+        ...,
+        "--input",
+        "-i",
+        help="Directory, glob pattern or JSONL manifest (id, source or text, domain per line) of the transcripts",
+    ),
+    domain: str = typer.Option(None, "--domain", "-d", help="Domain name (the manifest items may override it)"),
+):
+    """
+    Adds the transcripts to the queue (the ones already queued are ignored).
+    """
+
+    from scrumit.batch import discover
+    from scrumit.jobs import JobQueue
+
+    try:
+        jobs = discover(inputs, domain)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--input")
+
+    job_queue = JobQueue(queue)
+    typer.echo(f"{job_queue.submit(jobs)} of {len(jobs)} transcripts queued")
+    job_queue.close()
+
+
+@jobs_app.command()
+def work(
+    queue: str = typer.Option(..., "--queue", "-q", help="Path to the SQLite file of the queue"),
+    output_dir: str = typer.Option(
+        ..., "--output-dir", "-o", help="Directory where the results will be saved (one file per transcript)"
+    ),
+    processes: int = typer.Option(
+        1, "--processes", "-p", help="Number of worker processes (the API quota is split among them)", min=1
+    ),
+    batch_size: int = typer.Option(8, "--batch-size", help="Number of tasks paraphrased together", min=1),
+    max_attempts: int = typer.Option(3, "--max-attempts", help="Number of attempts of a unit before it fails", min=1),
+    retry_failed: bool = typer.Option(False, "--retry-failed", help="Queue the failed units again before working"),
+    cache: str = typer.Option(
+        None, "--cache", help="Path to the SQLite file caching the model responses (overrides RESPONSE_CACHE_PATH)"
+    ),
+):
+    """
+    Runs the queued units until none is left, resuming from the stored recognitions and stories.
+
+    Several workers (processes or hosts sharing the file) can work on the same queue.
+    """
+
+    import multiprocessing
+
+    from scrumit.jobs import JobQueue
+
+    if retry_failed:
+        job_queue = JobQueue(queue)
+        typer.echo(f"{job_queue.retry_failed()} failed units queued again")
+        job_queue.close()
+
+    if processes == 1:
+        _work(queue, output_dir, batch_size, max_attempts, cache)
+        return
+
+    _export_api_key()
+    workers = [
+        multiprocessing.Process(target=_work, args=(queue, output_dir, batch_size, max_attempts, cache, processes))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if any(worker.exitcode for worker in workers):
+        raise typer.Exit(1)
+
+
+@jobs_app.command()
+def status(queue: str = typer.Option(..., "--queue", "-q", help="Path to the SQLite file of the queue")):
+    """
+    Shows the number of the transcripts and the units per status.
+    """
+
+    from scrumit.jobs import JobQueue
+
+    job_queue = JobQueue(queue)
+    progress = job_queue.progress()
+    job_queue.close()
+    typer.echo(f"transcripts: {progress.jobs}")
+    typer.echo(f"units: {progress.units}")
+
+
+def _export_api_key():
+    """
+    This function prompts for the OpenAI API key (if not configured) before the worker processes are started,
+    the workers read it from the environment instead of prompting for it.
+    """
+    import os
+
+    from scrumit.config import settings
+
+    if not settings.openai_api_key:
+        os.environ["OPENAI_API_KEY"] = settings.openai_api_key = typer.prompt("OpenAI API key")
+
+
+def _work(queue: str, output_dir: str, batch_size: int, max_attempts: int, cache: str = None, processes: int = 1):
+    """
+    This function runs a worker of the job queue until no unit is left.
+
+    The worker gets its share of the API quota (one of the processes).
+    """
+    from scrumit.jobs import JobQueue, Worker
+
+    job_queue = JobQueue(queue, max_attempts=max_attempts)
+    try:
+        # the failed tasks are retried by the queue, so the other tasks of the batch must not be aborted
+        worker = Worker(
+            build_scrumer(1, True, cache, processes=processes), job_queue, output_dir, batch_size=batch_size
+        )
+        for name in worker.run():
+            typer.echo(f"{name}: done")
+    finally:
+        job_queue.close()
+
+
+def _convert_incremental(scrumer: "Scrumer", source: str, domain: str, state: str, output: str = None):
+    """
+    This function converts the transcript reusing the tasks and the stories recorded in the state file.
+    """
+    from scrumit.batch import write_stories
+    from scrumit.entity.scrumit import Input
+    from scrumit.incremental import IncrementalScrumer
+
+    with open(source) as file:
+        outputs = IncrementalScrumer(scrumer, state).convert(Input(text=file.read(), domain=domain))
+    if not output:
         typer.echo(outputs.dict())
+        return
+    with open(output, "w") as file:
+        write_stories(outputs.stories, file)
+    for failure in outputs.failures:
+        typer.echo(f"Failed to convert the task {failure.task}: {failure.reason}", err=True)
+
+
+def build_scrumer(
+    workers: int, keep_going: bool, cache: str = None, window_tokens: int = None, processes: int = 1
+) -> "Scrumer":
+    """
+    This function builds the scrumer with the OpenAI backends.
+
+    :param workers: Number of task batches paraphrased concurrently.
+    :param keep_going: Whether to keep converting the remaining tasks when a task fails.
+    :param cache: Path to the SQLite file caching the model responses.
+    :param window_tokens: The token budget of the recognized windows (the whole text at once if not provided).
+    :param processes: Number of the processes sharing the API quota, the scrumer gets an equal share of it.
+    :return: The scrumer.
+    """
+    import openai
+    from promptify import OpenAI, Prompter
+
+    from scrumit.cache import MemoryCache, SQLiteCache, TieredCache
+    from scrumit.config import settings
+    from scrumit.dedup import TaskDeduplicator
+    from scrumit.paraphraser.backends import ParaphraserOpenAI
+    from scrumit.ratelimit import RateLimiter
+    from scrumit.recognizer.backends import RecognizerLocal, RecognizerOpenAI
+    from scrumit.recognizer.cascade import CascadeRecognizer
+    from scrumit.recognizer.prefilter import PrefilterRecognizer
+    from scrumit.recognizer.streaming import StreamingRecognizer
+    from scrumit.scrumer import Scrumer
+
+    if not settings.openai_api_key:
+        settings.openai_api_key = typer.prompt("OpenAI API key")
+
+    openai.api_key = settings.openai_api_key
+    model = OpenAI(settings.openai_api_key)
+
+    cache_path = cache or settings.response_cache_path
+    response_cache = (
+        TieredCache(
+            MemoryCache(ttl=settings.response_cache_ttl),
+            SQLiteCache(cache_path, ttl=settings.response_cache_ttl, max_entries=settings.response_cache_max_entries),
+        )
+        if cache_path
+        else None
+    )
+
+    limiter = RateLimiter(
+        requests_per_minute=max(1, settings.openai_requests_per_minute // processes),
+        tokens_per_minute=max(1, settings.openai_tokens_per_minute // processes),
+        max_concurrency=max(1, settings.openai_max_concurrency // processes),
+    )
+
+    prompter = Prompter(model)
+    recognizer = RecognizerOpenAI(
+        model,
+        prompter,
+        cache=response_cache,
+        limiter=limiter,
+        max_examples=settings.max_examples,
+        examples_max_tokens=settings.examples_max_tokens,
+    )
+    if settings.recognizer_backend == "local":
+        recognizer = RecognizerLocal()
+    elif settings.recognizer_backend == "cascade":
+        recognizer = CascadeRecognizer(recognizer)
+    if window_tokens:
+        recognizer = StreamingRecognizer(recognizer, window_tokens=window_tokens, max_workers=workers)
+    if settings.prefilter_threshold is not None:
+        recognizer = PrefilterRecognizer(recognizer, threshold=settings.prefilter_threshold)
+
+    client = openai.Completion
+    paraphraser = ParaphraserOpenAI(
+        client,
+        cache=response_cache,
+        limiter=limiter,
+        max_examples=settings.max_examples,
+        examples_max_tokens=settings.examples_max_tokens,
+        candidates=settings.paraphraser_candidates,
+    )
+
+    deduplicator = TaskDeduplicator(settings.dedup_threshold) if settings.dedup_threshold is not None else None
+    return Scrumer(recognizer, paraphraser, max_workers=workers, fail_fast=not keep_going, deduplicator=deduplicator)
+
+
+def _describe(result: "Result") -> str:
+    if result.skipped:
+        return f"{result.job.name}: skipped (output exists)"
+    if result.error is not None:
+        return f"{result.job.name}: failed: {result.error}"
+    failures = "".join(f"\n  failed task {failure.task}: {failure.reason}" for failure in result.failures)
+    return f"{result.job.name}: {result.stories} stories{failures}"
 
 
-app()
+if __name__ == "__main__":
+    app()
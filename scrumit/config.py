@@ -1,8 +1,12 @@
 """
 This module contains the configuration class for the scrumit application.
+
+The settings are loaded (the .env file looked up and parsed) on the first access to settings, not on import.
 """
 import os
+import threading
 from pathlib import Path
+from typing import Literal
 
 import dotenv
 from pydantic import BaseSettings
@@ -17,7 +21,6 @@ class Config(BaseSettings):
     """
 
     class Config:
-        env_file = dotenv.find_dotenv(usecwd=True)
         env_file_encoding = "utf-8"
 
     openai_api_key: str = Field(
@@ -62,6 +65,90 @@ class Config(BaseSettings):
         env="PARAPHRASER_PROMPT_TEMPLATE_WO_EX",
         description="Prompt template for the paraphraser when used without examples.",
     )
+    response_cache_path: str = Field(
+        None,
+        env="RESPONSE_CACHE_PATH",
+        description="Path to the SQLite file caching the model responses. Responses are not cached on disk if not set.",
+    )
+    response_cache_ttl: float = Field(
+        7 * 24 * 60 * 60,
+        env="RESPONSE_CACHE_TTL",
+        description="Time to live of the cached model responses in seconds.",
+    )
+    response_cache_max_entries: int = Field(
+        100_000,
+        env="RESPONSE_CACHE_MAX_ENTRIES",
+        description="Maximum number of the model responses cached on disk.",
+    )
+    openai_requests_per_minute: int = Field(
+        3000,
+        env="OPENAI_REQUESTS_PER_MINUTE",
+        description="Quota of the OpenAI requests per minute shared by the backends.",
+    )
+    openai_tokens_per_minute: int = Field(
+        250_000,
+        env="OPENAI_TOKENS_PER_MINUTE",
+        description="Quota of the OpenAI tokens (prompts and completions) per minute shared by the backends.",
+    )
+    openai_max_concurrency: int = Field(
+        16,
+        env="OPENAI_MAX_CONCURRENCY",
+        description="Maximum number of the concurrent OpenAI requests. Halved on rate limit errors, regrown on success.",
+    )
+    max_examples: int = Field(
+        None,
+        env="MAX_EXAMPLES",
+        description="Maximum number of the examples in a prompt, the most relevant to the input are kept. "
+        "All the examples are sent if neither this nor EXAMPLES_MAX_TOKENS is set.",
+    )
+    examples_max_tokens: int = Field(
+        None,
+        env="EXAMPLES_MAX_TOKENS",
+        description="Token budget of the examples in a prompt.",
+    )
+
+    recognizer_backend: Literal["openai", "local", "cascade"] = Field(
+        "openai",
+        env="RECOGNIZER_BACKEND",
+        description="Recognizer used by the CLI: openai, local (rules and a classifier trained from the examples, "
+        "no remote call) or cascade (local, only the uncertain sentences are sent to OpenAI).",
+    )
+    prefilter_threshold: float = Field(
+        None,
+        env="PREFILTER_THRESHOLD",
+        description="Actionability from which a speaker turn is sent to the recognizer (used by the CLI). "
+        "The transcript is sent whole if not set.",
+    )
+    dedup_threshold: float = Field(
+        None,
+        env="DEDUP_THRESHOLD",
+        description="Similarity (TF-IDF cosine) from which the recognized tasks are merged as near-duplicates "
+        "and paraphrased once (used by the CLI). The tasks are not deduplicated if not set.",
+    )
+    paraphraser_candidates: int = Field(
+        1,
+        env="PARAPHRASER_CANDIDATES",
+        description="Number of the user story candidates generated in a single request per task, "
+        "the best one by the local reranking (template, length, overlap with the task) is kept.",
+    )
+
+
+_settings: Config | None = None
+_lock = threading.Lock()
+
+
+def load_settings() -> Config:
+    """
+    This function returns the settings, loading them from the environment and the .env file on the first call.
+    """
+    global _settings
+    with _lock:
+        if _settings is None:
+            _settings = Config(_env_file=dotenv.find_dotenv(usecwd=True) or None)
+    return _settings
 
 
-settings = Config()
+def __getattr__(name: str):
+    if name == "settings":
+        return load_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,224 @@
+"""
+This module contains the deduplication of the recognized tasks.
+
+The recognizer often returns the same work item several times in different words ("Fix chat delays",
+"Messages get delayed in the chat"). The descriptions are vectorized to TF-IDF over the stemmed words
+and their character trigrams (hashed, NumPy) with the generic task words ("fix", "add", "should") left out,
+and clustered greedily by the average cosine similarity to the members of a cluster.
+Only one task per cluster is paraphrased.
+"""
+
+import dataclasses
+import re as regex
+import zlib
+
+import numpy as np
+
+from scrumit.entity import recognizer as entities
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by fix for from get gets got i in is it must need needs not of on or please should so "
+    "that the this to we when with you add make update improve implement ensure support issue bug problem broken "
+    "task user users".split()
+)
+SUFFIXES = ("ing", "ed", "es", "s")
+DEFAULT_PERSONA = "user"
+
+
+def stem(word: str) -> str:
+    """
+    This function strips the common inflection suffix of the word (delays, delayed -> delay).
+    """
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def features(text: str) -> list[str]:
+    """
+    This function returns the features of the description (stemmed words and their character trigrams).
+    """
+    stems = [stem(word) for word in regex.findall(r"[a-z0-9]+", text.lower()) if word not in STOP_WORDS]
+    grams = [f"<{word}>"[start : start + 3] for word in stems for start in range(len(word))]
+    return [*(f"w:{word}" for word in stems), *grams]
+
+
+@dataclasses.dataclass
+class TaskCluster:
+    """
+    This class contains the tasks describing the same work item.
+    """
+
+    task: entities.RecognizerTask
+    members: list[entities.RecognizerTask]
+    representative: int = 0
+
+    @property
+    def duplicates(self) -> list[entities.RecognizerTask]:
+        """
+        The members merged into the representative task.
+        """
+        return [member for index, member in enumerate(self.members) if index != self.representative]
+
+
+class TaskIndex:
+    """
+    This class clusters the tasks incrementally (each task joins the most similar cluster or starts a new one).
+
+    The hashed feature counts are kept sparse in buffers grown geometrically and the document frequencies
+    are updated on every add, so adding a task costs a pass over the stored features (not over all the dimensions).
+    """
+
+    def __init__(self, threshold: float = 0.55, dimensions: int = 1 << 12):
+        """
+        This method initializes the index.
+
+        :param threshold: The average similarity to the members of a cluster from which a task joins it.
+        :param dimensions: The number of the hashed features.
+        """
+        self.threshold = threshold
+        self.dimensions = dimensions
+        self.tasks: list[entities.RecognizerTask] = []
+        self.labels: list[int] = []
+        self.clusters = 0
+        self._frequencies = np.zeros(dimensions, dtype=np.float64)
+        self._size = 0
+        self._rows = np.zeros(256, dtype=np.int32)
+        self._columns = np.zeros(256, dtype=np.int32)
+        self._counts = np.zeros(256, dtype=np.float64)
+
+    def add(self, task: entities.RecognizerTask) -> tuple[int, bool]:
+        """
+        This method adds the task to the most similar cluster.
+
+        :param task: The task.
+        :return: The cluster of the task and whether it is a new one.
+        """
+        self._append(task)
+        label = -1
+        if self.clusters:
+            labels = np.asarray(self.labels)
+            sums = np.bincount(labels, weights=self.similarities()[:-1], minlength=self.clusters)
+            averages = sums / np.bincount(labels, minlength=self.clusters)
+            if averages.max() >= self.threshold:
+                label = int(averages.argmax())
+        new = label < 0
+        if new:
+            label, self.clusters = self.clusters, self.clusters + 1
+        self.labels.append(label)
+        return label, new
+
+    def _append(self, task: entities.RecognizerTask):
+        hashes = [zlib.crc32(feature.encode("utf-8")) % self.dimensions for feature in features(task.description)]
+        columns, counts = np.unique(np.asarray(hashes, dtype=np.int32), return_counts=True)
+        end = self._size + len(columns)
+        if end > len(self._rows):
+            capacity = max(end, 2 * len(self._rows))
+            self._rows, self._columns, self._counts = (
+                np.resize(buffer, capacity) for buffer in (self._rows, self._columns, self._counts)
+            )
+        self._rows[self._size : end] = len(self.tasks)
+        self._columns[self._size : end] = columns
+        self._counts[self._size : end] = counts
+        self._size = end
+        self._frequencies[columns] += 1
+        self.tasks.append(task)
+
+    def idf(self) -> np.ndarray:
+        """
+        This method returns the inverse document frequencies of the features (smoothed).
+        """
+        return np.log((1 + len(self.tasks)) / (1 + self._frequencies)) + 1
+
+    def similarities(self) -> np.ndarray:
+        """
+        This method returns the TF-IDF cosine similarities of every task to the last one.
+        """
+        rows, columns = self._rows[: self._size], self._columns[: self._size]
+        weights = self._counts[: self._size] * self.idf()[columns]
+        norms = np.sqrt(np.bincount(rows, weights=weights**2, minlength=len(self.tasks))) + 1e-12
+        last = np.zeros(self.dimensions)
+        tail = rows == len(self.tasks) - 1
+        last[columns[tail]] = weights[tail]
+        dots = np.bincount(rows, weights=weights * last[columns], minlength=len(self.tasks))
+        return dots / (norms * norms[-1])
+
+    def weights(self, indexes: list[int] = None) -> np.ndarray:
+        """
+        This method returns the L2-normalized TF-IDF vectors of the tasks (dense).
+
+        :param indexes: The tasks (all of them if not provided).
+        """
+        indexes = list(range(len(self.tasks))) if indexes is None else indexes
+        positions = {index: position for position, index in enumerate(indexes)}
+        weights = np.zeros((len(indexes), self.dimensions))
+        rows, columns = self._rows[: self._size], self._columns[: self._size]
+        selected = np.isin(rows, indexes)
+        weights[[positions[row] for row in rows[selected]], columns[selected]] = self._counts[: self._size][selected]
+        weights *= self.idf()
+        return weights / (np.linalg.norm(weights, axis=1, keepdims=True) + 1e-12)
+
+    def groups(self) -> list[TaskCluster]:
+        """
+        This method returns the clusters (in the order of their first task).
+
+        The representative task is the member most similar to the others (the first on ties)
+        with the personas and deadlines of the members merged into it.
+        """
+        members: dict[int, list[int]] = {}
+        for index, label in enumerate(self.labels):
+            members.setdefault(label, []).append(index)
+        clusters: list[TaskCluster] = []
+        for indexes in members.values():
+            weights = self.weights(indexes)
+            representative = int((weights @ weights.T).sum(axis=1).argmax())
+            tasks = [self.tasks[index] for index in indexes]
+            clusters.append(TaskCluster(merge(tasks[representative], tasks), tasks, representative))
+        return clusters
+
+
+def merge(task: entities.RecognizerTask, members: list[entities.RecognizerTask]) -> entities.RecognizerTask:
+    """
+    This function merges the personas and the deadlines of the members into the task.
+
+    The task keeps its own values, the missing (or default) ones are taken from the first member that has them.
+    """
+    if len(members) == 1:
+        return task
+    persona = task.persona if task.persona not in (None, DEFAULT_PERSONA) else None
+    persona = persona or next((m.persona for m in members if m.persona not in (None, DEFAULT_PERSONA)), task.persona)
+    deadline = task.deadline or next((member.deadline for member in members if member.deadline), None)
+    return task.copy(update={"persona": persona, "deadline": deadline})
+
+
+class TaskDeduplicator:
+    """
+    This class removes the near-duplicate tasks.
+    """
+
+    def __init__(self, threshold: float = 0.55):
+        """
+        This method initializes the deduplicator.
+
+        :param threshold: The average TF-IDF cosine similarity to the members of a cluster from which a task joins it.
+        """
+        self.threshold = threshold
+
+    def cluster(self, tasks: list[entities.RecognizerTask]) -> list[TaskCluster]:
+        """
+        This method clusters the tasks describing the same work item.
+
+        :param tasks: The recognized tasks.
+        :return: The clusters in the order of their first task.
+        """
+        index = TaskIndex(self.threshold)
+        for task in tasks:
+            index.add(task)
+        return index.groups()
+
+    def index(self) -> TaskIndex:
+        """
+        This method returns an empty index for deduplicating a stream of tasks (the first task of a cluster is kept).
+        """
+        return TaskIndex(self.threshold)
@@ -1 +1 @@
-from scrumit.entity import paraphraser, recognizer, scrumit  # noqa: F401
+from scrumit.entity import batch, paraphraser, recognizer, scrumit  # noqa: F401
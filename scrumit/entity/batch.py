@@ -0,0 +1,29 @@
+"""
+This module contains the entities for the batch mode of the scrumit application.
+"""
+
+from pydantic import BaseModel, root_validator, validator
+from pydantic.fields import Field
+
+
+class BatchItem(BaseModel):
+    """
+    This class contains a single transcript of the batch (a line of the JSONL manifest).
+    """
+
+    id: str = Field(..., description="Identifier of the transcript. Used as the name of the output file.")
+    source: str = Field(None, description="Path to the transcript file (relative to the manifest).")
+    text: str = Field(None, description="Transcript text. Used instead of the source file.")
+    domain: str = Field(None, description="Domain of the transcript. The batch domain is used if not provided.")
+
+    @validator("id")
+    def check_id(cls, value: str) -> str:
+        if not value.strip(".") or any(character in value for character in "/\\\0"):
+            raise ValueError("the id must be a file name (no path separators, not . or ..)")
+        return value
+
+    @root_validator(skip_on_failure=True)
+    def check_transcript(cls, values: dict) -> dict:
+        if (values.get("source") is None) == (values.get("text") is None):
+            raise ValueError("exactly one of source and text must be provided")
+        return values
@@ -26,9 +26,22 @@ class ParaphraserInput(BaseModel):
     )
 
 
+class ParaphraserCandidate(BaseModel):
+    """
+    This class contains a single scored user story candidate.
+    """
+
+    user_story: str = Field(..., description="Paraphrased output text (user story in our case).")
+    score: float = Field(..., description="Score of the candidate by the local reranker (the higher the better).")
+
+
 class ParaphraserOutput(BaseModel):
     """
     This class contains the output for the scrumit application.
     """
 
     user_story: str = Field(..., description="Paraphrased output text (user story in our case).")
+    candidates: list[ParaphraserCandidate] = Field(
+        default_factory=list,
+        description="All the scored candidates, the best first (only if requested with return_candidates).",
+    )
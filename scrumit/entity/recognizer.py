@@ -48,6 +48,8 @@ class RecognizerTask(BaseModel):
     description: str = Field(..., description="Description of the task.", alias="Task")
     persona: str = Field("user", description="Persona of the task. For whom the task should be done.", alias="Persona")
     deadline: str = Field(None, description="Deadline of the task. When will the task be done.", alias="Deadline")
+    start: int = Field(None, description="Offset of the source span in the input text (if traced).")
+    end: int = Field(None, description="End offset of the source span in the input text (if traced).")
 
     class Config:
         allow_population_by_field_name = True
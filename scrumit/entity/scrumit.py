@@ -31,6 +31,32 @@ class UserStory(BaseModel):
 
     task: str = Field(..., description="Original text - excerpt from the input text.")
     story: str = Field(..., description="User story text.")
+    merged: list[str] = Field(
+        default_factory=list, description="Tasks merged into this one as near-duplicates (excerpts from the input)."
+    )
+
+
+class TaskFailure(BaseModel):
+    """
+    This class contains the failure of a single task that could not be converted to a user story.
+    """
+
+    task: str = Field(..., description="Original text - excerpt from the input text.")
+    reason: str = Field(..., description="Reason why the task could not be converted.")
+
+
+class StageStats(BaseModel):
+    """
+    This class contains the aggregated instrumentation of a single stage of the conversion.
+    """
+
+    calls: int = Field(0, description="Number of the calls of the stage.")
+    seconds: float = Field(0.0, description="Total time spent in the stage.")
+    errors: int = Field(0, description="Number of the calls that raised.")
+    prompt_tokens: int = Field(0, description="Prompt tokens reported by the model.")
+    completion_tokens: int = Field(0, description="Completion tokens reported by the model.")
+    cache_hits: int = Field(0, description="Number of the responses served by the cache.")
+    retries: int = Field(0, description="Number of the retried model calls.")
 
 
 class Output(BaseModel):
@@ -39,3 +65,9 @@ class Output(BaseModel):
     """
 
     stories: list[UserStory] = Field(..., description="List of user stories.")
+    failures: list[TaskFailure] = Field(
+        default_factory=list, description="List of tasks that failed to convert (only when not failing fast)."
+    )
+    stages: dict[str, StageStats] = Field(
+        default_factory=dict, description="Instrumentation of the conversion aggregated per stage."
+    )
@@ -0,0 +1,290 @@
+"""
+This module contains the incremental conversion of the growing (or edited) transcripts.
+
+The transcript is split to content-defined chunks of speaker turns, each chunk is fingerprinted by its content.
+A local state file maps the fingerprints to the recognized tasks and the tasks to their finished stories,
+so a re-run sends only the new or changed chunks to the recognizer and only the new tasks to the paraphraser.
+"""
+
+import asyncio
+import json
+import os
+from concurrent import futures
+
+from scrumit import instrumentation
+from scrumit.cache import make_key
+from scrumit.entity import recognizer as recognizer_entities, scrumit as entities
+from scrumit.scrumer import Scrumer
+from scrumit.scrumer.scrumit import Outcome
+from scrumit.transcript import Window, iter_chunks, split_turns
+
+STATE_VERSION = 1
+
+
+def locate(task: recognizer_entities.RecognizerTask, chunk: Window) -> recognizer_entities.RecognizerTask:
+    """
+    This function moves the offsets of the task from the chunk text to the transcript.
+    """
+    if task.start is None or task.end is None:
+        return task
+    offsets, offset = [], 0
+    for turn in chunk.turns:
+        offsets.append((offset, turn))
+        offset += len(turn.text) + 1
+    start_offset, start_turn = next((item for item in reversed(offsets) if item[0] <= task.start), offsets[0])
+    end_offset, end_turn = next((item for item in reversed(offsets) if item[0] < task.end), offsets[0])
+    return task.copy(
+        update={"start": start_turn.start + task.start - start_offset, "end": end_turn.start + task.end - end_offset}
+    )
+
+
+class ConversionState:
+    """
+    This class holds the state of the incremental conversion (a JSON file).
+    """
+
+    def __init__(self, path: str):
+        """
+        This method initializes the state, loading the file if it exists.
+
+        :param path: Path to the state file.
+        A missing, unreadable or outdated file is an empty state (everything is converted again).
+        """
+        self.path = path
+        self.segments: dict[str, list[dict]] = {}
+        self.stories: dict[str, str] = {}
+        try:
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == STATE_VERSION:
+            self.segments = data.get("segments", {})
+            self.stories = data.get("stories", {})
+
+    def save(self, segments: set[str], stories: set[str]):
+        """
+        This method writes the state keeping only the given entries (the ones of the current transcript).
+
+        The file is replaced atomically, so an interrupted run leaves the previous state.
+
+        :param segments: The fingerprints of the chunks to keep.
+        :param stories: The keys of the stories to keep.
+        """
+        data = {
+            "version": STATE_VERSION,
+            "segments": {key: value for key, value in self.segments.items() if key in segments},
+            "stories": {key: value for key, value in self.stories.items() if key in stories},
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        partial = self.path + ".partial"
+        with open(partial, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(partial, self.path)
+
+
+class IncrementalScrumer:
+    """
+    This class converts the transcripts reusing the tasks and the stories of the previous runs.
+    """
+
+    def __init__(self, scrumer: Scrumer, state_path: str, chunk_tokens: int = 1500, average_turns: int = 8):
+        """
+        This method initializes the incremental conversion.
+
+        :param scrumer: The scrumer recognizing the new chunks and paraphrasing the new tasks.
+        :param state_path: Path to the state file (created on the first run).
+        :param chunk_tokens: The token budget of a chunk.
+        :param average_turns: The average number of speaker turns per chunk.
+        Smaller chunks re-recognize less text per change but lose more context across their boundaries.
+        """
+        self.scrumer = scrumer
+        self.state = ConversionState(state_path)
+        self.chunk_tokens = chunk_tokens
+        self.average_turns = average_turns
+
+    def convert(self, inp: entities.Input) -> entities.Output:
+        """
+        This method converts the input text, recognizing only the chunks and paraphrasing only the tasks
+        not converted by the previous runs. The state is saved even if the conversion fails,
+        so the chunks recognized before the failure are not recognized again.
+
+        :param inp: The input of the scrumit application.
+        :return: The output (with the stories of all the tasks, reused or new).
+        """
+        with instrumentation.recording() as recorder:
+            chunks = self.chunks(inp)
+            try:
+                self.recognize(inp, self.missing(chunks))
+                tasks, merged = self.scrumer.deduplicate(self.tasks(chunks))
+                missing = self.missing_tasks(inp, tasks)
+                fresh = self.scrumer.paraphrase_tasks(missing, inp.paraphraser_examples)
+                outcomes = self.outcomes(inp, tasks, self.set_stories(inp, missing, fresh))
+            finally:
+                self.save(inp, chunks)
+        return self.scrumer.build_output(tasks, outcomes, recorder.stats(), merged)
+
+    async def aconvert(self, inp: entities.Input) -> entities.Output:
+        """
+        This method is the asyncio version of the convert method.
+        """
+        with instrumentation.recording() as recorder:
+            chunks = self.chunks(inp)
+            try:
+                await self.arecognize(inp, self.missing(chunks))
+                tasks, merged = self.scrumer.deduplicate(self.tasks(chunks))
+                missing = self.missing_tasks(inp, tasks)
+                fresh = await self.scrumer.aparaphrase_tasks(missing, inp.paraphraser_examples)
+                outcomes = self.outcomes(inp, tasks, self.set_stories(inp, missing, fresh))
+            finally:
+                self.save(inp, chunks)
+        return self.scrumer.build_output(tasks, outcomes, recorder.stats(), merged)
+
+    def chunks(self, inp: entities.Input) -> list[tuple[str, Window]]:
+        """
+        This method splits the input text to chunks.
+
+        :param inp: The input of the scrumit application.
+        :return: The fingerprints and the chunks.
+        """
+        turns = split_turns(inp.text.splitlines(keepends=True))
+        examples = [example.dict() for example in inp.ner_examples]
+        return [
+            (make_key(text=chunk.text, domain=inp.domain, examples=examples), chunk)
+            for chunk in iter_chunks(turns, self.chunk_tokens, self.average_turns)
+        ]
+
+    def missing(self, chunks: list[tuple[str, Window]]) -> list[tuple[str, Window]]:
+        """
+        This method returns the chunks not recognized by the previous runs.
+        """
+        with instrumentation.span("incremental.chunks", chunks=len(chunks)):
+            missing = [(key, chunk) for key, chunk in chunks if key not in self.state.segments]
+            instrumentation.count(cache_hits=len(chunks) - len(missing))
+        return missing
+
+    def recognize(self, inp: entities.Input, chunks: list[tuple[str, Window]]):
+        """
+        This method recognizes the tasks of the chunks (at most max_workers of the scrumer concurrently).
+
+        The tasks of every recognized chunk are recorded, then the first failure (if any) is raised.
+        """
+        if len(chunks) <= 1 or self.scrumer.max_workers == 1:
+            for key, chunk in chunks:
+                self.set_tasks(key, self.scrumer.recognize(self.chunk_input(inp, chunk)).tasks)
+            return
+        with futures.ThreadPoolExecutor(max_workers=min(self.scrumer.max_workers, len(chunks))) as executor:
+            pending = [
+                (key, instrumentation.submit(executor, self.scrumer.recognize, self.chunk_input(inp, chunk)))
+                for key, chunk in chunks
+            ]
+        for key, future in pending:
+            if future.exception() is None:
+                self.set_tasks(key, future.result().tasks)
+        for _, future in pending:
+            future.result()
+
+    async def arecognize(self, inp: entities.Input, chunks: list[tuple[str, Window]]):
+        """
+        This method is the asyncio version of the recognize method.
+        """
+        semaphore = asyncio.Semaphore(self.scrumer.max_workers)
+
+        async def recognize(chunk: Window) -> recognizer_entities.RecognizerOutput:
+            async with semaphore:
+                return await self.scrumer.arecognize(self.chunk_input(inp, chunk))
+
+        outputs = await asyncio.gather(*(recognize(chunk) for _, chunk in chunks), return_exceptions=True)
+        for (key, _), output in zip(chunks, outputs):
+            if not isinstance(output, BaseException):
+                self.set_tasks(key, output.tasks)
+        for output in outputs:
+            if isinstance(output, BaseException):
+                raise output
+
+    @staticmethod
+    def chunk_input(inp: entities.Input, chunk: Window) -> entities.Input:
+        """
+        This method returns the input of the chunk.
+        """
+        return inp.copy(update={"text": chunk.text})
+
+    def set_tasks(self, key: str, tasks: list[recognizer_entities.RecognizerTask]):
+        """
+        This method records the tasks recognized in the chunk.
+        """
+        self.state.segments[key] = [task.dict() for task in tasks]
+
+    def tasks(self, chunks: list[tuple[str, Window]]) -> list[recognizer_entities.RecognizerTask]:
+        """
+        This method returns the tasks of the chunks (in the order of the transcript).
+
+        The tasks traced to their source keep the offsets in the chunk in the state,
+        they are moved to the offsets in the current transcript.
+        """
+        return [
+            locate(recognizer_entities.RecognizerTask(**task), chunk)
+            for key, chunk in chunks
+            for task in self.state.segments[key]
+        ]
+
+    @staticmethod
+    def story_key(inp: entities.Input, task: recognizer_entities.RecognizerTask) -> str:
+        """
+        This method returns the key of the story of the task (its description and the paraphraser examples).
+        """
+        return make_key(text=task.description, examples=[example.dict() for example in inp.paraphraser_examples])
+
+    def missing_tasks(
+        self, inp: entities.Input, tasks: list[recognizer_entities.RecognizerTask]
+    ) -> list[recognizer_entities.RecognizerTask]:
+        """
+        This method returns the tasks not paraphrased by the previous runs.
+        """
+        with instrumentation.span("incremental.tasks", tasks=len(tasks)):
+            missing = [task for task in tasks if self.story_key(inp, task) not in self.state.stories]
+            instrumentation.count(cache_hits=len(tasks) - len(missing))
+        return missing
+
+    def set_stories(
+        self, inp: entities.Input, tasks: list[recognizer_entities.RecognizerTask], outcomes: list[Outcome]
+    ) -> dict[str, Outcome]:
+        """
+        This method records the stories of the tasks (the failed tasks are paraphrased again on the next run).
+
+        :return: The outcomes of the tasks by their keys.
+        """
+        fresh = {}
+        for task, outcome in zip(tasks, outcomes):
+            key = self.story_key(inp, task)
+            fresh[key] = outcome
+            if isinstance(outcome, entities.UserStory):
+                self.state.stories[key] = outcome.story
+        return fresh
+
+    def outcomes(
+        self, inp: entities.Input, tasks: list[recognizer_entities.RecognizerTask], fresh: dict[str, Outcome]
+    ) -> list[Outcome]:
+        """
+        This method returns the outcomes of the tasks, the fresh ones or the stories of the previous runs.
+        """
+        outcomes = []
+        for task in tasks:
+            key = self.story_key(inp, task)
+            outcome = fresh.get(key)
+            outcomes.append(outcome or entities.UserStory(task=task.description, story=self.state.stories[key]))
+        return outcomes
+
+    def save(self, inp: entities.Input, chunks: list[tuple[str, Window]]):
+        """
+        This method saves the state of the current transcript (the chunks recognized so far and the stories
+        of their tasks).
+        """
+        segments = {key for key, _ in chunks if key in self.state.segments}
+        stories = {
+            self.story_key(inp, recognizer_entities.RecognizerTask(**task))
+            for key in segments
+            for task in self.state.segments[key]
+        }
+        self.state.save(segments, stories)
@@ -0,0 +1,174 @@
+"""
+This module contains the instrumentation of the scrumit application.
+
+The stages of the pipeline and the model calls are wrapped in spans. A span measures the time of the stage
+and collects its counters (the tokens reported by the API, the cache hits, the retries).
+The spans are passed to the registered hooks (e.g. an exporter to a tracing backend) and aggregated per stage
+by the recorders of the current context, so Scrumer.convert can expose the aggregates on its output.
+
+The context is propagated to the asyncio tasks by asyncio itself, the worker threads get it through submit.
+"""
+
+import abc
+import contextlib
+import contextvars
+import dataclasses
+import threading
+import time
+from concurrent import futures
+from typing import Any, Callable, Iterator
+
+from scrumit.entity.scrumit import StageStats
+
+
+@dataclasses.dataclass
+class Span:
+    """
+    This class contains a single timed stage (OpenTelemetry-like: name, parent, timestamps and attributes).
+    """
+
+    name: str
+    parent: "Span | None" = None
+    attributes: dict[str, Any] = dataclasses.field(default_factory=dict)
+    counters: dict[str, int] = dataclasses.field(default_factory=dict)
+    start_time: float = dataclasses.field(default_factory=time.time)
+    duration: float = 0.0
+    error: BaseException | None = None
+
+
+class HookBase(abc.ABC):
+    """
+    This is an abstract class for the hooks receiving the spans.
+    """
+
+    def on_start(self, span: Span):
+        """
+        This method is called when the span starts.
+        """
+
+    @abc.abstractmethod
+    def on_end(self, span: Span):
+        """
+        This method is called when the span ends (its duration and counters are final).
+        """
+        ...
+
+
+class Recorder(HookBase):
+    """
+    This class aggregates the spans per stage (span name).
+    """
+
+    def __init__(self):
+        """
+        This method initializes the recorder.
+        """
+        self._stats: dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span):
+        with self._lock:
+            stats = self._stats.setdefault(span.name, StageStats())
+            stats.calls += 1
+            stats.seconds += span.duration
+            stats.errors += span.error is not None
+            for name, value in span.counters.items():
+                setattr(stats, name, getattr(stats, name) + value)
+
+    def stats(self) -> dict[str, StageStats]:
+        """
+        This method returns the aggregates recorded so far.
+
+        :return: The aggregates per stage (a copy).
+        """
+        with self._lock:
+            return {name: stats.copy() for name, stats in self._stats.items()}
+
+
+_hooks: list[HookBase] = []
+_recorders: contextvars.ContextVar[tuple[Recorder, ...]] = contextvars.ContextVar("recorders", default=())
+_current: contextvars.ContextVar[Span | None] = contextvars.ContextVar("span", default=None)
+
+
+def add_hook(hook: HookBase):
+    """
+    This function registers the hook receiving all the spans of the process.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: HookBase):
+    """
+    This function unregisters the hook.
+    """
+    _hooks.remove(hook)
+
+
+@contextlib.contextmanager
+def recording() -> Iterator[Recorder]:
+    """
+    This function records the spans of the current context (and the tasks and threads started from it).
+
+    :return: The recorder.
+    """
+    recorder = Recorder()
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _recorders.reset(token)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    This function times the stage of the pipeline.
+
+    :param name: Name of the stage (e.g. recognizer.model).
+    :param attributes: The attributes of the span.
+    :return: The span.
+    """
+    current = Span(name=name, parent=_current.get(), attributes=attributes)
+    listeners = [*_hooks, *_recorders.get()]
+    for hook in listeners:
+        hook.on_start(current)
+    token = _current.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as err:
+        current.error = err
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current.reset(token)
+        for hook in listeners:
+            hook.on_end(current)
+
+
+def count(**counters: int):
+    """
+    This function adds the counters (see StageStats) to the current span, if any.
+    """
+    current = _current.get()
+    if current is not None:
+        for name, value in counters.items():
+            current.counters[name] = current.counters.get(name, 0) + value
+
+
+def count_usage(response: Any):
+    """
+    This function adds the token usage reported by the OpenAI API to the current span.
+
+    :param response: The completion response (or the Promptify output with the usage keys inlined).
+    """
+    usage = response.get("usage", response) if isinstance(response, dict) else None
+    if usage:
+        count(prompt_tokens=usage.get("prompt_tokens", 0), completion_tokens=usage.get("completion_tokens", 0))
+
+
+def submit(executor: futures.Executor, function: Callable[..., Any], *args, **kwargs) -> futures.Future:
+    """
+    This function submits the function to the executor within a copy of the current context.
+    """
+    return executor.submit(contextvars.copy_context().run, function, *args, **kwargs)
@@ -0,0 +1,485 @@
+"""
+This module contains the durable job queue of the scrumit application.
+
+The batch is stored in a SQLite file (no broker). Every transcript is split into units of work:
+the recognition of the transcript and the paraphrasing of each of its tasks. The output of every unit
+is stored as soon as it is done, so a crashed or interrupted run resumes from the last finished unit
+and a failed unit is retried on its own (the stories of the other tasks are kept).
+Several worker processes can pull the units from the same file, a unit claimed by a worker that died
+is claimed again once its lease expires.
+"""
+
+import dataclasses
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Iterable
+
+from scrumit import instrumentation
+from scrumit.batch import OUTPUT_SUFFIX, PARTIAL_SUFFIX, Job, write_stories
+from scrumit.entity import recognizer as recognizer_entities, scrumit as entities
+from scrumit.paraphraser import exceptions as paraphraser_exceptions
+from scrumit.scrumer import Scrumer
+
+RECOGNITION = -1
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs (name TEXT PRIMARY KEY, domain TEXT NOT NULL, source TEXT, text TEXT, "
+    "status TEXT NOT NULL DEFAULT 'pending', created_at REAL NOT NULL, finished_at REAL)",
+    "CREATE TABLE IF NOT EXISTS units (job TEXT NOT NULL, position INTEGER NOT NULL, task TEXT, merged TEXT, "
+    "status TEXT NOT NULL DEFAULT 'pending', story TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+    "available_at REAL NOT NULL DEFAULT 0, worker TEXT, PRIMARY KEY (job, position))",
+    "CREATE INDEX IF NOT EXISTS units_available ON units (status, available_at)",
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class Unit:
+    """
+    This class contains a single unit of work claimed by a worker.
+    """
+
+    job: Job
+    position: int
+    task: recognizer_entities.RecognizerTask = None
+    attempts: int = 1
+    worker: str = None
+
+    @property
+    def recognition(self) -> bool:
+        return self.position == RECOGNITION
+
+
+@dataclasses.dataclass(frozen=True)
+class Progress:
+    """
+    This class contains the number of the transcripts and the units per status.
+    """
+
+    jobs: dict[str, int]
+    units: dict[str, int]
+
+    @property
+    def finished(self) -> bool:
+        return not self.units.get("pending") and not self.units.get("running") and not self.jobs.get("complete")
+
+
+class JobQueue:
+    """
+    This class stores the transcripts of the batch and the outputs of their units in a SQLite file.
+    """
+
+    def __init__(self, path: str, lease: float = 600.0, max_attempts: int = 3, retry_delay: float = 5.0):
+        """
+        This method initializes the queue.
+
+        :param path: Path to the SQLite database file (created if missing).
+        :param lease: Time in seconds a worker has to finish a claimed unit before other workers may claim it.
+        :param max_attempts: The number of attempts after which a unit is failed for good.
+        :param retry_delay: The delay of the first retry of a failed unit in seconds (doubled on every attempt).
+        """
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            self._connection.execute(statement)
+
+    def submit(self, jobs: Iterable[Job]) -> int:
+        """
+        This method adds the transcripts to the queue, the transcripts already queued (by name) are ignored.
+
+        :param jobs: The transcripts.
+        :return: The number of the added transcripts.
+        """
+        added = 0
+        now = time.time()
+        with self._transaction() as connection:
+            for job in jobs:
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO jobs (name, domain, source, text, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job.name, job.domain, job.source, job.text, now),
+                )
+                if cursor.rowcount:
+                    connection.execute("INSERT INTO units (job, position) VALUES (?, ?)", (job.name, RECOGNITION))
+                    added += 1
+        return added
+
+    def claim(self, worker: str, limit: int = 1) -> list[Unit]:
+        """
+        This method claims the next available units (the paraphrasing ones first, to finish the started transcripts).
+
+        A recognition unit is always claimed alone, the paraphrasing units up to the limit.
+
+        :param worker: Identifier of the worker.
+        :param limit: The maximum number of the claimed paraphrasing units.
+        :return: The claimed units (empty if none is available).
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            expired = connection.execute(
+                "SELECT DISTINCT job FROM units WHERE status = 'running' AND available_at <= ? AND attempts >= ?",
+                (now, self.max_attempts),
+            ).fetchall()
+            connection.execute(
+                "UPDATE units SET status = 'failed', error = 'The worker did not finish the unit in time.' "
+                "WHERE status = 'running' AND available_at <= ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            for (name,) in expired:
+                self._finish(connection, name)
+            rows = connection.execute(
+                "SELECT units.job, units.position, units.task, units.attempts, jobs.domain, jobs.source, jobs.text "
+                "FROM units JOIN jobs ON jobs.name = units.job "
+                "WHERE units.status IN ('pending', 'running') AND units.available_at <= ? "
+                "ORDER BY units.position = ?, jobs.created_at, units.job, units.position LIMIT ?",
+                (now, RECOGNITION, max(1, limit)),
+            ).fetchall()
+            # the paraphrasing units come first, a recognition unit is claimed only when none is available
+            rows = rows[:1] if rows and rows[0][1] == RECOGNITION else [row for row in rows if row[1] != RECOGNITION]
+            for row in rows:
+                connection.execute(
+                    "UPDATE units SET status = 'running', attempts = attempts + 1, available_at = ?, worker = ? "
+                    "WHERE job = ? AND position = ?",
+                    (now + self.lease, worker, row[0], row[1]),
+                )
+        return [
+            Unit(
+                job=Job(name=name, domain=domain, source=source, text=text),
+                position=position,
+                task=recognizer_entities.RecognizerTask.parse_raw(task) if task is not None else None,
+                attempts=attempts + 1,
+                worker=worker,
+            )
+            for name, position, task, attempts, domain, source, text in rows
+        ]
+
+    def complete_recognition(
+        self, unit: Unit, tasks: list[recognizer_entities.RecognizerTask], merged: list[list[str]]
+    ) -> bool:
+        """
+        This method stores the recognized tasks of the transcript and queues their paraphrasing.
+
+        :param unit: The recognition unit.
+        :param tasks: The recognized (deduplicated) tasks.
+        :param merged: The descriptions of the duplicates merged into each task.
+        :return: Whether the transcript is finished (it has no tasks).
+        Nothing is stored if the unit is no longer held by its worker.
+        """
+        with self._transaction() as connection:
+            if not self._settle(connection, unit, "status = 'done', error = NULL"):
+                return False
+            connection.executemany(
+                "INSERT OR IGNORE INTO units (job, position, task, merged) VALUES (?, ?, ?, ?)",
+                [
+                    (unit.job.name, position, task.json(), json.dumps(duplicates))
+                    for position, (task, duplicates) in enumerate(zip(tasks, merged))
+                ],
+            )
+            return self._finish(connection, unit.job.name)
+
+    def complete_story(self, unit: Unit, story: str) -> bool:
+        """
+        This method stores the user story of the task.
+
+        :param unit: The paraphrasing unit.
+        :param story: The user story.
+        :return: Whether the transcript is finished (all its units are done or failed for good).
+        Nothing is stored if the unit is no longer held by its worker.
+        """
+        with self._transaction() as connection:
+            if not self._settle(connection, unit, "status = 'done', story = ?, error = NULL", story):
+                return False
+            return self._finish(connection, unit.job.name)
+
+    def fail(self, unit: Unit, error: str) -> bool:
+        """
+        This method records the failure of the unit, it is retried later until max_attempts is reached.
+
+        :param unit: The failed unit.
+        :param error: The reason of the failure.
+        :return: Whether the transcript is finished (the unit failed for good and it was the last one).
+        Nothing is recorded if the unit is no longer held by its worker.
+        """
+        retry = unit.attempts < self.max_attempts
+        available_at = time.time() + self.retry_delay * 2 ** (unit.attempts - 1)
+        with self._transaction() as connection:
+            status = "pending" if retry else "failed"
+            if not self._settle(
+                connection, unit, "status = ?, error = ?, available_at = ?", status, error, available_at
+            ):
+                return False
+            return not retry and self._finish(connection, unit.job.name)
+
+    def retry_failed(self) -> int:
+        """
+        This method queues the units failed for good again (with their attempts reset).
+
+        :return: The number of the queued units.
+        """
+        with self._transaction() as connection:
+            count = connection.execute(
+                "UPDATE units SET status = 'pending', attempts = 0, available_at = 0 WHERE status = 'failed'"
+            ).rowcount
+            connection.execute(
+                "UPDATE jobs SET status = 'pending', finished_at = NULL "
+                "WHERE name IN (SELECT job FROM units WHERE status = 'pending')"
+            )
+        return count
+
+    def output(self, name: str) -> tuple[list[entities.UserStory], list[entities.TaskFailure], str | None]:
+        """
+        This method returns the stories of the transcript stored so far.
+
+        :param name: Name of the transcript.
+        :return: The stories and the failed tasks (in the order of the tasks) and the recognition error.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT position, task, merged, status, story, error FROM units WHERE job = ? ORDER BY position",
+                (name,),
+            ).fetchall()
+        stories: list[entities.UserStory] = []
+        failures: list[entities.TaskFailure] = []
+        error = None
+        for position, task, merged, status, story, reason in rows:
+            if position == RECOGNITION:
+                error = reason if status == "failed" else None
+                continue
+            description = recognizer_entities.RecognizerTask.parse_raw(task).description
+            if status == "done":
+                stories.append(entities.UserStory(task=description, story=story, merged=json.loads(merged)))
+            elif status == "failed":
+                failures.append(entities.TaskFailure(task=description, reason=reason))
+        return stories, failures, error
+
+    def unwritten(self) -> list[str]:
+        """
+        This method returns the transcripts whose units are all finished but whose output is not written yet
+        (e.g. the worker finishing them crashed before writing it).
+        """
+        with self._lock:
+            rows = self._connection.execute("SELECT name FROM jobs WHERE status = 'complete' ORDER BY name").fetchall()
+        return [name for (name,) in rows]
+
+    def mark_written(self, name: str):
+        """
+        This method marks the transcript done once its output file is written.
+
+        :param name: Name of the transcript.
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ? WHERE name = ? AND status = 'complete'",
+                (time.time(), name),
+            )
+
+    def progress(self) -> Progress:
+        """
+        This method returns the number of the transcripts and the units per status.
+        """
+        with self._lock:
+            jobs = self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+            units = self._connection.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall()
+        return Progress(jobs=dict(jobs), units=dict(units))
+
+    def close(self):
+        """
+        This method closes the database connection.
+        """
+        with self._lock:
+            self._connection.close()
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self._connection, self._lock)
+
+    @staticmethod
+    def _settle(connection: sqlite3.Connection, unit: Unit, assignments: str, *values) -> bool:
+        """
+        This method updates the unit only if it is still held by the worker that claimed it
+        (running, claimed by the same worker for the same attempt). A worker that overran its lease
+        must not overwrite the unit claimed (or already finished) by another one.
+
+        :param assignments: The SET clause of the update.
+        :param values: The values of the SET clause.
+        :return: Whether the unit was updated.
+        """
+        return bool(
+            connection.execute(
+                f"UPDATE units SET {assignments} WHERE job = ? AND position = ? "
+                "AND status = 'running' AND worker = ? AND attempts = ?",
+                (*values, unit.job.name, unit.position, unit.worker, unit.attempts),
+            ).rowcount
+        )
+
+    @staticmethod
+    def _finish(connection: sqlite3.Connection, name: str) -> bool:
+        """
+        This method marks the transcript complete once none of its units is left to do
+        (or failed if its recognition failed for good). It is done only once its output is written.
+
+        :return: Whether the transcript was finished by this call (so the worker writes its output right away).
+        """
+        left = connection.execute(
+            "SELECT COUNT(*) FROM units WHERE job = ? AND status IN ('pending', 'running')", (name,)
+        ).fetchone()[0]
+        if left:
+            return False
+        failed = connection.execute(
+            "SELECT COUNT(*) FROM units WHERE job = ? AND position = ? AND status = 'failed'", (name, RECOGNITION)
+        ).fetchone()[0]
+        return bool(
+            connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE name = ? AND status = 'pending'",
+                ("failed" if failed else "complete", time.time(), name),
+            ).rowcount
+        )
+
+
+class _Transaction:
+    """
+    This class runs the statements in an immediate (write-locked) transaction shared by the processes.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, lock: threading.Lock):
+        self.connection = connection
+        self.lock = lock
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.lock.acquire()
+        try:
+            self.connection.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.connection.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+        finally:
+            self.lock.release()
+
+
+class Worker:
+    """
+    This class pulls the units from the queue and runs them with the scrumer.
+    """
+
+    def __init__(self, scrumer: Scrumer, queue: JobQueue, output_dir: str, batch_size: int = 8, name: str = None):
+        """
+        This method initializes the worker.
+
+        :param scrumer: The scrumer recognizing the transcripts and paraphrasing their tasks.
+        :param queue: The queue of the units.
+        :param output_dir: The directory of the output files, written once a transcript is finished.
+        :param batch_size: The maximum number of the tasks paraphrased together.
+        :param name: Identifier of the worker. The host, the process and a random suffix if not provided.
+        """
+        self.scrumer = scrumer
+        self.queue = queue
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def run(self, poll_interval: float = 1.0, stop_when_idle: bool = True) -> list[str]:
+        """
+        This method runs the units until the queue is finished (or forever).
+
+        :param poll_interval: The delay between the claims when no unit is available in seconds.
+        :param stop_when_idle: Whether to stop once no unit is pending or running (retries included).
+        :return: The names of the transcripts finished by this worker.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        finished: list[str] = []
+        while True:
+            units = self.queue.claim(self.name, self.batch_size)
+            if units:
+                finished += self.run_units(units)
+                continue
+            # the outputs left unwritten by the crashed workers (or finished by the expired leases)
+            for name in self.queue.unwritten():
+                self.write_output(name)
+                finished.append(name)
+            if stop_when_idle and self.queue.progress().finished:
+                return finished
+            time.sleep(poll_interval)
+
+    def run_units(self, units: list[Unit]) -> list[str]:
+        """
+        This method runs the claimed units and stores their outputs.
+
+        :param units: The units claimed together (a recognition or the paraphrasing ones).
+        :return: The names of the transcripts finished by the units.
+        """
+        if units[0].recognition:
+            done = [self.recognize(units[0])]
+        else:
+            done = self.paraphrase(units)
+        finished = sorted({unit.job.name for unit, finished in zip(units, done) if finished})
+        for name in finished:
+            self.write_output(name)
+        return finished
+
+    def recognize(self, unit: Unit) -> bool:
+        """
+        This method recognizes (and deduplicates) the tasks of the transcript.
+        Any error fails the unit (retried later), the worker goes on.
+
+        :return: Whether the transcript is finished.
+        """
+        try:
+            with unit.job.open() as transcript:
+                text = transcript.read()
+            with instrumentation.span("jobs.recognition", job=unit.job.name, attempt=unit.attempts):
+                output = self.scrumer.recognize(entities.Input(text=text, domain=unit.job.domain))
+            tasks, merged = self.scrumer.deduplicate(output.tasks)
+        except Exception as e:
+            return self.queue.fail(unit, getattr(e, "message", None) or str(e) or type(e).__name__)
+        return self.queue.complete_recognition(unit, tasks, merged)
+
+    def paraphrase(self, units: list[Unit]) -> list[bool]:
+        """
+        This method paraphrases the tasks of the units (of any transcripts) with a single batch.
+        Any error of the batch fails all its units (retried later), the worker goes on.
+
+        :return: Whether each unit finished its transcript.
+        """
+        tasks = [unit.task for unit in units]
+        try:
+            with instrumentation.span("jobs.paraphrasing", tasks=len(tasks)):
+                outcomes = self.scrumer.paraphrase_tasks(tasks, [])
+        except Exception as e:
+            error = getattr(e, "message", None) or str(e) or type(e).__name__
+            outcomes = [paraphraser_exceptions.ParaphraserException(error) for _ in units]
+        return [
+            (
+                self.queue.fail(unit, outcome.message)
+                if isinstance(outcome, paraphraser_exceptions.ParaphraserException)
+                else self.queue.complete_story(unit, outcome.story)
+            )
+            for unit, outcome in zip(units, outcomes)
+        ]
+
+    def write_output(self, name: str):
+        """
+        This method writes the stories of the finished transcript to its output file (atomically)
+        and only then marks the transcript done.
+        """
+        stories, _, error = self.queue.output(name)
+        if error is not None:
+            return
+        path = os.path.join(self.output_dir, name + OUTPUT_SUFFIX)
+        # the partial file is private to the writer, two workers may rewrite the same output
+        partial = f"{path}.{uuid.uuid4().hex[:8]}{PARTIAL_SUFFIX}"
+        with open(partial, "w") as file:
+            write_stories(stories, file)
+        os.replace(partial, path)
+        self.queue.mark_written(name)
@@ -1 +1,16 @@
-from .openai import ParaphraserOpenAI  # noqa: F401
+"""
+The backends are imported on first use, so importing one backend does not load the dependencies of the others.
+"""
+import importlib
+
+_BACKENDS = {"ParaphraserOpenAI": ".openai"}
+
+
+def __getattr__(name: str):
+    if name in _BACKENDS:
+        return getattr(importlib.import_module(_BACKENDS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_BACKENDS])
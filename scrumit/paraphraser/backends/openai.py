@@ -1,14 +1,28 @@
 """
 This module contains the implementation of the Paraphraser class for the scrumit application using OpenAI backend.
 """
-from typing import Type  # noqa: TYP001
+import contextlib
+from typing import AsyncIterator, Iterator, Type  # noqa: TYP001
 
+import aiohttp
 from openai import Completion, error as openai_error
-from pydantic.tools import parse_file_as
 
+from scrumit import aio, instrumentation
+from scrumit.cache import CacheBase, make_key
 from scrumit.config import settings
 from scrumit.entity import paraphraser as entities
 from scrumit.paraphraser import base, exceptions
+from scrumit.paraphraser.rerank import StoryReranker
+from scrumit.paraphraser.stream import StoryStream
+from scrumit.ratelimit import LimiterBase, NoLimiter
+from scrumit.selection import ExampleSelector
+from scrumit.store import example_key, example_store, unique_examples
+from scrumit.templates import CompiledPrompt, TemplateCache
+from scrumit.transcript import estimate_tokens
+
+
+async def _noop():
+    pass
 
 
 class ParaphraserOpenAI(base.ParaphraserBase):
@@ -26,6 +40,14 @@ class ParaphraserOpenAI(base.ParaphraserBase):
         examples: list[entities.ParaphraserExample] = None,
         template_wo_ex: str = None,
         template_w_ex: str = None,
+        session: aiohttp.ClientSession = None,
+        cache: CacheBase = None,
+        batch_size: int = 20,
+        limiter: LimiterBase = None,
+        max_examples: int = None,
+        examples_max_tokens: int = None,
+        candidates: int = 1,
+        reranker: StoryReranker = None,
         **kwargs,
     ):
         """
@@ -41,11 +63,34 @@ class ParaphraserOpenAI(base.ParaphraserBase):
         Will override the default or global-defined templates if provided
         :param template_w_ex: The template to use when there are examples.
         Will override the default or global-defined templates if provided
+        :param session: The aiohttp session to reuse for the async calls.
+        If not provided, the paraphraser creates (and owns) one on the first async call.
+        :param cache: The cache of the paraphrased outputs. Nothing is cached if not provided.
+        :param batch_size: The maximum number of prompts packed into a single request by paraphrase_batch.
+        :param limiter: The rate limiter of the model calls (shared with the other backends of the account).
+        The calls are not limited (nor retried) if not provided.
+        :param max_examples: The maximum number of the examples in a prompt, the most relevant to the input are kept.
+        :param examples_max_tokens: The token budget of the examples in a prompt.
+        All the examples are sent if neither max_examples nor examples_max_tokens is provided.
+        :param candidates: The number of the user story candidates generated in a single request (the default n),
+        the best one is picked by the reranker.
+        :param reranker: The local reranker of the candidates. The default one if not provided.
         """
 
         self.client = client
-        self.default_examples: list[entities.ParaphraserExample] = []
-        self.ud_examples: list[entities.ParaphraserExample] = examples or []
+        self.session = aio.OpenAISession(session)
+        self.cache = cache
+        self.limiter = limiter or NoLimiter()
+        self.templates = TemplateCache()
+        self.selector = (
+            ExampleSelector("original_text", max_examples, examples_max_tokens)
+            if max_examples is not None or examples_max_tokens is not None
+            else None
+        )
+        self.batch_size = max(1, batch_size)
+        self.candidates = max(1, candidates)
+        self.reranker = reranker or StoryReranker()
+        self.ud_examples: list[entities.ParaphraserExample] = unique_examples(examples or [])
 
         self.include_default_examples = include_default_examples
         self.include_global_examples = include_global_examples
@@ -77,54 +122,396 @@ class ParaphraserOpenAI(base.ParaphraserBase):
         :keyword temperature: What sampling temperature to use.
         :keyword stop: One or more tokens where generation is stopped.
         :keyword engine: The engine to use for the API request.
-        :keyword n: Number of completions to generate for each prompt.
+        :keyword n: Number of completions to generate for each prompt, the best one is picked by the local reranker.
+        :keyword return_candidates: Whether to return all the scored candidates in the output
+        (the cache keeps only the best story, so it is not looked up).
         :keyword input_examples_only: Whether to use only the input examples or session configured ones.
+        :keyword use_cache: Whether to look up the cache or not (e.g. to get fresh samples when temperature > 0).
+        The fresh output still replaces the cached one.
+        :keyword stream: Whether to stream the completion and assemble the output from it (see paraphrase_stream).
+        :keyword stop_when_complete: Whether to cut the streamed generation once the story template is complete.
         """
 
-        input_examples_only = kwargs.get("input_examples_only", False)
-        examples = inp.examples if input_examples_only else self.get_examples(inp.examples)
-        prompt = self.get_prompt(inp, examples)
+        if kwargs.pop("stream", False):
+            return entities.ParaphraserOutput(user_story="".join(self.paraphrase_stream(inp, **kwargs)).strip())
+        request = self.get_request(inp, **kwargs)
+        cached = self.get_cached(request, **kwargs)
+        if cached is not None:
+            return cached
+        try:
+            with instrumentation.span("paraphraser.model", engine=request["engine"], prompts=1):
+                response = self.limiter.call(self.client.create, self.estimate_tokens(request), **request)
+                instrumentation.count_usage(response)
+        except openai_error.OpenAIError as err:
+            raise exceptions.ParaphraserModelError(str(err))
+        return self.set_cached(request, self.get_output(response, inp.text, kwargs.get("return_candidates", False)))
 
+    async def aparaphrase(self, inp: entities.ParaphraserInput, **kwargs) -> entities.ParaphraserOutput:
+        """
+        This method paraphrases the input text to the output text without blocking the event loop.
+
+        Accepts the same keywords as the paraphrase method.
+        """
+
+        if kwargs.pop("stream", False):
+            pieces = [piece async for piece in self.aparaphrase_stream(inp, **kwargs)]
+            return entities.ParaphraserOutput(user_story="".join(pieces).strip())
+        request = self.get_request(inp, **kwargs)
+        cached = self.get_cached(request, **kwargs)
+        if cached is not None:
+            return cached
         try:
-            response = self.client.create(
-                engine=kwargs.get("engine", "text-davinci-003"),
-                prompt=prompt,
-                max_tokens=kwargs.get("max_tokens", 60),
-                temperature=kwargs.get("temperature", 1),
-                n=kwargs.get("n", 1),
-                stop=kwargs.get("stop", None),
-            )
+            with self.session.bind(), instrumentation.span("paraphraser.model", engine=request["engine"], prompts=1):
+                response = await self.limiter.acall(self.client.acreate, self.estimate_tokens(request), **request)
+                instrumentation.count_usage(response)
         except openai_error.OpenAIError as err:
             raise exceptions.ParaphraserModelError(str(err))
-        if response and getattr(response, "choices", None):
-            paraphrased_story = response.choices[0].text.strip()
-            return entities.ParaphraserOutput(user_story=paraphrased_story)
+        return self.set_cached(request, self.get_output(response, inp.text, kwargs.get("return_candidates", False)))
+
+    def paraphrase_stream(self, inp: entities.ParaphraserInput, **kwargs) -> Iterator[str]:
+        """
+        This method paraphrases the input text yielding the user story piece by piece as the completion is streamed.
+
+        The leading whitespace is dropped. The generation is cancelled (the stream is closed) at the stop sequence
+        of the request and, unless stop_when_complete is False, as soon as the template of the story is complete.
+        A single completion is requested (n is 1, no candidates are reranked).
+        The assembled story is cached. Accepts the same keywords as the paraphrase method.
+        """
+
+        # only the first choice is streamed, the candidates are not generated
+        request = dict(self.get_request(inp, **kwargs), n=1)
+        key = self.get_stream_key(request, **kwargs)
+        cached = self.get_cached(key, **kwargs)
+        if cached is not None:
+            yield cached.user_story
+            return
+        story = StoryStream(kwargs.get("stop_when_complete", True), request["stop"])
+        with contextlib.closing(self._stream_completion(request)) as deltas:
+            for delta in deltas:
+                piece = story.add(delta)
+                if piece:
+                    yield piece
+                if story.complete:
+                    break
+        piece = story.flush()
+        if piece:
+            yield piece
+        self.set_cached(key, story.output())
+
+    async def aparaphrase_stream(self, inp: entities.ParaphraserInput, **kwargs) -> AsyncIterator[str]:
+        """
+        This method is the asyncio version of the paraphrase_stream method.
+        """
+
+        # only the first choice is streamed, the candidates are not generated
+        request = dict(self.get_request(inp, **kwargs), n=1)
+        key = self.get_stream_key(request, **kwargs)
+        cached = self.get_cached(key, **kwargs)
+        if cached is not None:
+            yield cached.user_story
+            return
+        story = StoryStream(kwargs.get("stop_when_complete", True), request["stop"])
+        async with contextlib.aclosing(self._astream_completion(request)) as deltas:
+            async for delta in deltas:
+                piece = story.add(delta)
+                if piece:
+                    yield piece
+                if story.complete:
+                    break
+        piece = story.flush()
+        if piece:
+            yield piece
+        self.set_cached(key, story.output())
+
+    def _stream_completion(self, request: dict) -> Iterator[str]:
+        try:
+            with instrumentation.span("paraphraser.model", engine=request["engine"], prompts=1, stream=True):
+                response = self.limiter.call(self.client.create, self.estimate_tokens(request), **request, stream=True)
+            try:
+                for chunk in response:
+                    if chunk["choices"][0].get("index", 0) == 0:
+                        yield chunk["choices"][0]["text"]
+            finally:
+                getattr(response, "close", lambda: None)()
+        except openai_error.OpenAIError as err:
+            raise exceptions.ParaphraserModelError(str(err))
+
+    async def _astream_completion(self, request: dict) -> AsyncIterator[str]:
+        try:
+            with self.session.bind(), instrumentation.span(
+                "paraphraser.model", engine=request["engine"], prompts=1, stream=True
+            ):
+                response = await self.limiter.acall(
+                    self.client.acreate, self.estimate_tokens(request), **request, stream=True
+                )
+            try:
+                async for chunk in response:
+                    if chunk["choices"][0].get("index", 0) == 0:
+                        yield chunk["choices"][0]["text"]
+            finally:
+                await getattr(response, "aclose", _noop)()
+        except openai_error.OpenAIError as err:
+            raise exceptions.ParaphraserModelError(str(err))
+
+    def paraphrase_batch(
+        self, inputs: list[entities.ParaphraserInput], return_exceptions: bool = False, **kwargs
+    ) -> list[base.Outcome]:
+        """
+        This method paraphrases several input texts packing up to batch_size prompts into a single request.
+
+        The choices of the response are mapped back to the inputs by their index.
+        The inputs left without a choice (all of them if the request fails) are paraphrased one by one.
+        Accepts the same keywords as the paraphrase method.
+        """
+
+        requests = [self.get_request(inp, **kwargs) for inp in inputs]
+        outputs: list[base.Outcome | None] = [self.get_cached(request, **kwargs) for request in requests]
+        for chunk in self.get_missing_chunks(outputs):
+            try:
+                packed = self.get_packed_request([requests[i] for i in chunk])
+                with instrumentation.span("paraphraser.model", engine=packed["engine"], prompts=len(chunk)):
+                    response = self.limiter.call(self.client.create, self.estimate_tokens(packed), **packed)
+                    instrumentation.count_usage(response)
+            except openai_error.OpenAIError:
+                continue
+            self.set_packed_outputs(outputs, chunk, requests, response, inputs, kwargs.get("return_candidates", False))
+        missing = [index for index, output in enumerate(outputs) if output is None]
+        fallback = super().paraphrase_batch([inputs[index] for index in missing], return_exceptions, **kwargs)
+        for index, outcome in zip(missing, fallback):
+            outputs[index] = outcome
+        return outputs
+
+    async def aparaphrase_batch(
+        self, inputs: list[entities.ParaphraserInput], return_exceptions: bool = False, **kwargs
+    ) -> list[base.Outcome]:
+        """
+        This method is the asyncio version of the paraphrase_batch method.
+        """
+
+        requests = [self.get_request(inp, **kwargs) for inp in inputs]
+        outputs: list[base.Outcome | None] = [self.get_cached(request, **kwargs) for request in requests]
+        for chunk in self.get_missing_chunks(outputs):
+            try:
+                packed = self.get_packed_request([requests[i] for i in chunk])
+                with self.session.bind(), instrumentation.span(
+                    "paraphraser.model", engine=packed["engine"], prompts=len(chunk)
+                ):
+                    response = await self.limiter.acall(self.client.acreate, self.estimate_tokens(packed), **packed)
+                    instrumentation.count_usage(response)
+            except openai_error.OpenAIError:
+                continue
+            self.set_packed_outputs(outputs, chunk, requests, response, inputs, kwargs.get("return_candidates", False))
+        missing = [index for index, output in enumerate(outputs) if output is None]
+        fallback = await super().aparaphrase_batch([inputs[index] for index in missing], return_exceptions, **kwargs)
+        for index, outcome in zip(missing, fallback):
+            outputs[index] = outcome
+        return outputs
+
+    def warm_up(self):
+        """
+        This method loads the examples and compiles the prompt of the session examples.
+        """
+        self.get_compiled_prompt(self.get_examples([]))
+
+    async def aclose(self):
+        """
+        This method closes the aiohttp session if it is owned by the paraphraser.
+        """
+        await self.session.close()
+
+    def get_request(self, inp: entities.ParaphraserInput, **kwargs) -> dict:
+        """
+        This method returns the parameters of the completion request for the input.
+
+        :param inp: The input text to paraphrase.
+        :return: The keyword arguments of the completion request.
+        """
+        input_examples_only = kwargs.get("input_examples_only", False)
+        with instrumentation.span("paraphraser.examples"):
+            examples = inp.examples if input_examples_only else self.get_examples(inp.examples)
+            if self.selector is not None:
+                examples = self.selector.select(inp.text, examples, pinned=inp.examples)
+        with instrumentation.span("paraphraser.prompt"):
+            prompt = self.get_prompt(inp, examples)
+        return dict(
+            engine=kwargs.get("engine", "text-davinci-003"),
+            prompt=prompt,
+            max_tokens=kwargs.get("max_tokens", 60),
+            temperature=kwargs.get("temperature", 1),
+            n=kwargs.get("n", self.candidates),
+            stop=kwargs.get("stop", None),
+        )
+
+    @staticmethod
+    def estimate_tokens(request: dict) -> int:
+        """
+        This method estimates the number of tokens of the request (the prompts and the completions).
+
+        :param request: The keyword arguments of the (packed) completion request.
+        :return: The estimated number of tokens.
+        """
+        prompts = request["prompt"] if isinstance(request["prompt"], list) else [request["prompt"]]
+        return sum(estimate_tokens(prompt) + request["max_tokens"] * request["n"] for prompt in prompts)
+
+    def get_missing_chunks(self, outputs: list[base.Outcome | None]) -> list[list[int]]:
+        """
+        This method splits the indexes of the missing outputs to chunks of batch_size.
+
+        :param outputs: The outputs (None if missing).
+        :return: The chunks of the indexes.
+        """
+        missing = [index for index, output in enumerate(outputs) if output is None]
+        return [missing[start : start + self.batch_size] for start in range(0, len(missing), self.batch_size)]
+
+    @staticmethod
+    def get_packed_request(requests: list[dict]) -> dict:
+        """
+        This method packs the requests (differing only by their prompts) into a single one.
+
+        :param requests: The keyword arguments of the completion requests.
+        :return: The keyword arguments of the packed completion request.
+        """
+        return {**requests[0], "prompt": [request["prompt"] for request in requests]}
+
+    def set_packed_outputs(
+        self,
+        outputs: list[base.Outcome | None],
+        chunk: list[int],
+        requests: list[dict],
+        response,
+        inputs: list[entities.ParaphraserInput],
+        return_candidates: bool = False,
+    ):
+        """
+        This method maps the choices of the packed response back to the outputs.
+
+        The choices are indexed prompt by prompt (n choices per prompt), the best choice of each prompt is used.
+
+        :param outputs: The outputs to fill in.
+        :param chunk: The indexes of the packed requests.
+        :param requests: The keyword arguments of all the completion requests.
+        :param response: The packed completion response.
+        :param inputs: The inputs of all the completion requests.
+        :param return_candidates: Whether to keep all the scored candidates in the outputs.
+        """
+        n = requests[chunk[0]]["n"]
+        texts: dict[int, list[str]] = {}
+        with instrumentation.span("paraphraser.parse"):
+            for choice in sorted(getattr(response, "choices", None) or [], key=lambda choice: choice.index):
+                texts.setdefault(choice.index // n, []).append(choice.text)
+        for position, index in enumerate(chunk):
+            if any(text.strip() for text in texts.get(position, [])):
+                output = self.select(texts[position], inputs[index].text, return_candidates)
+                outputs[index] = self.set_cached(requests[index], output)
+
+    @staticmethod
+    def get_stream_key(request: dict, **kwargs) -> dict:
+        """
+        This method returns the request identifying the streamed output in the cache.
+
+        The streamed stories may be cut, so they are cached apart from the full completions (and per the cut).
+
+        :param request: The keyword arguments of the completion request.
+        :return: The request with the stream mode.
+        """
+        return dict(request, stream="complete" if kwargs.get("stop_when_complete", True) else "full")
+
+    def get_cached(self, request: dict, **kwargs) -> entities.ParaphraserOutput | None:
+        """
+        This method returns the cached output of the request.
+
+        :param request: The keyword arguments of the completion request.
+        :return: The cached output or None if there is none (or the cache is bypassed,
+        also when the candidates are requested as the cache keeps only the best story).
+        """
+        if self.cache is None or not kwargs.get("use_cache", True) or kwargs.get("return_candidates", False):
+            return None
+        with instrumentation.span("paraphraser.cache"):
+            user_story = self.cache.get(make_key(**request))
+            instrumentation.count(cache_hits=int(user_story is not None))
+        return entities.ParaphraserOutput(user_story=user_story) if user_story is not None else None
+
+    def set_cached(self, request: dict, output: entities.ParaphraserOutput) -> entities.ParaphraserOutput:
+        """
+        This method caches the output of the request.
+
+        :param request: The keyword arguments of the completion request.
+        :param output: The paraphrased output.
+        :return: The paraphrased output.
+        """
+        if self.cache is not None:
+            self.cache.set(make_key(**request), output.user_story)
+        return output
+
+    def get_output(self, response, source: str, return_candidates: bool = False) -> entities.ParaphraserOutput:
+        """
+        This method converts the completion response to the paraphraser output.
+
+        :param response: The completion response.
+        :param source: The paraphrased text (the candidates are scored against it).
+        :param return_candidates: Whether to keep all the scored candidates in the output.
+        :return: The paraphrased output text (user story in our case).
+        """
+        with instrumentation.span("paraphraser.parse"):
+            if response and getattr(response, "choices", None):
+                return self.select([choice.text for choice in response.choices], source, return_candidates)
         raise exceptions.ParaphraserModelError("No response from the OpenAI API.")
 
+    def select(self, texts: list[str], source: str, return_candidates: bool = False) -> entities.ParaphraserOutput:
+        """
+        This method picks the best of the completions by the local reranking (the only one is taken as is).
+
+        :param texts: The completions of the prompt.
+        :param source: The paraphrased text.
+        :param return_candidates: Whether to keep all the scored candidates in the output.
+        :return: The paraphrased output text (user story in our case).
+        """
+        if len(texts) == 1 and not return_candidates:
+            return entities.ParaphraserOutput(user_story=texts[0].strip())
+        with instrumentation.span("paraphraser.rerank", candidates=len(texts)):
+            candidates = self.reranker.rank(texts, source)
+        if not candidates:
+            raise exceptions.ParaphraserModelError("No response from the OpenAI API.")
+        return entities.ParaphraserOutput(
+            user_story=candidates[0].user_story, candidates=candidates if return_candidates else []
+        )
+
+    def add_examples(self, examples: list[entities.ParaphraserExample]):
+        """
+        This method adds the examples to the current session (the already present ones are skipped).
+
+        :param examples: The examples to add.
+        """
+        self.ud_examples = unique_examples(self.ud_examples + examples)
+
     def get_examples(self, input_examples: list[entities.ParaphraserExample]) -> list[entities.ParaphraserExample]:
         """
         This method returns the examples to use for the current session.
 
+        It does not modify the session, so the examples (and the prompt) do not grow across calls.
+
         :param input_examples: The examples to use for the current input text.
-        :return: The examples to use for the current session [list of ParaphraserExample].
+        :return: The examples to use for the current session [list of ParaphraserExample] without duplicates.
         """
+        default_examples: list[entities.ParaphraserExample] = []
+        global_examples: list[entities.ParaphraserExample] = []
         if self.include_default_examples:
             try:
-                self.default_examples += parse_file_as(
-                    list[entities.ParaphraserExample], settings.default_paraphraser_examples_json
+                default_examples = example_store.load(
+                    entities.ParaphraserExample, settings.default_paraphraser_examples_json
                 )
             # TODO: Specify exception
             except Exception as exc:
                 raise exceptions.ParaphraserException("Error while parsing the default examples file: %s" % str(exc))
         if settings.paraphraser_examples_json and self.include_global_examples:
             try:
-                self.ud_examples += parse_file_as(list[entities.ParaphraserExample], settings.paraphraser_examples_json)
+                global_examples = example_store.load(entities.ParaphraserExample, settings.paraphraser_examples_json)
             # TODO: Specify exception
             except Exception as exc:
                 raise exceptions.ParaphraserSerializationException(
                     "Error while parsing the global examples file: %s" % str(exc)
                 )
-        return input_examples + self.default_examples + self.ud_examples
+        return unique_examples(input_examples + default_examples + self.ud_examples + global_examples)
 
     @staticmethod
     def get_examples_as_str(examples: list[entities.ParaphraserExample]) -> str:
@@ -148,6 +535,20 @@ class ParaphraserOpenAI(base.ParaphraserBase):
         :param examples: The examples to use for the current session.
         :return: The prompt to use for the current session.
         """
+        return self.get_compiled_prompt(examples).render(inp.text)
+
+    def get_compiled_prompt(self, examples: list[entities.ParaphraserExample]) -> CompiledPrompt:
+        """
+        This method returns the prompt rendered with everything but the input text.
+
+        The examples block is built once per template and example set, its prefix is static across the calls.
+
+        :param examples: The examples to use for the current session.
+        :return: The compiled prompt.
+        """
         if examples:
-            return self.template_w_ex % (self.get_examples_as_str(examples), inp.text)
-        return self.template_wo_ex % inp.text
+            return self.templates.compile(
+                (self.template_w_ex, *map(example_key, examples)),
+                lambda text: self.template_w_ex % (self.get_examples_as_str(examples), text),
+            )
+        return self.templates.compile((self.template_wo_ex,), lambda text: self.template_wo_ex % text)
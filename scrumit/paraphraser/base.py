@@ -5,8 +5,13 @@ Paraphraser is implementation of Text Summarization.
 """
 
 import abc
+import asyncio
+from typing import AsyncIterator, Iterator
 
 from scrumit.entity import paraphraser as entities
+from scrumit.paraphraser import exceptions
+
+Outcome = entities.ParaphraserOutput | exceptions.ParaphraserException
 
 
 class ParaphraserBase(abc.ABC):
@@ -20,3 +25,82 @@ class ParaphraserBase(abc.ABC):
         This method paraphrases the input text to the output text.
         """
         ...
+
+    async def aparaphrase(self, inp: entities.ParaphraserInput, **kwargs) -> entities.ParaphraserOutput:
+        """
+        This method is the asyncio version of the paraphrase method.
+
+        Backends should override it with a native implementation,
+        by default the synchronous method is run in a worker thread.
+        """
+        return await asyncio.to_thread(self.paraphrase, inp, **kwargs)
+
+    def paraphrase_stream(self, inp: entities.ParaphraserInput, **kwargs) -> Iterator[str]:
+        """
+        This method paraphrases the input text yielding the user story piece by piece as it is generated.
+
+        By default the whole user story is yielded at once.
+
+        :param inp: The input text to paraphrase.
+        :return: The pieces of the user story.
+        """
+        yield self.paraphrase(inp, **kwargs).user_story
+
+    async def aparaphrase_stream(self, inp: entities.ParaphraserInput, **kwargs) -> AsyncIterator[str]:
+        """
+        This method is the asyncio version of the paraphrase_stream method.
+        """
+        yield (await self.aparaphrase(inp, **kwargs)).user_story
+
+    def paraphrase_batch(
+        self, inputs: list[entities.ParaphraserInput], return_exceptions: bool = False, **kwargs
+    ) -> list[Outcome]:
+        """
+        This method paraphrases several input texts.
+
+        Backends able to serve several inputs with a single request should override it,
+        by default the inputs are paraphrased one by one.
+
+        :param inputs: The input texts to paraphrase.
+        :param return_exceptions: Whether to return the exceptions of the failed inputs in their place
+        or to raise the first one.
+        :return: The paraphrased outputs in the order of the inputs.
+        """
+        outcomes: list[Outcome] = []
+        for inp in inputs:
+            try:
+                outcomes.append(self.paraphrase(inp, **kwargs))
+            except exceptions.ParaphraserException as e:
+                if not return_exceptions:
+                    raise
+                outcomes.append(e)
+        return outcomes
+
+    async def aparaphrase_batch(
+        self, inputs: list[entities.ParaphraserInput], return_exceptions: bool = False, **kwargs
+    ) -> list[Outcome]:
+        """
+        This method is the asyncio version of the paraphrase_batch method.
+
+        By default the inputs are paraphrased one by one.
+        """
+        outcomes: list[Outcome] = []
+        for inp in inputs:
+            try:
+                outcomes.append(await self.aparaphrase(inp, **kwargs))
+            except exceptions.ParaphraserException as e:
+                if not return_exceptions:
+                    raise
+                outcomes.append(e)
+        return outcomes
+
+    def warm_up(self):
+        """
+        This method prepares the state reused by the calls (e.g. the examples, the compiled prompts)
+        ahead of the first call. Nothing is prepared by default.
+        """
+
+    async def aclose(self):
+        """
+        This method releases the resources (e.g. connections) held by the asyncio methods.
+        """
@@ -0,0 +1,115 @@
+"""
+This module contains the local reranking of the user story candidates.
+
+The paraphraser can request several candidates in a single call (n) instead of calling the model again
+when a story comes out poor. The candidates are scored with cheap checks: the conformance
+to the "As a <persona>, I want <goal> so that <benefit>" template, the length and the overlap
+of the content words with the source task. The best candidate is the user story.
+"""
+
+import re as regex
+
+from scrumit.entity import paraphraser as entities
+
+TEMPLATE = regex.compile(
+    r"^\W*as an? (?P<persona>.+?),? i (?:want|need|would like)(?: to)? (?P<goal>.+?),? so (?:that )?(?P<benefit>.+)$",
+    regex.IGNORECASE | regex.DOTALL,
+)
+PARTIAL_TEMPLATE = regex.compile(r"^\W*as an? .+?,? i (?:want|need|would like)\b", regex.IGNORECASE)
+WORD = regex.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be by can for from i in is it of on or so that the this to want we with".split()
+)
+
+
+def content_words(text: str) -> set[str]:
+    """
+    This function returns the lower-cased words of the text without the stop words.
+    """
+    return {word for word in WORD.findall(text.lower()) if word not in STOP_WORDS}
+
+
+class StoryReranker:
+    """
+    This class scores the user story candidates and picks the best one.
+    """
+
+    def __init__(
+        self,
+        min_words: int = 10,
+        max_words: int = 45,
+        template_weight: float = 0.5,
+        length_weight: float = 0.2,
+        overlap_weight: float = 0.3,
+    ):
+        """
+        This method initializes the reranker.
+
+        :param min_words: The number of words below which a story is penalized (truncated or too vague).
+        :param max_words: The number of words above which a story is penalized (rambling).
+        :param template_weight: The weight of the template conformance.
+        :param length_weight: The weight of the length check.
+        :param overlap_weight: The weight of the overlap with the source task.
+        """
+        self.min_words = min_words
+        self.max_words = max_words
+        self.template_weight = template_weight
+        self.length_weight = length_weight
+        self.overlap_weight = overlap_weight
+
+    def score(self, story: str, source: str) -> float:
+        """
+        This method scores the user story candidate.
+
+        :param story: The candidate.
+        :param source: The source task.
+        :return: The score between 0 and 1 (the higher the better).
+        """
+        return (
+            self.template_weight * self.template_score(story)
+            + self.length_weight * self.length_score(story)
+            + self.overlap_weight * self.overlap_score(story, source)
+        )
+
+    @staticmethod
+    def template_score(story: str) -> float:
+        """
+        This method scores the conformance to the template (1 for all three parts, 0.5 without the benefit).
+        """
+        if TEMPLATE.match(story.strip()):
+            return 1.0
+        return 0.5 if PARTIAL_TEMPLATE.match(story.strip()) else 0.0
+
+    def length_score(self, story: str) -> float:
+        """
+        This method scores the length of the story (1 within the bounds, decreasing linearly outside).
+        """
+        words = len(story.split())
+        if words < self.min_words:
+            return words / self.min_words
+        if words > self.max_words:
+            return max(0.0, 1 - (words - self.max_words) / self.max_words)
+        return 1.0
+
+    @staticmethod
+    def overlap_score(story: str, source: str) -> float:
+        """
+        This method scores the share of the content words of the source task kept in the story.
+        """
+        words = content_words(source)
+        return len(words & content_words(story)) / len(words) if words else 1.0
+
+    def rank(self, stories: list[str], source: str) -> list[entities.ParaphraserCandidate]:
+        """
+        This method scores the candidates and sorts them from the best one.
+
+        :param stories: The candidates (empty ones are dropped).
+        :param source: The source task.
+        :return: The scored candidates, the best first (the earlier one on ties).
+        """
+        candidates = [
+            entities.ParaphraserCandidate(user_story=story, score=round(self.score(story, source), 4))
+            for story in dict.fromkeys(story.strip() for story in stories)
+            if story
+        ]
+        return sorted(candidates, key=lambda candidate: -candidate.score)
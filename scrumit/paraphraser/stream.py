@@ -0,0 +1,113 @@
+"""
+This module contains the assembly of the streamed user stories.
+
+The story is cut at the end of the template (the sentence closing its "so that" clause)
+or at the stop sequence of the request, so the rest of the generation can be cancelled.
+"""
+
+import re as regex
+
+from scrumit.entity import paraphraser as entities
+from scrumit.paraphraser import exceptions
+from scrumit.paraphraser.rerank import TEMPLATE
+
+SENTENCE_END = regex.compile(r"[.!?][\"'”]?(?=\s)|\n")
+ABBREVIATION = regex.compile(r"(?:\w\.\w+|\b(?:etc|vs|approx|incl|cf|esp)\W*)\.\W*$", regex.IGNORECASE)
+MIN_BENEFIT_WORDS = 2
+
+
+class StoryStream:
+    """
+    This class assembles the user story from the streamed completion.
+    """
+
+    def __init__(self, stop_when_complete: bool = True, stop: str | list[str] = None):
+        """
+        This method initializes the stream.
+
+        :param stop_when_complete: Whether to cut the story once the template is complete
+        (the sentence of its "so that" clause ended). A story not following the template is not cut.
+        :param stop: The stop sequences of the request, the story is always cut at the first one.
+        """
+        self.stop_when_complete = stop_when_complete
+        self.stop = [stop] if isinstance(stop, str) else [sequence for sequence in stop or [] if sequence]
+        self.text = ""
+        self.emitted = 0
+        self.complete = False
+
+    def add(self, delta: str) -> str:
+        """
+        This method appends the next piece of the completion.
+
+        :param delta: The piece of the completion.
+        :return: The part of the story ready to be emitted (the leading whitespace and the text after
+        the complete story are dropped, the text possibly starting a stop sequence is held back).
+        """
+        if self.complete:
+            return ""
+        if not self.text:
+            delta = delta.lstrip()
+        start = len(self.text)
+        self.text += delta
+        end = self.stop_end(start)
+        if end is None and self.stop_when_complete:
+            end = self.template_end(start)
+        if end is not None:
+            self.text = self.text[:end]
+            self.complete = True
+            return self.flush()
+        held = max((len(sequence) - 1 for sequence in self.stop), default=0)
+        return self.emit(max(self.emitted, len(self.text) - held))
+
+    def flush(self) -> str:
+        """
+        This method returns the rest of the story not emitted yet (the completion is over).
+        """
+        return self.emit(len(self.text))
+
+    def emit(self, end: int) -> str:
+        """
+        This method returns the story up to the position from the end of the emitted part.
+        """
+        piece, self.emitted = self.text[self.emitted : end], end
+        return piece
+
+    def stop_end(self, start: int) -> int | None:
+        """
+        This method returns the position of the first stop sequence (None if there is none yet).
+
+        :param start: The position of the new piece, the sequences may begin before it.
+        """
+        positions = [
+            position
+            for sequence in self.stop
+            if (position := self.text.find(sequence, max(0, start - len(sequence) + 1))) >= 0
+        ]
+        return min(positions, default=None)
+
+    def template_end(self, start: int) -> int | None:
+        """
+        This method returns the end of the sentence completing the template (None if it is not complete yet).
+
+        The sentence ends after an abbreviation (e.g. "e.g.") are skipped.
+
+        :param start: The position of the new piece, the sentence end may begin before it.
+        """
+        for match in SENTENCE_END.finditer(self.text, max(0, start - 2)):
+            story = self.text[: match.end()]
+            if ABBREVIATION.search(story.rstrip()):
+                continue
+            template = TEMPLATE.match(story.strip())
+            if template and len(template["benefit"].split()) >= MIN_BENEFIT_WORDS:
+                return match.end()
+        return None
+
+    def output(self) -> entities.ParaphraserOutput:
+        """
+        This method returns the assembled user story.
+
+        :raises ParaphraserModelError: If the completion was empty.
+        """
+        if not self.text.strip():
+            raise exceptions.ParaphraserModelError("No response from the OpenAI API.")
+        return entities.ParaphraserOutput(user_story=self.text.strip())
@@ -0,0 +1,220 @@
+"""
+This module contains the client-side rate limiter of the OpenAI backends.
+
+The limiter budgets the requests and the estimated tokens per minute with token buckets
+and adapts the number of the concurrent requests AIMD-style: the window grows by one request per window
+of successful calls and halves on every rate limit error. The rate limited calls are retried with jittered
+exponential backoff (or after the delay requested by the API).
+"""
+
+import abc
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+from openai import error as openai_error
+
+from scrumit import instrumentation
+
+RETRIABLE_ERRORS = (openai_error.RateLimitError, openai_error.ServiceUnavailableError)
+
+
+class LimiterBase(abc.ABC):
+    """
+    This is an abstract class for the limiters of the model calls.
+    """
+
+    @abc.abstractmethod
+    def call(self, function: Callable[..., Any], tokens: int, *args, **kwargs) -> Any:
+        """
+        This method calls the function within the limits.
+
+        :param function: The function making the request.
+        :param tokens: The estimated number of tokens of the request (the prompt and the completion).
+        :return: The result of the function.
+        """
+        ...
+
+    @abc.abstractmethod
+    async def acall(self, function: Callable[..., Awaitable[Any]], tokens: int, *args, **kwargs) -> Any:
+        """
+        This method is the asyncio version of the call method.
+        """
+        ...
+
+
+class NoLimiter(LimiterBase):
+    """
+    This class calls the functions right away (no limits, no retries).
+    """
+
+    def call(self, function: Callable[..., Any], tokens: int, *args, **kwargs) -> Any:
+        return function(*args, **kwargs)
+
+    async def acall(self, function: Callable[..., Awaitable[Any]], tokens: int, *args, **kwargs) -> Any:
+        return await function(*args, **kwargs)
+
+
+class TokenBucket:
+    """
+    This class implements the token bucket (not thread-safe, the limiter guards it).
+
+    A request larger than the capacity is let through once the bucket is full and leaves the bucket in debt.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        This method initializes the bucket (full).
+
+        :param rate: The refill rate per second.
+        :param capacity: The maximum level of the bucket.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        This method returns the seconds to wait until the amount can be taken (0 if it can be taken right away).
+        """
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        self.level -= amount
+
+
+class RateLimiter(LimiterBase):
+    """
+    This class limits the requests and the tokens per minute and the number of the concurrent requests.
+
+    A single limiter should be shared by all the backends calling the same account.
+    """
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        requests_per_minute: int = 3000,
+        tokens_per_minute: int = 250_000,
+        max_concurrency: int = 16,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        burst_seconds: float = 10.0,
+    ):
+        """
+        This method initializes the limiter.
+
+        :param requests_per_minute: The quota of the requests per minute.
+        :param tokens_per_minute: The quota of the tokens (the prompts and the completions) per minute.
+        :param max_concurrency: The maximum number of the concurrent requests.
+        :param max_retries: The maximum number of the retries of a rate limited request.
+        :param base_delay: The backoff delay of the first retry in seconds (doubled on every retry).
+        :param max_delay: The maximum backoff delay in seconds.
+        :param burst_seconds: The number of seconds of the quota that can be spent at once.
+        """
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute / 60 * burst_seconds)
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 60 * burst_seconds)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = float(self.max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self._decreased_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def call(self, function: Callable[..., Any], tokens: int, *args, **kwargs) -> Any:
+        attempt = 0
+        while True:
+            while (wait := self._reserve(tokens)) > 0:
+                time.sleep(wait)
+            try:
+                result = function(*args, **kwargs)
+            except RETRIABLE_ERRORS as err:
+                self._release(rate_limited=True)
+                if attempt >= self.max_retries:
+                    raise
+                instrumentation.count(retries=1)
+                time.sleep(self.backoff(attempt, err))
+                attempt += 1
+                continue
+            except BaseException:
+                self._release()
+                raise
+            self._release(succeeded=True)
+            return result
+
+    async def acall(self, function: Callable[..., Awaitable[Any]], tokens: int, *args, **kwargs) -> Any:
+        attempt = 0
+        while True:
+            while (wait := self._reserve(tokens)) > 0:
+                await asyncio.sleep(wait)
+            try:
+                result = await function(*args, **kwargs)
+            except RETRIABLE_ERRORS as err:
+                self._release(rate_limited=True)
+                if attempt >= self.max_retries:
+                    raise
+                instrumentation.count(retries=1)
+                await asyncio.sleep(self.backoff(attempt, err))
+                attempt += 1
+                continue
+            except BaseException:
+                self._release()
+                raise
+            self._release(succeeded=True)
+            return result
+
+    def backoff(self, attempt: int, err: Exception = None) -> float:
+        """
+        This method returns the delay before the retry (full jitter, at least the delay requested by the API).
+
+        :param attempt: The number of the failed attempts so far (0 for the first retry).
+        :param err: The error of the failed attempt.
+        :return: The delay in seconds.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        headers = getattr(err, "headers", None) or {}
+        try:
+            return max(delay, float(headers.get("retry-after", 0)))
+        except (TypeError, ValueError):
+            return delay
+
+    def _reserve(self, tokens: int) -> float:
+        """
+        This method reserves a request slot and its budget or returns the seconds to wait before trying again.
+        """
+        with self._lock:
+            if self.in_flight >= int(self.concurrency):
+                return self.POLL_INTERVAL
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait > 0:
+                return wait
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            return 0.0
+
+    def _release(self, succeeded: bool = False, rate_limited: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            if succeeded:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            elif rate_limited:
+                now = time.monotonic()
+                # a burst of errors of the requests sent together halves the window only once
+                if now - self._decreased_at >= self.base_delay:
+                    self.concurrency = max(1.0, self.concurrency / 2)
+                    self._decreased_at = now
@@ -0,0 +1,382 @@
+"""
+This module contains the local Recognizer class for the scrumit application.
+
+The transcript is split to sentences and every sentence is scored for actionability by a small
+logistic regression over hashed words, bigrams and rule features (imperative verbs, modal phrases,
+deadlines, problem reports, small talk). The rule features start from hand-set weights,
+the words are learned from the RecognizerExample data (see training_data).
+It runs on the CPU in milliseconds and needs no remote call.
+"""
+
+import dataclasses
+import re as regex
+import threading
+import zlib
+from typing import Iterator, Sequence
+
+import numpy as np
+
+from scrumit import instrumentation
+from scrumit.config import settings
+from scrumit.entity import recognizer as entities
+from scrumit.recognizer import base, exceptions
+from scrumit.store import example_key, example_store, unique_examples
+from scrumit.transcript import Turn
+
+BOUNDARY = regex.compile(r"(?<=[.!?])[\"')\]]*\s+|(?<=[a-z][.!?])(?=[A-Z])|\s*\n(?!\s*[a-z])\s*")
+SPEAKER = regex.compile(r"^[\w .'-]{1,30}:\s+")
+WORD = regex.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+VERBS = (
+    "add|build|change|check|clean|complete|configure|create|delete|deploy|design|disable|document|enable|ensure|"
+    "finish|fix|handle|implement|improve|integrate|investigate|make|migrate|move|optimize|prepare|refactor|remove|"
+    "rename|replace|review|schedule|send|set|support|test|update|upgrade|validate|write"
+)
+LEAD = r"(?:please|so|ok|okay|also|and|then|now|just|can you|could you|would you|will you|let's|let us|we|you|i|"
+LEAD += r"someone|somebody|should|need to|needs to|must|have to|has to|will|'ll|definitely|really|\s|,)*"
+IMPERATIVE = regex.compile(rf"(?:^|[,;]\s*|\band\s+){LEAD}\b(?:{VERBS})\b", regex.IGNORECASE)
+MODAL = regex.compile(
+    r"\b(?:should|need to|needs to|must|have to|has to|let's|please|can you|could you|i'll|i will|we'll|todo|to-do)\b",
+    regex.IGNORECASE,
+)
+PROBLEM = regex.compile(
+    r"\b(?:bug|broken|breaks|issue|error|fails?|failing|crash(?:es)?|not working|doesn't|does not|isn't|can't|cannot)\b",
+    regex.IGNORECASE,
+)
+SMALL_TALK = regex.compile(
+    r"^(?:thanks?|thank you|you're welcome|welcome|hi|hello|hey|good (?:morning|afternoon|evening)|bye|goodbye|"
+    r"see you|great|cool|nice|awesome|sounds good|ok(?:ay)?|sure|yes|yeah|no problem|agreed|got it)\b",
+    regex.IGNORECASE,
+)
+DAY = r"(?:mon|tues|wednes|thurs|fri|satur|sun)day"
+MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*"
+WHEN = (
+    rf"(?:today|tonight|tomorrow|asap|eod|eow|(?:this|next|the end of the|end of the|end of) "
+    rf"(?:{DAY}|week|month|sprint|quarter|day|release)|{DAY}|"
+    rf"(?:the )?\d{{1,2}}(?:st|nd|rd|th)?(?: of)? {MONTH}|{MONTH} \d{{1,2}}(?:st|nd|rd|th)?)"
+)
+DEADLINE = regex.compile(rf"(?:\b(?:by|before|until|till|due|on|for)\s+)?\b(?P<when>{WHEN})(?:'s)?\b", regex.IGNORECASE)
+PERSONA = regex.compile(
+    r"\b(?:for|so that) (?:the |our |all )?(?P<persona>admins?|administrators?|customers?|clients?|developers?|"
+    r"investors?|managers?|users?|visitors?|editors?|authors?)\b",
+    regex.IGNORECASE,
+)
+FILLER = regex.compile(rf"^{LEAD}", regex.IGNORECASE)
+
+RULES = {
+    "__imperative__": IMPERATIVE,
+    "__modal__": MODAL,
+    "__problem__": PROBLEM,
+    "__deadline__": DEADLINE,
+    "__small_talk__": SMALL_TALK,
+}
+PRIORS = {
+    "__imperative__": 2.0,
+    "__modal__": 1.5,
+    "__problem__": 1.0,
+    "__deadline__": 1.0,
+    "__small_talk__": -3.0,
+    "__question__": -0.5,
+    "__short__": -1.5,
+    "__bias__": -1.5,
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class Segment:
+    """
+    This class contains a sentence of the transcript with its actionability.
+    """
+
+    text: str
+    start: int
+    end: int
+    score: float = 0.0
+
+
+def split_segments(text: str) -> Iterator[Segment]:
+    """
+    This function splits the text to sentences (a speaker label at the start of a sentence is dropped).
+
+    :param text: The text.
+    :return: The sentences with their character offsets in the text.
+    """
+    position = 0
+    for boundary in [*BOUNDARY.finditer(text), None]:
+        end = boundary.start() if boundary is not None else len(text)
+        piece = text[position:end]
+        label = SPEAKER.match(piece)
+        offset = label.end() if label else 0
+        sentence = piece[offset:].strip()
+        if sentence:
+            start = position + offset + piece[offset:].index(sentence[0])
+            yield Segment(text=" ".join(sentence.split()), start=start, end=start + len(sentence))
+        position = boundary.end() if boundary is not None else len(text)
+
+
+def features(text: str) -> list[str]:
+    """
+    This function returns the features of the sentence (words, bigrams and rules).
+    """
+    words = WORD.findall(text.lower())
+    tokens = [*words, *(f"{first} {second}" for first, second in zip(words, words[1:]))]
+    tokens += [name for name, pattern in RULES.items() if pattern.search(text)]
+    if text.rstrip().endswith("?"):
+        tokens.append("__question__")
+    if len(words) < 4:
+        tokens.append("__short__")
+    return [*tokens, "__bias__"]
+
+
+def words(text: str) -> set[str]:
+    """
+    This function returns the content words of the text (longer than 3 characters).
+    """
+    return {word for word in WORD.findall(text.lower()) if len(word) > 3}
+
+
+class ActionabilityModel:
+    """
+    This class implements the logistic regression scoring the sentences (hashed features, sparse NumPy).
+
+    The weights are regularized towards the priors, so the rules hold while there is little data.
+    """
+
+    def __init__(self, dimensions: int = 1 << 14, l2: float = 1.0, epochs: int = 200, learning_rate: float = 1.0):
+        """
+        This method initializes the model.
+
+        :param dimensions: The number of the hashed features.
+        :param l2: The strength of the regularization towards the priors.
+        :param epochs: The number of the gradient descent steps.
+        :param learning_rate: The step size of the gradient descent.
+        """
+        self.dimensions = dimensions
+        self.l2 = l2
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.prior = np.zeros(dimensions, dtype=np.float64)
+        for name, weight in PRIORS.items():
+            self.prior[self._hash(name)] = weight
+        self.weights = self.prior.copy()
+
+    def _hash(self, token: str) -> int:
+        return zlib.crc32(token.encode("utf-8")) % self.dimensions
+
+    def hashes(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        This method returns the hashed features of the sentences (sparse, one entry per occurrence).
+
+        :param texts: The sentences.
+        :return: The rows (the sentences) and the columns (the hashed features) of the occurrences.
+        """
+        rows: list[int] = []
+        columns: list[int] = []
+        for row, text in enumerate(texts):
+            hashes = [self._hash(token) for token in features(text)]
+            rows.extend([row] * len(hashes))
+            columns.extend(hashes)
+        return np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)
+
+    def fit(self, texts: list[str], labels: list[int]) -> "ActionabilityModel":
+        """
+        This method trains the model (only the weights of the features present in the data are updated).
+
+        The feature matrix has a column per feature present in the data, not per hashed dimension.
+
+        :param texts: The sentences.
+        :param labels: 1 for the actionable sentences, 0 for the rest.
+        :return: The model.
+        """
+        if not texts:
+            return self
+        rows, hashes = self.hashes(texts)
+        columns, positions = np.unique(hashes, return_inverse=True)
+        x = np.zeros((len(texts), len(columns)), dtype=np.float64)
+        np.add.at(x, (rows, positions), 1.0)
+        y = np.asarray(labels, dtype=np.float64)
+        prior, weights = self.prior[columns], self.weights[columns]
+        for _ in range(self.epochs):
+            probabilities = 1.0 / (1.0 + np.exp(-(x @ weights)))
+            gradient = (x.T @ (probabilities - y) + self.l2 * (weights - prior)) / len(texts)
+            weights = weights - self.learning_rate * gradient
+        self.weights = self.prior.copy()
+        self.weights[columns] = weights
+        return self
+
+    def predict(self, texts: list[str]) -> np.ndarray:
+        """
+        This method returns the probabilities of the sentences being actionable
+        (the weights of their features summed, no feature matrix).
+        """
+        if not texts:
+            return np.zeros(0)
+        rows, columns = self.hashes(texts)
+        logits = np.bincount(rows, weights=self.weights[columns], minlength=len(texts))
+        return 1.0 / (1.0 + np.exp(-logits))
+
+
+def training_data(examples: list[entities.RecognizerExample]) -> tuple[list[str], list[int]]:
+    """
+    This function labels the sentences of the examples raw texts.
+
+    The sentence sharing the most content words with the task (at least 30% of them) is actionable,
+    so is every sentence sharing at least a half. The other sentences are not actionable, except the requests
+    (imperative or modal), which are left out as they may be the follow-ups of the task (e.g. "Please fix it ASAP.").
+
+    :param examples: The examples.
+    :return: The sentences and their labels.
+    """
+    texts: list[str] = []
+    labels: list[int] = []
+    for example in examples:
+        task = words(example.task) or {""}
+        segments = list(split_segments(example.raw))
+        overlaps = [len(words(segment.text) & task) / len(task) for segment in segments]
+        best = max(overlaps, default=0.0)
+        for segment, overlap in zip(segments, overlaps):
+            label = int(overlap >= 0.5 or (overlap == best and overlap >= 0.3))
+            if label or not (IMPERATIVE.search(segment.text) or MODAL.search(segment.text)):
+                texts.append(segment.text)
+                labels.append(label)
+    return texts, labels
+
+
+def describe(segment: Segment) -> entities.RecognizerTask:
+    """
+    This function converts the actionable sentence to the task (the fillers and the deadline phrase are dropped).
+    """
+    sentence = segment.text
+    deadline = DEADLINE.search(sentence)
+    persona = PERSONA.search(sentence)
+    description = DEADLINE.sub("", sentence) if deadline else sentence
+    description = FILLER.sub("", description).strip(" ,;:-.!?") or sentence.strip(" .!?")
+    return entities.RecognizerTask(
+        description=description[0].upper() + description[1:],
+        persona=persona.group("persona").lower() if persona else "user",
+        deadline=deadline.group("when") if deadline else None,
+        start=segment.start,
+        end=segment.end,
+    )
+
+
+def trace(task: entities.RecognizerTask, spans: Sequence[Segment | Turn]) -> entities.RecognizerTask:
+    """
+    This function traces the task back to the span of the text sharing the most content words with it.
+
+    :param task: The task (recognized from the spans).
+    :param spans: The spans of the text with their offsets.
+    :return: The task with the offsets of its span (unchanged if no span shares a word with it).
+    """
+    description = words(task.description)
+    overlaps = [len(description & words(span.text)) for span in spans]
+    if not overlaps or max(overlaps) == 0:
+        return task
+    span = spans[overlaps.index(max(overlaps))]
+    return task.copy(update={"start": span.start, "end": span.end})
+
+
+class RecognizerLocal(base.RecognizerBase):
+    """
+    This is an implementation of the Recognizer class.
+
+    This version runs locally (rules and a small classifier trained from the examples), no model is called.
+    """
+
+    def __init__(
+        self,
+        include_default_examples: bool = True,
+        examples: list[entities.RecognizerExample] = None,
+        combine_ud_examples: bool = True,
+        threshold: float = 0.5,
+        max_models: int = 16,
+    ):
+        """
+        This method initializes the Recognizer application.
+
+        :param include_default_examples: Whether to train on the default examples or not.
+        :param examples: The examples to train on in the current session.
+        :param combine_ud_examples: Whether to train on the global user-defined examples or not.
+        :param threshold: The actionability from which a sentence is a task.
+        :param max_models: The number of the trained models kept (one per example set).
+        """
+        self.include_default_examples = include_default_examples
+        self.ud_examples: list[entities.RecognizerExample] = unique_examples(examples or [])
+        self.combine_ud_examples = combine_ud_examples
+        self.threshold = threshold
+        self.max_models = max_models
+        self._models: dict[tuple, ActionabilityModel] = {}
+        self._lock = threading.Lock()
+
+    def recognize(self, text: entities.RecognizerInput, **kwargs) -> entities.RecognizerOutput:
+        """
+        This method recognizes entities (tasks) in the input text.
+
+        :param text: The recognizer input.
+        :return: The recognized tasks (in the order of the transcript).
+
+        :keyword threshold: The actionability from which a sentence is a task (overrides the default).
+        """
+        threshold = kwargs.get("threshold", self.threshold)
+        segments = self.score(text.text, text.examples)
+        with instrumentation.span("recognizer.parse"):
+            tasks = [describe(segment) for segment in segments if segment.score >= threshold]
+        return entities.RecognizerOutput(tasks=tasks)
+
+    def score(self, text: str, examples: list[entities.RecognizerExample] = None) -> list[Segment]:
+        """
+        This method splits the text to sentences and scores their actionability.
+
+        :param text: The text.
+        :param examples: The examples provided for the input (the model is trained on them too).
+        :return: The sentences with their scores.
+        """
+        model = self.get_model(self.get_examples(examples or []))
+        with instrumentation.span("recognizer.local"):
+            segments = list(split_segments(text))
+            scores = model.predict([segment.text for segment in segments])
+        return [dataclasses.replace(segment, score=float(score)) for segment, score in zip(segments, scores)]
+
+    def warm_up(self, domains: list[str]):
+        """
+        This method trains the model on the session examples.
+        """
+        self.get_model(self.get_examples([]))
+
+    def get_model(self, examples: list[entities.RecognizerExample]) -> ActionabilityModel:
+        """
+        This method returns the model trained on the examples (trained once per example set).
+        """
+        key = tuple(map(example_key, examples))
+        with self._lock:
+            model = self._models.get(key)
+        if model is None:
+            with instrumentation.span("recognizer.examples", examples=len(examples)):
+                model = ActionabilityModel().fit(*training_data(examples))
+            with self._lock:
+                self._models[key] = model
+                while len(self._models) > self.max_models:
+                    self._models.pop(next(iter(self._models)))
+        return model
+
+    def get_examples(self, input_examples: list[entities.RecognizerExample]) -> list[entities.RecognizerExample]:
+        """
+        This method returns the examples the model is trained on.
+
+        :param input_examples: The examples provided for individual recognizer input.
+        """
+        default_examples: list[entities.RecognizerExample] = []
+        global_examples: list[entities.RecognizerExample] = []
+        if self.include_default_examples:
+            try:
+                default_examples = example_store.load(
+                    entities.RecognizerExample, settings.default_recognizer_examples_json
+                )
+            except Exception as exc:
+                raise exceptions.RecognizerException(message=f"Failed to parse default examples JSON: {exc}")
+        if settings.recognizer_examples_json and self.combine_ud_examples:
+            try:
+                global_examples = example_store.load(entities.RecognizerExample, settings.recognizer_examples_json)
+            except Exception as exc:
+                raise exceptions.RecognizerSerializerException(message=f"Failed to parse examples JSON: {exc}")
+        return unique_examples(input_examples + default_examples + self.ud_examples + global_examples)
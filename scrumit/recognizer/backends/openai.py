@@ -5,16 +5,24 @@ Recognizer is implementation of NER (Named Entity Recognition) using OpenAI API.
 It is used to recognize entities (tasks) in the input text and convert them to the output text (user stories).
 """
 
-import re as regex
-from typing import Any
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterable, Iterator, Type  # noqa: TYP001
 
+import aiohttp
 import openai.error
-from promptify import Prompter
-from pydantic import parse_file_as
 
+from scrumit import aio, instrumentation
+from scrumit.cache import CacheBase, make_key
 from scrumit.config import settings
 from scrumit.entity import recognizer as entities
+from scrumit.ratelimit import LimiterBase, NoLimiter
 from scrumit.recognizer import base, exceptions
+from scrumit.recognizer.parser import TaskParser, parse_tasks
+from scrumit.selection import ExampleSelector
+from scrumit.store import example_key, example_store, unique_examples
+from scrumit.templates import CompiledPrompt, TemplateCache
+
+if TYPE_CHECKING:
+    from promptify import Prompter
 
 
 class RecognizerOpenAI(base.RecognizerBase):
@@ -27,11 +35,17 @@ class RecognizerOpenAI(base.RecognizerBase):
     def __init__(
         self,
         model: Any,
-        prompter: Prompter,
+        prompter: "Prompter",
         template: str = "ner.jinja",
         include_default_examples: bool = True,
         examples: list[entities.RecognizerExample] = None,
         combine_ud_examples: bool = True,
+        session: aiohttp.ClientSession = None,
+        cache: CacheBase = None,
+        limiter: LimiterBase = None,
+        client: Type[openai.Completion] = openai.Completion,
+        max_examples: int = None,
+        examples_max_tokens: int = None,
     ):
         """
         This method initializes the Recognizer application.
@@ -43,23 +57,258 @@ class RecognizerOpenAI(base.RecognizerBase):
         :param examples: The examples to use in the current session.
         :param combine_ud_examples: Whether to combine the global user-defined examples
         with the current session examples or not.
+        :param session: The aiohttp session to reuse for the async calls.
+        If not provided, the recognizer creates (and owns) one on the first async call.
+        :param cache: The cache of the model completions. Nothing is cached if not provided.
+        :param limiter: The rate limiter of the model calls (shared with the other backends of the account).
+        The calls are not limited (nor retried) if not provided.
+        :param client: The OpenAI client the async and the streamed calls are made with.
+        :param max_examples: The maximum number of the examples in a prompt, the most relevant to the input are kept.
+        :param examples_max_tokens: The token budget of the examples in a prompt.
+        All the examples are sent if neither max_examples nor examples_max_tokens is provided.
         """
         self.model = model
+        self.session = aio.OpenAISession(session)
+        self.cache = cache
+        self.limiter = limiter or NoLimiter()
+        self.client = client
+        self.templates = TemplateCache()
+        self.selector = (
+            ExampleSelector("raw", max_examples, examples_max_tokens)
+            if max_examples is not None or examples_max_tokens is not None
+            else None
+        )
         self.prompter = prompter
         self.template = template
-        self.default_examples: list[entities.RecognizerExample] = []
-        self.ud_examples: list[entities.RecognizerExample] = examples or []
+        self.ud_examples: list[entities.RecognizerExample] = unique_examples(examples or [])
         self.include_default_examples = include_default_examples
         self.combine_ud_examples = combine_ud_examples
 
     def recognize(self, text: entities.RecognizerInput, **kwargs) -> entities.RecognizerOutput:
         """
         This method recognizes entities (tasks) in the input text and converts them to the output text (user stories).
+
+        :keyword engine: The engine to use for the API request.
+        :keyword temperature: What sampling temperature to use.
+        :keyword max_tokens: The token budget of the prompt and the completion together.
+        :keyword use_cache: Whether to look up the cache or not (e.g. to get fresh samples when temperature > 0).
+        """
+
+        request = self.get_request(text, **kwargs)
+        completion = self.get_cached(request, **kwargs)
+        if completion is None:
+            try:
+                with instrumentation.span("recognizer.model", model=request["model"]):
+                    output = self.limiter.call(
+                        self.model.run,
+                        request["max_tokens"],
+                        prompts=[request["prompt"]],
+                        model_name=request["model"],
+                        temperature=request["temperature"],
+                        max_tokens=request["max_tokens"],
+                    )[0]
+                    instrumentation.count_usage(output)
+            except openai.error.OpenAIError as exc:
+                raise exceptions.RecognizerException(message=f"Recognizer backend failed: {exc}")
+            completion = self.set_cached(request, output["text"])
+        return self.get_output(completion)
+
+    async def arecognize(self, text: entities.RecognizerInput, **kwargs) -> entities.RecognizerOutput:
+        """
+        This method recognizes entities (tasks) in the input text without blocking the event loop.
+
+        The completion request mirrors the one made by the Promptify model in the recognize method.
+        Accepts the same keywords as the recognize method.
+        """
+
+        request = self.get_request(text, **kwargs)
+        completion = self.get_cached(request, **kwargs)
+        if completion is None:
+            try:
+                with self.session.bind(), instrumentation.span("recognizer.model", model=request["model"]):
+                    response = await self.limiter.acall(
+                        self.client.acreate, request["max_tokens"], **self.get_completion_request(request)
+                    )
+                    instrumentation.count_usage(response)
+            except openai.error.OpenAIError as exc:
+                raise exceptions.RecognizerException(message=f"Recognizer backend failed: {exc}")
+            completion = self.set_cached(request, response["choices"][0]["text"])
+        return self.get_output(completion)
+
+    def recognize_stream(
+        self, lines: Iterable[str], domain: str, examples: list[entities.RecognizerExample] = None, **kwargs
+    ) -> Iterator[entities.RecognizerTask]:
+        """
+        This method recognizes entities (tasks) in the transcript emitting them as the completion is streamed.
+
+        Each task is emitted as soon as its object closes in the completion.
+        Accepts the same keywords as the recognize method.
+        """
+
+        text = entities.RecognizerInput(text="".join(lines), domain=domain, examples=examples or [])
+        request = self.get_request(text, **kwargs)
+        completion = self.get_cached(request, **kwargs)
+        if completion is not None:
+            yield from self.get_output(completion).tasks
+            return
+        parser, chunks = TaskParser(), []
+        for chunk in self._stream_completion(request):
+            chunks.append(chunk)
+            yield from parser.feed(chunk)
+        yield from parser.close()
+        self.set_cached(request, "".join(chunks))
+
+    async def arecognize_stream(
+        self, lines: Iterable[str], domain: str, examples: list[entities.RecognizerExample] = None, **kwargs
+    ) -> AsyncIterator[entities.RecognizerTask]:
+        """
+        This method is the asyncio version of the recognize_stream method.
         """
 
-        results: list[entities.RecognizerTask] = []
-        examples = self.get_examples(text.examples)
+        text = entities.RecognizerInput(text="".join(lines), domain=domain, examples=examples or [])
+        request = self.get_request(text, **kwargs)
+        completion = self.get_cached(request, **kwargs)
+        if completion is not None:
+            for task in self.get_output(completion).tasks:
+                yield task
+            return
+        parser, chunks = TaskParser(), []
+        async for chunk in self._astream_completion(request):
+            chunks.append(chunk)
+            for task in parser.feed(chunk):
+                yield task
+        for task in parser.close():
+            yield task
+        self.set_cached(request, "".join(chunks))
 
+    def _stream_completion(self, request: dict) -> Iterator[str]:
+        try:
+            with instrumentation.span("recognizer.model", model=request["model"], stream=True):
+                response = self.limiter.call(
+                    self.client.create, request["max_tokens"], **self.get_completion_request(request), stream=True
+                )
+            for chunk in response:
+                yield chunk["choices"][0]["text"]
+        except openai.error.OpenAIError as exc:
+            raise exceptions.RecognizerException(message=f"Recognizer backend failed: {exc}")
+
+    async def _astream_completion(self, request: dict) -> AsyncIterator[str]:
+        try:
+            with self.session.bind(), instrumentation.span("recognizer.model", model=request["model"], stream=True):
+                response = await self.limiter.acall(
+                    self.client.acreate, request["max_tokens"], **self.get_completion_request(request), stream=True
+                )
+            async for chunk in response:
+                yield chunk["choices"][0]["text"]
+        except openai.error.OpenAIError as exc:
+            raise exceptions.RecognizerException(message=f"Recognizer backend failed: {exc}")
+
+    def warm_up(self, domains: list[str]):
+        """
+        This method loads the examples and compiles the NER prompt of every domain.
+        """
+        for domain in domains:
+            self.get_compiled_prompt(entities.RecognizerInput(text="", domain=domain))
+
+    async def aclose(self):
+        """
+        This method closes the aiohttp session if it is owned by the recognizer.
+        """
+        await self.session.close()
+
+    def get_request(self, text: entities.RecognizerInput, **kwargs) -> dict:
+        """
+        This method returns the final prompt, the model and the sampling parameters of the request.
+
+        :param text: The recognizer input.
+        :return: The parameters of the completion request.
+        """
+        return dict(
+            model=kwargs.get("engine", "text-davinci-003"),
+            prompt=self.get_prompt(text),
+            temperature=kwargs.get("temperature", 0.7),
+            max_tokens=kwargs.get("max_tokens", 4000),
+        )
+
+    def get_completion_request(self, request: dict) -> dict:
+        """
+        This method returns the keyword arguments of the completion request made directly with the client.
+
+        It mirrors the request made by the Promptify model: the token budget is shared by the prompt and the completion.
+
+        :param request: The parameters of the completion request.
+        :return: The keyword arguments of the completion request.
+        """
+        return dict(
+            request,
+            max_tokens=request["max_tokens"] - len(self.model.encoder.encode(request["prompt"])),
+            top_p=0.1,
+            frequency_penalty=0,
+            presence_penalty=0,
+        )
+
+    def get_cached(self, request: dict, **kwargs) -> str | None:
+        """
+        This method returns the cached completion of the request.
+
+        :param request: The parameters of the completion request.
+        :return: The cached completion text or None if there is none (or the cache is bypassed).
+        """
+        if self.cache is None or not kwargs.get("use_cache", True):
+            return None
+        with instrumentation.span("recognizer.cache"):
+            completion = self.cache.get(make_key(**request))
+            instrumentation.count(cache_hits=int(completion is not None))
+        return completion
+
+    def set_cached(self, request: dict, completion: str) -> str:
+        """
+        This method caches the completion of the request.
+
+        :param request: The parameters of the completion request.
+        :param completion: The completion text.
+        :return: The completion text.
+        """
+        if self.cache is not None:
+            self.cache.set(make_key(**request), completion)
+        return completion
+
+    def get_prompt(self, text: entities.RecognizerInput) -> str:
+        """
+        This method renders the NER prompt for the input text.
+
+        :param text: The recognizer input.
+        :return: The prompt to send to the model.
+        """
+        compiled = self.get_compiled_prompt(text)
+        with instrumentation.span("recognizer.prompt", template=self.template):
+            return compiled.render(text.text)
+
+    def get_compiled_prompt(self, text: entities.RecognizerInput) -> CompiledPrompt:
+        """
+        This method returns the NER prompt rendered with everything but the input text.
+
+        The template is rendered once per domain and example set, its prefix is static across the calls.
+
+        :param text: The recognizer input.
+        :return: The compiled prompt.
+        """
+        with instrumentation.span("recognizer.examples"):
+            examples = self.get_examples(text.examples)
+            if self.selector is not None:
+                examples = self.selector.select(text.text, examples, pinned=text.examples)
+        key = (self.template, text.domain, *map(example_key, examples))
+        return self.templates.compile(key, lambda text_input: self.render_prompt(text.domain, text_input, examples))
+
+    def render_prompt(self, domain: str, text_input: str, examples: list[entities.RecognizerExample]) -> str:
+        """
+        This method renders the NER template through the prompter.
+
+        :param domain: Domain of the input text.
+        :param text_input: The input text.
+        :param examples: The examples of the prompt.
+        :return: The prompt.
+        """
         prompter_examples = [
             [
                 example.raw,
@@ -73,46 +322,49 @@ class RecognizerOpenAI(base.RecognizerBase):
             ]
             for example in examples
         ]
-        try:
-            output = self.prompter.fit(
-                template_name=self.template,
-                domain=text.domain,
-                text_input=text.text,
+        with instrumentation.span("recognizer.template", template=self.template):
+            return self.prompter.generate_prompt(
+                self.template,
+                domain=domain,
+                text_input=text_input,
                 labels=["Task", "Persona", "Deadline"],
                 examples=prompter_examples,
             )
-        except openai.error.OpenAIError as exc:
-            raise exceptions.RecognizerException(message=f"Recognizer backend failed: {exc}")
 
-        # [hot-fix]
-        output_text = self.__parse_output(output["text"])
+    def get_output(self, text: str) -> entities.RecognizerOutput:
+        """
+        This method converts the completion text to the recognizer output.
 
-        if not output_text or not isinstance(output_text, list):
-            return entities.RecognizerOutput(tasks=results)
+        :param text: The completion text.
+        :return: The recognized tasks.
+        """
+        with instrumentation.span("recognizer.parse"):
+            return entities.RecognizerOutput(tasks=list(parse_tasks([text])))
 
-        for re in output_text:
-            if re.get("Task") is not None:
-                results.append(
-                    entities.RecognizerTask(
-                        description=re.get("Task"),
-                        persona=re.get("Persona"),
-                        deadline=re.get("Deadline"),
-                    )
-                )
-        return entities.RecognizerOutput(tasks=results)
+    def add_examples(self, examples: list[entities.RecognizerExample]):
+        """
+        This method adds the examples to the current session (the already present ones are skipped).
+
+        :param examples: The examples to add.
+        """
+        self.ud_examples = unique_examples(self.ud_examples + examples)
 
     def get_examples(self, input_examples: list[entities.RecognizerExample]) -> list[entities.RecognizerExample]:
         """
         This method returns the examples used in the current session.
 
+        It does not modify the session, so the examples (and the prompt) do not grow across calls.
+
         :param input_examples: The examples provided for individual recognizer input.
         """
+        default_examples: list[entities.RecognizerExample] = []
+        global_examples: list[entities.RecognizerExample] = []
 
         # Default examples provided in package
         if self.include_default_examples:
             try:
-                self.default_examples = parse_file_as(
-                    list[entities.RecognizerExample], settings.default_recognizer_examples_json
+                default_examples = example_store.load(
+                    entities.RecognizerExample, settings.default_recognizer_examples_json
                 )
             # TODO: Specify exception
             except Exception as exc:
@@ -121,24 +373,8 @@ class RecognizerOpenAI(base.RecognizerBase):
         # User-defined global examples.
         if settings.recognizer_examples_json and self.combine_ud_examples:
             try:
-                self.ud_examples += parse_file_as(list[entities.RecognizerExample], settings.recognizer_examples_json)
+                global_examples = example_store.load(entities.RecognizerExample, settings.recognizer_examples_json)
             # TODO: Specify exception
             except Exception as exc:
                 exceptions.RecognizerSerializerException(message=f"Failed to parse examples JSON: {exc}")
-        return input_examples + self.default_examples + self.ud_examples
-
-    # [hot-fix]
-    @staticmethod
-    def __parse_output(text: str) -> list[dict[str, str]]:
-        """
-        This method parses the output text from the Prompter.
-        :param text:
-        :return:
-        """
-        pattern = r"\{'Task': '([^']*)', 'Persona': '([^']*)', 'Deadline': '([^']*)'\}"
-        matches = regex.finditer(pattern, text)
-        tasks = []
-        for match in matches:
-            task = {"Task": match.group(1), "Persona": match.group(2), "Deadline": match.group(3)}
-            tasks.append(task)
-        return tasks
+        return unique_examples(input_examples + default_examples + self.ud_examples + global_examples)
@@ -6,6 +6,8 @@ It is used to recognize entities (tasks) in the input text and convert them to t
 """
 
 import abc
+import asyncio
+from typing import AsyncIterator, Iterable, Iterator
 
 from scrumit.entity import recognizer as entities
 
@@ -21,3 +23,51 @@ class RecognizerBase(abc.ABC):
         This method recognizes entities (tasks) in the input text and converts them to the output text (user stories).
         """
         ...
+
+    async def arecognize(self, text: entities.RecognizerInput, **kwargs) -> entities.RecognizerOutput:
+        """
+        This method is the asyncio version of the recognize method.
+
+        Backends should override it with a native implementation,
+        by default the synchronous method is run in a worker thread.
+        """
+        return await asyncio.to_thread(self.recognize, text, **kwargs)
+
+    def recognize_stream(
+        self, lines: Iterable[str], domain: str, examples: list[entities.RecognizerExample] = None, **kwargs
+    ) -> Iterator[entities.RecognizerTask]:
+        """
+        This method recognizes entities (tasks) in the transcript emitting them one by one.
+
+        By default the whole transcript is recognized at once.
+
+        :param lines: The lines of the transcript including the line endings (e.g. an open file).
+        :param domain: Domain of the transcript.
+        :param examples: The examples of the recognized entities.
+        :return: The recognized tasks.
+        """
+        inp = entities.RecognizerInput(text="".join(lines), domain=domain, examples=examples or [])
+        yield from self.recognize(inp, **kwargs).tasks
+
+    async def arecognize_stream(
+        self, lines: Iterable[str], domain: str, examples: list[entities.RecognizerExample] = None, **kwargs
+    ) -> AsyncIterator[entities.RecognizerTask]:
+        """
+        This method is the asyncio version of the recognize_stream method.
+        """
+        inp = entities.RecognizerInput(text="".join(lines), domain=domain, examples=examples or [])
+        for task in (await self.arecognize(inp, **kwargs)).tasks:
+            yield task
+
+    def warm_up(self, domains: list[str]):
+        """
+        This method prepares the state reused by the calls (e.g. the examples, the compiled prompts)
+        ahead of the first call. Nothing is prepared by default.
+
+        :param domains: The domains of the upcoming inputs.
+        """
+
+    async def aclose(self):
+        """
+        This method releases the resources (e.g. connections) held by the asyncio methods.
+        """
@@ -0,0 +1,97 @@
+"""
+This module contains the cascade Recognizer for the scrumit application.
+
+The local recognizer scores every sentence of the transcript. The confident sentences are decided locally
+(tasks above the accept threshold, dropped below the reject one), only the uncertain ones are sent
+to the wrapped (remote) recognizer, in a single request. A transcript with no uncertain sentence costs no call.
+"""
+
+from scrumit import instrumentation
+from scrumit.entity import recognizer as entities
+from scrumit.recognizer import base
+from scrumit.recognizer.backends.local import RecognizerLocal, Segment, describe, trace
+
+
+class CascadeRecognizer(base.RecognizerBase):
+    """
+    This class recognizes the entities (tasks) locally, falling back to the wrapped recognizer when uncertain.
+    """
+
+    def __init__(
+        self,
+        recognizer: base.RecognizerBase,
+        local: RecognizerLocal = None,
+        accept: float = 0.8,
+        reject: float = 0.2,
+    ):
+        """
+        This method initializes the cascade recognizer.
+
+        :param recognizer: The recognizer the uncertain sentences are recognized with (e.g. RecognizerOpenAI).
+        :param local: The local recognizer scoring the sentences. The default one if not provided.
+        :param accept: The actionability from which a sentence is a task without asking the wrapped recognizer.
+        :param reject: The actionability below which a sentence is dropped without asking the wrapped recognizer.
+        """
+        self.recognizer = recognizer
+        self.local = local or RecognizerLocal()
+        self.accept = accept
+        self.reject = reject
+
+    def recognize(self, text: entities.RecognizerInput, **kwargs) -> entities.RecognizerOutput:
+        """
+        This method recognizes entities (tasks) in the input text.
+
+        :return: The tasks decided locally followed by the tasks of the uncertain sentences.
+        The tasks are traced back to their sentences (start and end).
+        """
+        tasks, uncertain = self.split(text)
+        if uncertain:
+            output = self.recognizer.recognize(self.get_fallback_input(text, uncertain), **kwargs)
+            tasks += [trace(task, uncertain) for task in output.tasks]
+        return entities.RecognizerOutput(tasks=tasks)
+
+    async def arecognize(self, text: entities.RecognizerInput, **kwargs) -> entities.RecognizerOutput:
+        """
+        This method is the asyncio version of the recognize method.
+        """
+        tasks, uncertain = self.split(text)
+        if uncertain:
+            output = await self.recognizer.arecognize(self.get_fallback_input(text, uncertain), **kwargs)
+            tasks += [trace(task, uncertain) for task in output.tasks]
+        return entities.RecognizerOutput(tasks=tasks)
+
+    def warm_up(self, domains: list[str]):
+        """
+        This method prepares the wrapped recognizer and the local recognizer.
+        """
+        self.recognizer.warm_up(domains)
+        self.local.warm_up(domains)
+
+    async def aclose(self):
+        """
+        This method releases the resources held by the wrapped recognizer.
+        """
+        await self.recognizer.aclose()
+
+    def split(self, text: entities.RecognizerInput) -> tuple[list[entities.RecognizerTask], list[Segment]]:
+        """
+        This method decides the confident sentences locally.
+
+        :param text: The recognizer input.
+        :return: The tasks of the accepted sentences and the uncertain sentences.
+        """
+        segments = self.local.score(text.text, text.examples)
+        with instrumentation.span("recognizer.cascade", sentences=len(segments)) as span:
+            tasks = [describe(segment) for segment in segments if segment.score >= self.accept]
+            uncertain = [segment for segment in segments if self.reject <= segment.score < self.accept]
+            span.attributes.update(accepted=len(tasks), uncertain=len(uncertain))
+        return tasks, uncertain
+
+    @staticmethod
+    def get_fallback_input(text: entities.RecognizerInput, uncertain: list[Segment]) -> entities.RecognizerInput:
+        """
+        This method returns the input of the wrapped recognizer (the uncertain sentences, one per line).
+        """
+        return entities.RecognizerInput(
+            text="\n".join(segment.text for segment in uncertain), domain=text.domain, examples=text.examples
+        )
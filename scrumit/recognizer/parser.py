@@ -0,0 +1,179 @@
+"""
+This module contains the incremental parser of the recognizer completions.
+
+The parser accepts the tasks as JSON, Python literals or JSON lines, with the keys in any order
+(Task is required, Persona and Deadline are optional) and tolerates the prose around them.
+It is fed the completion chunk by chunk (e.g. the tokens of a streamed completion)
+and emits every task as soon as its object closes.
+"""
+
+import re as regex
+from typing import Iterable, Iterator
+
+from scrumit.entity import recognizer as entities
+
+KEYS = {"task": "description", "description": "description", "persona": "persona", "deadline": "deadline"}
+EMPTY = {"", "none", "null", "n/a"}
+CLOSING = ",:}]"
+ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "/": "/"}
+OBJECT = object()
+
+
+def _unescape_one(match: regex.Match) -> str:
+    escaped = match.group(1)
+    return chr(int(escaped[1:], 16)) if len(escaped) == 5 else ESCAPES.get(escaped, escaped)
+
+
+def _unescape(text: str) -> str:
+    return regex.sub(r"\\(u[0-9a-fA-F]{4}|.)", _unescape_one, text, flags=regex.DOTALL)
+
+
+class TaskParser:
+    """
+    This class parses the recognizer completion incrementally.
+
+    Only the text within the brackets is tokenized, so the apostrophes of the prose do not open strings.
+    A single quote followed by anything but a separator is an unescaped apostrophe within the string.
+    """
+
+    def __init__(self):
+        """
+        This method initializes the parser.
+        """
+        self._frames: list[tuple[str, list]] = []
+        self._quote: str | None = None
+        self._string: list[str] = []
+        self._escaped = False
+        self._pending: list[str] | None = None
+        self._word: list[str] = []
+        self._tasks: list[entities.RecognizerTask] = []
+
+    def feed(self, chunk: str) -> list[entities.RecognizerTask]:
+        """
+        This method parses the next chunk of the completion.
+
+        :param chunk: The chunk of the completion.
+        :return: The tasks whose objects closed in the chunk.
+        """
+        for char in chunk:
+            self._step(char)
+        tasks, self._tasks = self._tasks, []
+        return tasks
+
+    def close(self) -> list[entities.RecognizerTask]:
+        """
+        This method finishes the parsing (the unclosed objects are dropped).
+
+        :return: The tasks whose objects closed at the end of the completion.
+        """
+        if self._pending is not None:
+            self._end_string()
+        tasks, self._tasks = self._tasks, []
+        return tasks
+
+    def _step(self, char: str):
+        if self._pending is not None and self._step_pending(char):
+            return
+        if self._quote is not None:
+            self._step_string(char)
+        elif char in "{[":
+            self._end_word()
+            self._frames.append((char, []))
+        elif char in "}]":
+            self._end_word()
+            self._close_frame(char)
+        elif self._frames:
+            self._step_token(char)
+
+    def _step_pending(self, char: str) -> bool:
+        """
+        This method decides whether the pending single quote closes the string, it returns True if char is consumed.
+        """
+        if char.isspace():
+            self._pending.append(char)
+            return True
+        if char in CLOSING:
+            self._end_string()
+        else:
+            self._string.extend(self._pending)
+            self._pending = None
+        return False
+
+    def _step_string(self, char: str):
+        if self._escaped:
+            self._string.append(char)
+            self._escaped = False
+        elif char == "\\":
+            self._string.append(char)
+            self._escaped = True
+        elif char != self._quote:
+            self._string.append(char)
+        elif char == "'":
+            self._pending = [char]
+        else:
+            self._end_string()
+
+    def _step_token(self, char: str):
+        if char in "\"'":
+            self._end_word()
+            self._quote = char
+        elif char in ",:":
+            self._end_word()
+            self._frames[-1][1].append(char)
+        elif char.isspace():
+            self._end_word()
+        else:
+            self._word.append(char)
+
+    def _end_string(self):
+        self._frames[-1][1].append(("string", _unescape("".join(self._string))))
+        self._string = []
+        self._quote = None
+        self._pending = None
+
+    def _end_word(self):
+        if self._word and self._frames:
+            self._frames[-1][1].append(("word", "".join(self._word)))
+        self._word = []
+
+    def _close_frame(self, char: str):
+        opening = "{" if char == "}" else "["
+        while self._frames:
+            kind, tokens = self._frames.pop()
+            if kind == opening:
+                break
+        else:
+            return
+        if self._frames:
+            self._frames[-1][1].append(("value", OBJECT))
+        if kind == "{":
+            self._emit(self._pairs(tokens))
+
+    @staticmethod
+    def _pairs(tokens: list) -> dict[str, str]:
+        pairs: dict[str, str] = {}
+        for index, token in enumerate(tokens):
+            if token != ":" or index == 0 or index + 1 >= len(tokens):
+                continue
+            key, value = tokens[index - 1], tokens[index + 1]
+            if isinstance(key, tuple) and isinstance(value, tuple) and value[1] is not OBJECT:
+                pairs[key[1].strip().lower()] = value[1].strip()
+        return pairs
+
+    def _emit(self, pairs: dict[str, str]):
+        fields = {KEYS[key]: value for key, value in pairs.items() if key in KEYS and value.lower() not in EMPTY}
+        if fields.get("description"):
+            self._tasks.append(entities.RecognizerTask(**fields))
+
+
+def parse_tasks(chunks: Iterable[str]) -> Iterator[entities.RecognizerTask]:
+    """
+    This function parses the completion (or the chunks of a streamed one) emitting the tasks as they close.
+
+    :param chunks: The completion text or its chunks.
+    :return: The recognized tasks.
+    """
+    parser = TaskParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
@@ -0,0 +1,160 @@
+"""
+This module contains the pre-filtering Recognizer for the scrumit application.
+
+The transcript is split to speaker turns and every turn is scored for actionability by the local recognizer.
+Only the actionable turns (and optionally the turns right before them, as context) are forwarded
+to the wrapped recognizer, so the small talk costs no prompt tokens. The forwarded turns keep their offsets
+in the transcript and the recognized tasks are traced back to them (start and end).
+"""
+
+import collections
+import itertools
+from typing import AsyncIterator, Iterable, Iterator
+
+from scrumit import instrumentation
+from scrumit.entity import recognizer as entities
+from scrumit.recognizer import base
+from scrumit.recognizer.backends.local import RecognizerLocal, trace
+from scrumit.transcript import Turn, split_turns
+
+
+class PrefilterRecognizer(base.RecognizerBase):
+    """
+    This class drops the non-actionable speaker turns before the wrapped recognizer sees them.
+
+    It wraps any other recognizer (e.g. RecognizerOpenAI or StreamingRecognizer).
+    """
+
+    def __init__(
+        self,
+        recognizer: base.RecognizerBase,
+        scorer: RecognizerLocal = None,
+        threshold: float = 0.2,
+        context_turns: int = 0,
+    ):
+        """
+        This method initializes the pre-filtering recognizer.
+
+        :param recognizer: The recognizer the actionable turns are recognized with.
+        :param scorer: The local recognizer scoring the turns. The default one if not provided.
+        :param threshold: The actionability from which a turn is forwarded (the best sentence of the turn counts).
+        Keep it low, a dropped turn is a lost task while a forwarded one only costs its tokens.
+        :param context_turns: The number of the dropped turns forwarded before an actionable turn
+        (e.g. the bug report before "Please fix it ASAP.").
+        """
+        self.recognizer = recognizer
+        self.scorer = scorer or RecognizerLocal()
+        self.threshold = threshold
+        self.context_turns = context_turns
+
+    def recognize(self, text: entities.RecognizerInput, **kwargs) -> entities.RecognizerOutput:
+        """
+        This method recognizes entities (tasks) in the actionable turns of the input text.
+
+        The wrapped recognizer is not called at all if no turn is actionable.
+        """
+        turns = list(self.select(split_turns(text.text.splitlines(keepends=True)), text.examples))
+        if not turns:
+            return entities.RecognizerOutput()
+        output = self.recognizer.recognize(self.get_forwarded_input(text, turns), **kwargs)
+        return entities.RecognizerOutput(tasks=[trace(task, turns) for task in output.tasks])
+
+    async def arecognize(self, text: entities.RecognizerInput, **kwargs) -> entities.RecognizerOutput:
+        """
+        This method is the asyncio version of the recognize method.
+        """
+        turns = list(self.select(split_turns(text.text.splitlines(keepends=True)), text.examples))
+        if not turns:
+            return entities.RecognizerOutput()
+        output = await self.recognizer.arecognize(self.get_forwarded_input(text, turns), **kwargs)
+        return entities.RecognizerOutput(tasks=[trace(task, turns) for task in output.tasks])
+
+    def recognize_stream(
+        self, lines: Iterable[str], domain: str, examples: list[entities.RecognizerExample] = None, **kwargs
+    ) -> Iterator[entities.RecognizerTask]:
+        """
+        This method recognizes entities (tasks) in the transcript forwarding the actionable turns lazily.
+
+        :param lines: The lines of the transcript (e.g. an open file).
+        :param domain: Domain of the transcript.
+        :param examples: The examples of the recognized entities.
+        :return: The recognized tasks traced back to the forwarded turns.
+        """
+        turns: list[Turn] = []
+        selected = self.select(split_turns(lines), examples or [])
+        first = next(selected, None)
+        if first is None:
+            return
+        forwarded = self._forward(itertools.chain([first], selected), turns)
+        for task in self.recognizer.recognize_stream(forwarded, domain, examples, **kwargs):
+            yield trace(task, turns)
+
+    async def arecognize_stream(
+        self, lines: Iterable[str], domain: str, examples: list[entities.RecognizerExample] = None, **kwargs
+    ) -> AsyncIterator[entities.RecognizerTask]:
+        """
+        This method is the asyncio version of the recognize_stream method.
+        """
+        turns: list[Turn] = []
+        selected = self.select(split_turns(lines), examples or [])
+        first = next(selected, None)
+        if first is None:
+            return
+        forwarded = self._forward(itertools.chain([first], selected), turns)
+        async for task in self.recognizer.arecognize_stream(forwarded, domain, examples, **kwargs):
+            yield trace(task, turns)
+
+    def warm_up(self, domains: list[str]):
+        """
+        This method prepares the wrapped recognizer and the scorer.
+        """
+        self.recognizer.warm_up(domains)
+        self.scorer.warm_up(domains)
+
+    async def aclose(self):
+        """
+        This method releases the resources held by the wrapped recognizer.
+        """
+        await self.recognizer.aclose()
+
+    def select(self, turns: Iterable[Turn], examples: list[entities.RecognizerExample]) -> Iterator[Turn]:
+        """
+        This method selects the turns forwarded to the wrapped recognizer lazily.
+
+        :param turns: The speaker turns with their offsets.
+        :param examples: The examples the scorer is trained on.
+        :return: The actionable turns (preceded by their context turns) in the order of the transcript.
+        """
+        context: collections.deque[Turn] = collections.deque(maxlen=self.context_turns or None)
+        for turn in turns:
+            if self.score(turn, examples) < self.threshold:
+                if self.context_turns:
+                    context.append(turn)
+                continue
+            yield from context
+            yield turn
+            context.clear()
+
+    def score(self, turn: Turn, examples: list[entities.RecognizerExample]) -> float:
+        """
+        This method scores the actionability of the turn (the best of its sentences).
+        """
+        with instrumentation.span("recognizer.prefilter", chars=len(turn.text)) as span:
+            score = max((segment.score for segment in self.scorer.score(turn.text, examples)), default=0.0)
+            span.attributes.update(score=score, forwarded=score >= self.threshold)
+        return score
+
+    @staticmethod
+    def _forward(turns: Iterable[Turn], forwarded: list[Turn]) -> Iterator[str]:
+        for turn in turns:
+            forwarded.append(turn)
+            yield turn.text + "\n"
+
+    @staticmethod
+    def get_forwarded_input(text: entities.RecognizerInput, turns: list[Turn]) -> entities.RecognizerInput:
+        """
+        This method returns the input of the wrapped recognizer (the forwarded turns, one per line).
+        """
+        return entities.RecognizerInput(
+            text="\n".join(turn.text for turn in turns), domain=text.domain, examples=text.examples
+        )
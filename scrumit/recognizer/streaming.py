@@ -0,0 +1,188 @@
+"""
+This module contains the streaming Recognizer for the scrumit application.
+
+Long transcripts are split to token-budgeted, overlapping windows on speaker-turn boundaries.
+The windows are recognized concurrently by the wrapped recognizer and the tasks are emitted
+as soon as their window is done, the tasks recognized twice in the overlap of two windows are dropped.
+"""
+
+import asyncio
+import re as regex
+from concurrent import futures
+from typing import AsyncIterator, Callable, Iterable, Iterator
+
+from scrumit import instrumentation
+from scrumit.entity import recognizer as entities
+from scrumit.recognizer import base
+from scrumit.transcript import Window, estimate_tokens, iter_windows, split_turns
+
+
+class TaskMerger:
+    """
+    This class drops the tasks recognized more than once in the same or in the adjacent windows.
+
+    Two tasks are the same if the Jaccard similarity of the words of their descriptions reaches the threshold.
+    """
+
+    def __init__(self, threshold: float = 0.8):
+        """
+        This method initializes the merger.
+
+        :param threshold: The similarity threshold.
+        """
+        self.threshold = threshold
+        self._seen: dict[int, list[frozenset[str]]] = {}
+
+    def merge(self, window: int, tasks: list[entities.RecognizerTask]) -> Iterator[entities.RecognizerTask]:
+        """
+        This method returns the tasks of the window not seen yet.
+
+        :param window: The index of the window.
+        :param tasks: The tasks recognized in the window.
+        :return: The new tasks.
+        """
+        for task in tasks:
+            words = frozenset(regex.findall(r"\w+", task.description.lower()))
+            if not any(
+                self._same(words, other)
+                for index in (window - 1, window, window + 1)
+                for other in self._seen.get(index, [])
+            ):
+                self._seen.setdefault(window, []).append(words)
+                yield task
+
+    def _same(self, words: frozenset[str], other: frozenset[str]) -> bool:
+        union = len(words | other)
+        return not union or len(words & other) / union >= self.threshold
+
+
+class StreamingRecognizer(base.RecognizerBase):
+    """
+    This class recognizes the entities (tasks) in long transcripts window by window.
+
+    It wraps any other recognizer.
+    """
+
+    def __init__(
+        self,
+        recognizer: base.RecognizerBase,
+        window_tokens: int = 1500,
+        overlap_turns: int = 1,
+        max_workers: int = 4,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+        merge_threshold: float = 0.8,
+    ):
+        """
+        This method initializes the streaming recognizer.
+
+        :param recognizer: The recognizer the windows are recognized with.
+        :param window_tokens: The token budget of the transcript in a single window.
+        :param overlap_turns: The number of speaker turns shared by the consecutive windows.
+        :param max_workers: The maximum number of windows recognized concurrently.
+        :param count_tokens: The function counting the tokens of a speaker turn.
+        :param merge_threshold: The similarity threshold of the duplicated tasks.
+        """
+        self.recognizer = recognizer
+        self.window_tokens = window_tokens
+        self.overlap_turns = overlap_turns
+        self.max_workers = max(1, max_workers)
+        self.count_tokens = count_tokens
+        self.merge_threshold = merge_threshold
+
+    def recognize(self, text: entities.RecognizerInput, **kwargs) -> entities.RecognizerOutput:
+        """
+        This method recognizes entities (tasks) in the input text window by window.
+        """
+        return entities.RecognizerOutput(
+            tasks=list(self.recognize_stream(text.text.splitlines(keepends=True), text.domain, text.examples, **kwargs))
+        )
+
+    async def arecognize(self, text: entities.RecognizerInput, **kwargs) -> entities.RecognizerOutput:
+        """
+        This method is the asyncio version of the recognize method.
+        """
+        stream = self.arecognize_stream(text.text.splitlines(keepends=True), text.domain, text.examples, **kwargs)
+        return entities.RecognizerOutput(tasks=[task async for task in stream])
+
+    def warm_up(self, domains: list[str]):
+        """
+        This method prepares the wrapped recognizer.
+        """
+        self.recognizer.warm_up(domains)
+
+    async def aclose(self):
+        """
+        This method releases the resources held by the wrapped recognizer.
+        """
+        await self.recognizer.aclose()
+
+    def windows(self, lines: Iterable[str]) -> Iterator[Window]:
+        """
+        This method splits the transcript to windows lazily.
+
+        :param lines: The lines of the transcript (e.g. an open file).
+        :return: The windows.
+        """
+        return iter_windows(split_turns(lines), self.window_tokens, self.overlap_turns, self.count_tokens)
+
+    def recognize_stream(
+        self, lines: Iterable[str], domain: str, examples: list[entities.RecognizerExample] = None, **kwargs
+    ) -> Iterator[entities.RecognizerTask]:
+        """
+        This method recognizes entities (tasks) in the transcript emitting them as soon as their window is done.
+
+        At most max_workers windows are read ahead, so the memory does not grow with the transcript.
+
+        :param lines: The lines of the transcript (e.g. an open file).
+        :param domain: Domain of the transcript.
+        :param examples: The examples of the recognized entities.
+        :return: The recognized tasks (in the order their windows are done).
+        """
+        merger = TaskMerger(self.merge_threshold)
+        with futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending: dict[futures.Future, Window] = {}
+            for window in self.windows(lines):
+                inp = entities.RecognizerInput(text=window.text, domain=domain, examples=examples or [])
+                pending[instrumentation.submit(executor, self.recognizer.recognize, inp, **kwargs)] = window
+                if len(pending) >= self.max_workers:
+                    yield from self._drain(pending, merger)
+            while pending:
+                yield from self._drain(pending, merger)
+
+    async def arecognize_stream(
+        self, lines: Iterable[str], domain: str, examples: list[entities.RecognizerExample] = None, **kwargs
+    ) -> AsyncIterator[entities.RecognizerTask]:
+        """
+        This method is the asyncio version of the recognize_stream method.
+        """
+        merger = TaskMerger(self.merge_threshold)
+        pending: dict[asyncio.Future, Window] = {}
+        try:
+            for window in self.windows(lines):
+                inp = entities.RecognizerInput(text=window.text, domain=domain, examples=examples or [])
+                pending[asyncio.ensure_future(self.recognizer.arecognize(inp, **kwargs))] = window
+                if len(pending) >= self.max_workers:
+                    for task in await self._adrain(pending, merger):
+                        yield task
+            while pending:
+                for task in await self._adrain(pending, merger):
+                    yield task
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _drain(pending: dict[futures.Future, Window], merger: TaskMerger) -> Iterator[entities.RecognizerTask]:
+        done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+        for future in done:
+            window = pending.pop(future)
+            yield from merger.merge(window.index, future.result().tasks)
+
+    @staticmethod
+    async def _adrain(pending: dict[asyncio.Future, Window], merger: TaskMerger) -> list[entities.RecognizerTask]:
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        tasks: list[entities.RecognizerTask] = []
+        for future in done:
+            window = pending.pop(future)
+            tasks.extend(merger.merge(window.index, future.result().tasks))
+        return tasks
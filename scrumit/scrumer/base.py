@@ -2,9 +2,13 @@
 This module contains the base class for the scrumit application.
 """
 import abc
+import asyncio
+from typing import AsyncIterator, Iterator
 
 from scrumit.entity import scrumit as entities
 
+StreamItem = entities.UserStory | entities.TaskFailure
+
 
 class ScrumerBase(abc.ABC):
     """
@@ -17,3 +21,41 @@ class ScrumerBase(abc.ABC):
         This method converts the input text to the output text.
         """
         ...
+
+    async def aconvert(self, text: entities.Input) -> entities.Output:
+        """
+        This method is the asyncio version of the convert method.
+
+        By default the synchronous method is run in a worker thread.
+        """
+        return await asyncio.to_thread(self.convert, text)
+
+    def convert_stream(self, text: entities.Input, ordered: bool = False) -> Iterator[StreamItem]:
+        """
+        This method converts the input text emitting the user stories (and the task failures) one by one.
+
+        By default the whole input is converted first.
+        """
+        output = self.convert(text)
+        yield from output.stories
+        yield from output.failures
+
+    async def aconvert_stream(self, text: entities.Input, ordered: bool = False) -> AsyncIterator[StreamItem]:
+        """
+        This method is the asyncio version of the convert_stream method.
+        """
+        output = await self.aconvert(text)
+        for item in [*output.stories, *output.failures]:
+            yield item
+
+    def warm_up(self, domains: list[str]):
+        """
+        This method prepares the state reused by the conversions ahead of the first one. Nothing is prepared by default.
+
+        :param domains: The domains of the upcoming inputs.
+        """
+
+    async def aclose(self):
+        """
+        This method releases the resources (e.g. connections) held by the asyncio methods.
+        """
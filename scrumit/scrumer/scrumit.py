@@ -2,11 +2,68 @@
 This module contains the main class for the scrumit application.
 """
 
+import asyncio
+import math
+import queue
+import threading
+import time
+from concurrent import futures
+from typing import AsyncIterator, Iterable, Iterator
+
+from scrumit import instrumentation
+from scrumit.dedup import TaskDeduplicator
 from scrumit.entity import paraphraser as paraphraser_entities, recognizer as recognizer_entities, scrumit as entities
 from scrumit.paraphraser import base as paraphraser_base, exceptions as paraphraser_exceptions
 from scrumit.recognizer import base as recognizer_base, exceptions as recognizer_exceptions
 from scrumit.scrumer import base, exceptions as exceptions
 
+Outcome = entities.UserStory | paraphraser_exceptions.ParaphraserException
+
+
+class _Sequencer:
+    """
+    This class applies the failure policy to the streamed outcomes and (optionally) restores their order.
+    """
+
+    def __init__(self, ordered: bool, fail_fast: bool):
+        self.ordered = ordered
+        self.fail_fast = fail_fast
+        self.total: int | None = None
+        self.received = 0
+        self._next = 0
+        self._buffer: dict[int, base.StreamItem] = {}
+
+    def done(self) -> bool:
+        return self.total is not None and self.received == self.total
+
+    def accept(self, item) -> list[base.StreamItem]:
+        """
+        This method accepts an item of the results queue: (index, task, outcome),
+        the number of the tasks or the exception the producer failed with.
+        """
+        if isinstance(item, BaseException):
+            raise item
+        if isinstance(item, int):
+            self.total = item
+            return []
+        index, task, outcome = item
+        return self.push(index, task, outcome)
+
+    def push(self, index: int, task: recognizer_entities.RecognizerTask, outcome: Outcome) -> list[base.StreamItem]:
+        self.received += 1
+        if isinstance(outcome, paraphraser_exceptions.ParaphraserException):
+            if self.fail_fast:
+                raise Scrumer._failure(task, outcome)
+            outcome = entities.TaskFailure(task=task.description, reason=outcome.message)
+        if not self.ordered:
+            return [outcome]
+        self._buffer[index] = outcome
+        items: list[base.StreamItem] = []
+        while self._next in self._buffer:
+            items.append(self._buffer.pop(self._next))
+            self._next += 1
+        return items
+
 
 class Scrumer(base.ScrumerBase):
     """
@@ -17,6 +74,11 @@ class Scrumer(base.ScrumerBase):
         self,
         recognizer: recognizer_base.RecognizerBase,
         paraphraser: paraphraser_base.ParaphraserBase,
+        max_workers: int = 1,
+        fail_fast: bool = True,
+        deduplicator: TaskDeduplicator = None,
+        batch_size: int = 20,
+        batch_delay: float = 0.05,
     ):
         """
         This method initializes the scrumit application.
@@ -25,30 +87,459 @@ class Scrumer(base.ScrumerBase):
         It is used to recognize entities (tasks) in the input text.
         :param paraphraser: The paraphraser to use.
         It is used to paraphrase the recognized entities (tasks) to the output text (user stories).
+        :param max_workers: The maximum number of task batches paraphrased concurrently.
+        1 (default) paraphrases all the tasks with a single batch.
+        :param fail_fast: Whether to abort the conversion on the first failed task or not.
+        If disabled, the failed tasks are collected in the output and the rest are still converted.
+        :param deduplicator: The deduplicator of the recognized tasks, only one task per cluster of near-duplicates
+        is paraphrased. The tasks are not deduplicated if not provided.
+        :param batch_size: The maximum number of the streamed tasks paraphrased with a single paraphrase_batch call.
+        :param batch_delay: The time in seconds a streamed task waits for the next ones to be paraphrased with it.
         """
         self.recognizer = recognizer
         self.paraphraser = paraphraser
+        self.max_workers = max(1, max_workers)
+        self.fail_fast = fail_fast
+        self.deduplicator = deduplicator
+        self.batch_size = max(1, batch_size)
+        self.batch_delay = batch_delay
 
     def convert(self, inp: entities.Input) -> entities.Output:
         """
         This method converts the input text (conversation trascript) to the output text (user stories).
+
+        The time and the tokens spent in each stage are aggregated on the output.
+        """
+
+        with instrumentation.recording() as recorder:
+            tasks, merged = self.deduplicate(self.recognize(inp).tasks)
+            outcomes = self.paraphrase_tasks(tasks, inp.paraphraser_examples)
+        return self.build_output(tasks, outcomes, recorder.stats(), merged)
+
+    async def aconvert(self, inp: entities.Input) -> entities.Output:
         """
+        This method is the asyncio version of the convert method.
 
-        user_stories: list[entities.UserStory] = []
+        At most max_workers tasks are paraphrased concurrently.
+        """
+
+        with instrumentation.recording() as recorder:
+            tasks, merged = self.deduplicate((await self.arecognize(inp)).tasks)
+            outcomes = await self.aparaphrase_tasks(tasks, inp.paraphraser_examples)
+        return self.build_output(tasks, outcomes, recorder.stats(), merged)
+
+    def convert_stream(
+        self, inp: entities.Input, ordered: bool = False, lines: Iterable[str] = None
+    ) -> Iterator[base.StreamItem]:
+        """
+        This method converts the input text emitting each user story as soon as it is paraphrased.
+
+        The tasks are paraphrased (max_workers batches at a time) as soon as the recognizer emits them,
+        the tasks emitted within batch_delay of each other are packed into a single paraphrase_batch call.
+        The failed tasks are emitted as TaskFailure when not failing fast.
+        A task near-duplicate to an already emitted one is skipped (it cannot be merged into the emitted story).
+
+        :param inp: The input of the scrumit application.
+        :param ordered: Whether to emit the stories in the order of the recognized tasks or as soon as they are ready.
+        :param lines: The lines of the transcript read lazily instead of the input text (e.g. an open file).
+        :return: The user stories (and the task failures).
+        """
+        results: queue.Queue = queue.Queue()
+        stop = threading.Event()
+        executor = futures.ThreadPoolExecutor(max_workers=self.max_workers + 1)
         try:
-            ner_output = self.recognizer.recognize(
-                recognizer_entities.RecognizerInput(text=inp.text, domain=inp.domain, examples=inp.ner_examples)
+            instrumentation.submit(executor, self._produce, executor, inp, lines, results, stop)
+            sequencer = _Sequencer(ordered, self.fail_fast)
+            while not sequencer.done():
+                yield from sequencer.accept(results.get())
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def aconvert_stream(
+        self, inp: entities.Input, ordered: bool = False, lines: Iterable[str] = None
+    ) -> AsyncIterator[base.StreamItem]:
+        """
+        This method is the asyncio version of the convert_stream method.
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        pending: list[asyncio.Future] = []
+        producer = asyncio.ensure_future(self._aproduce(inp, lines, results, pending))
+        try:
+            sequencer = _Sequencer(ordered, self.fail_fast)
+            while not sequencer.done():
+                for story in sequencer.accept(await results.get()):
+                    yield story
+        finally:
+            for future in [producer, *pending]:
+                future.cancel()
+
+    def warm_up(self, domains: list[str]):
+        """
+        This method loads the examples and compiles the prompts of the recognizer and the paraphraser.
+        """
+        self.recognizer.warm_up(domains)
+        self.paraphraser.warm_up()
+
+    async def aclose(self):
+        """
+        This method releases the resources held by the recognizer and the paraphraser.
+        """
+        await self.recognizer.aclose()
+        await self.paraphraser.aclose()
+
+    def recognize(self, inp: entities.Input) -> recognizer_entities.RecognizerOutput:
+        """
+        This method recognizes the entities (tasks) in the input text.
+
+        :param inp: The input of the scrumit application.
+        :return: The recognized tasks.
+        """
+        try:
+            with instrumentation.span("recognition"):
+                return self.recognizer.recognize(
+                    recognizer_entities.RecognizerInput(text=inp.text, domain=inp.domain, examples=inp.ner_examples)
+                )
+        except recognizer_exceptions.RecognizerException as e:
+            raise exceptions.ScrumitException(f"Could not recognize entities: {e.message}")
+
+    async def arecognize(self, inp: entities.Input) -> recognizer_entities.RecognizerOutput:
+        """
+        This method is the asyncio version of the recognize method.
+        """
+        try:
+            with instrumentation.span("recognition"):
+                return await self.recognizer.arecognize(
+                    recognizer_entities.RecognizerInput(text=inp.text, domain=inp.domain, examples=inp.ner_examples)
+                )
+        except recognizer_exceptions.RecognizerException as e:
+            raise exceptions.ScrumitException(f"Could not recognize entities: {e.message}")
+
+    def _recognize_stream(
+        self, inp: entities.Input, lines: Iterable[str] = None
+    ) -> Iterator[recognizer_entities.RecognizerTask]:
+        try:
+            yield from self.recognizer.recognize_stream(
+                inp.text.splitlines(keepends=True) if lines is None else lines, inp.domain, inp.ner_examples
             )
         except recognizer_exceptions.RecognizerException as e:
             raise exceptions.ScrumitException(f"Could not recognize entities: {e.message}")
-        for task in ner_output.tasks:
+
+    async def _arecognize_stream(
+        self, inp: entities.Input, lines: Iterable[str] = None
+    ) -> AsyncIterator[recognizer_entities.RecognizerTask]:
+        try:
+            async for task in self.recognizer.arecognize_stream(
+                inp.text.splitlines(keepends=True) if lines is None else lines, inp.domain, inp.ner_examples
+            ):
+                yield task
+        except recognizer_exceptions.RecognizerException as e:
+            raise exceptions.ScrumitException(f"Could not recognize entities: {e.message}")
+
+    def _produce(
+        self,
+        executor: futures.ThreadPoolExecutor,
+        inp: entities.Input,
+        lines: Iterable[str] | None,
+        results: queue.Queue,
+        stop: threading.Event,
+    ):
+        """
+        This method hands each task to the paraphrasing workers as soon as it is recognized.
+        The outcomes are put to the results queue followed by the number of the tasks
+        (or any exception the producer failed with, so the consumer never waits for it forever).
+        """
+        ready: queue.Queue = queue.Queue()
+        for _ in range(self.max_workers):
+            instrumentation.submit(executor, self._consume, ready, inp.paraphraser_examples, results, stop)
+        count = 0
+        index = self.deduplicator.index() if self.deduplicator is not None else None
+        try:
+            for task in self._recognize_stream(inp, lines):
+                if stop.is_set():
+                    return
+                if index is not None and not index.add(task)[1]:
+                    continue
+                ready.put((count, task))
+                count += 1
+        except BaseException as e:
+            results.put_nowait(e)
+            return
+        finally:
+            ready.put(None)
+        results.put_nowait(count)
+
+    def _consume(
+        self,
+        ready: queue.Queue,
+        examples: list[paraphraser_entities.ParaphraserExample],
+        results: queue.Queue,
+        stop: threading.Event,
+    ):
+        """
+        This method paraphrases the ready tasks batch by batch until the producer is done.
+        """
+        while not stop.is_set():
+            batch = self._take_batch(ready)
+            if not batch:
+                return
             try:
-                paraphrased = self.paraphraser.paraphrase(
-                    paraphraser_entities.ParaphraserInput(text=task.description, examples=inp.paraphraser_examples)
-                )
-                user_stories.append(entities.UserStory(task=task.description, story=paraphrased.user_story))
-            except paraphraser_exceptions.ParaphraserException as e:
-                raise exceptions.ScrumitException(
-                    f"Could not paraphrase the task {task.description}. Reason: {e.message}"
-                )
-        return entities.Output(stories=user_stories)
+                outcomes = self._paraphrase_batch([task for _, task in batch], examples)
+            except BaseException as e:
+                results.put_nowait(e)
+                return
+            for (position, task), outcome in zip(batch, outcomes):
+                results.put_nowait((position, task, outcome))
+
+    def _take_batch(self, ready: queue.Queue) -> list[tuple[int, recognizer_entities.RecognizerTask]]:
+        """
+        This method takes the next ready task and the ones ready within batch_delay (up to batch_size).
+
+        :return: The positions and the tasks (empty once the producer is done).
+        """
+        item = ready.get()
+        if item is None:
+            ready.put(None)
+            return []
+        batch = [item]
+        deadline = time.monotonic() + self.batch_delay
+        while len(batch) < self.batch_size:
+            try:
+                item = ready.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                ready.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    async def _aproduce(
+        self, inp: entities.Input, lines: Iterable[str] | None, results: asyncio.Queue, pending: list[asyncio.Future]
+    ):
+        """
+        This method is the asyncio version of the _produce method.
+        """
+        ready: asyncio.Queue = asyncio.Queue()
+        for _ in range(self.max_workers):
+            pending.append(asyncio.ensure_future(self._aconsume(ready, inp.paraphraser_examples, results)))
+        count = 0
+        index = self.deduplicator.index() if self.deduplicator is not None else None
+        try:
+            async for task in self._arecognize_stream(inp, lines):
+                if index is not None and not index.add(task)[1]:
+                    continue
+                ready.put_nowait((count, task))
+                count += 1
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            results.put_nowait(e)
+            return
+        finally:
+            ready.put_nowait(None)
+        results.put_nowait(count)
+
+    async def _aconsume(
+        self, ready: asyncio.Queue, examples: list[paraphraser_entities.ParaphraserExample], results: asyncio.Queue
+    ):
+        """
+        This method is the asyncio version of the _consume method.
+        """
+        while True:
+            batch = await self._atake_batch(ready)
+            if not batch:
+                return
+            try:
+                outcomes = await self._aparaphrase_batch([task for _, task in batch], examples)
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                results.put_nowait(e)
+                return
+            for (position, task), outcome in zip(batch, outcomes):
+                results.put_nowait((position, task, outcome))
+
+    async def _atake_batch(self, ready: asyncio.Queue) -> list[tuple[int, recognizer_entities.RecognizerTask]]:
+        """
+        This method is the asyncio version of the _take_batch method.
+
+        The batch waits batch_delay once and takes the tasks ready by then (no queue get is cancelled midway).
+        """
+        item = await ready.get()
+        if item is None:
+            ready.put_nowait(None)
+            return []
+        batch = [item]
+        if self.batch_delay and ready.qsize() < self.batch_size - 1:
+            await asyncio.sleep(self.batch_delay)
+        while len(batch) < self.batch_size and not ready.empty():
+            item = ready.get_nowait()
+            if item is None:
+                ready.put_nowait(None)
+                break
+            batch.append(item)
+        return batch
+
+    def deduplicate(
+        self, tasks: list[recognizer_entities.RecognizerTask]
+    ) -> tuple[list[recognizer_entities.RecognizerTask], list[list[str]]]:
+        """
+        This method merges the near-duplicate tasks.
+
+        :param tasks: The recognized tasks.
+        :return: The representative tasks and the descriptions of the tasks merged into each of them.
+        """
+        if self.deduplicator is None:
+            return tasks, [[] for _ in tasks]
+        with instrumentation.span("deduplication", tasks=len(tasks)) as span:
+            clusters = self.deduplicator.cluster(tasks)
+            span.attributes.update(clusters=len(clusters))
+        return [cluster.task for cluster in clusters], [
+            [duplicate.description for duplicate in cluster.duplicates] for cluster in clusters
+        ]
+
+    def paraphrase_tasks(
+        self,
+        tasks: list[recognizer_entities.RecognizerTask],
+        examples: list[paraphraser_entities.ParaphraserExample],
+    ) -> list[Outcome]:
+        """
+        This method paraphrases the recognized tasks to user stories.
+
+        The tasks are split evenly into (at most) max_workers batches paraphrased concurrently,
+        each batch with a single paraphrase_batch call.
+        The outcomes are returned in the order of the tasks.
+        A failed task is represented by the exception raised by the paraphraser.
+
+        :param tasks: The recognized tasks.
+        :param examples: The paraphraser examples of the input.
+        :return: The outcomes (user story or paraphraser exception) of the tasks.
+        """
+        with instrumentation.span("paraphrasing", tasks=len(tasks)):
+            return self._paraphrase_batches(self.get_batches(tasks), examples)
+
+    def _paraphrase_batches(
+        self,
+        batches: list[list[recognizer_entities.RecognizerTask]],
+        examples: list[paraphraser_entities.ParaphraserExample],
+    ) -> list[Outcome]:
+        if len(batches) <= 1:
+            return [outcome for batch in batches for outcome in self._paraphrase_batch(batch, examples)]
+        with futures.ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            pending = {
+                instrumentation.submit(executor, self._paraphrase_batch, batch, examples): batch for batch in batches
+            }
+            for future in futures.as_completed(pending):
+                failure = self._first_failure(pending[future], future.result())
+                if failure is not None:
+                    for other in pending:
+                        other.cancel()
+                    raise failure
+            return [outcome for future in pending for outcome in future.result()]
+
+    async def aparaphrase_tasks(
+        self,
+        tasks: list[recognizer_entities.RecognizerTask],
+        examples: list[paraphraser_entities.ParaphraserExample],
+    ) -> list[Outcome]:
+        """
+        This method is the asyncio version of the paraphrase_tasks method.
+        """
+
+        async def paraphrase(batch: list[recognizer_entities.RecognizerTask]) -> list[Outcome]:
+            outcomes = await self._aparaphrase_batch(batch, examples)
+            failure = self._first_failure(batch, outcomes)
+            if failure is not None:
+                raise failure
+            return outcomes
+
+        with instrumentation.span("paraphrasing", tasks=len(tasks)):
+            pending = [asyncio.ensure_future(paraphrase(batch)) for batch in self.get_batches(tasks)]
+            try:
+                return [outcome for outcomes in await asyncio.gather(*pending) for outcome in outcomes]
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def get_batches(
+        self, tasks: list[recognizer_entities.RecognizerTask]
+    ) -> list[list[recognizer_entities.RecognizerTask]]:
+        """
+        This method splits the tasks evenly into (at most) max_workers batches keeping their order.
+
+        :param tasks: The recognized tasks.
+        :return: The batches of the tasks.
+        """
+        size = math.ceil(len(tasks) / self.max_workers)
+        return [tasks[start : start + size] for start in range(0, len(tasks), size)] if tasks else []
+
+    def build_output(
+        self,
+        tasks: list[recognizer_entities.RecognizerTask],
+        outcomes: list[Outcome],
+        stages: dict[str, entities.StageStats] = None,
+        merged: list[list[str]] = None,
+    ) -> entities.Output:
+        """
+        This method builds the output from the outcomes of the tasks applying the failure policy.
+
+        :param tasks: The recognized tasks.
+        :param outcomes: The outcomes of the tasks (in the same order).
+        :param stages: The instrumentation of the conversion aggregated per stage.
+        :param merged: The descriptions of the duplicates merged into each task.
+        :return: The output of the scrumit application.
+        """
+        stories: list[entities.UserStory] = []
+        failures: list[entities.TaskFailure] = []
+        for task, outcome, duplicates in zip(tasks, outcomes, merged or [[] for _ in tasks]):
+            if isinstance(outcome, paraphraser_exceptions.ParaphraserException):
+                if self.fail_fast:
+                    raise self._failure(task, outcome)
+                failures.append(entities.TaskFailure(task=task.description, reason=outcome.message))
+            else:
+                stories.append(outcome.copy(update={"merged": duplicates}) if duplicates else outcome)
+        return entities.Output(stories=stories, failures=failures, stages=stages or {})
+
+    def _paraphrase_batch(
+        self, tasks: list[recognizer_entities.RecognizerTask], examples: list[paraphraser_entities.ParaphraserExample]
+    ) -> list[Outcome]:
+        outcomes = self.paraphraser.paraphrase_batch(
+            [paraphraser_entities.ParaphraserInput(text=task.description, examples=examples) for task in tasks],
+            return_exceptions=True,
+        )
+        return [self._to_story(task, outcome) for task, outcome in zip(tasks, outcomes)]
+
+    async def _aparaphrase_batch(
+        self, tasks: list[recognizer_entities.RecognizerTask], examples: list[paraphraser_entities.ParaphraserExample]
+    ) -> list[Outcome]:
+        outcomes = await self.paraphraser.aparaphrase_batch(
+            [paraphraser_entities.ParaphraserInput(text=task.description, examples=examples) for task in tasks],
+            return_exceptions=True,
+        )
+        return [self._to_story(task, outcome) for task, outcome in zip(tasks, outcomes)]
+
+    @staticmethod
+    def _to_story(task: recognizer_entities.RecognizerTask, outcome: paraphraser_base.Outcome) -> Outcome:
+        if isinstance(outcome, paraphraser_exceptions.ParaphraserException):
+            return outcome
+        return entities.UserStory(task=task.description, story=outcome.user_story)
+
+    def _first_failure(
+        self, tasks: list[recognizer_entities.RecognizerTask], outcomes: list[Outcome]
+    ) -> exceptions.ScrumitException | None:
+        """
+        This method returns the exception to abort the conversion with (only when failing fast).
+        """
+        if not self.fail_fast:
+            return None
+        for task, outcome in zip(tasks, outcomes):
+            if isinstance(outcome, paraphraser_exceptions.ParaphraserException):
+                return self._failure(task, outcome)
+        return None
+
+    @staticmethod
+    def _failure(
+        task: recognizer_entities.RecognizerTask, error: paraphraser_exceptions.ParaphraserException
+    ) -> exceptions.ScrumitException:
+        return exceptions.ScrumitException(f"Could not paraphrase the task {task.description}. Reason: {error.message}")
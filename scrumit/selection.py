@@ -0,0 +1,161 @@
+"""
+This module contains the example selection of the scrumit application.
+
+Instead of sending the whole example library with every prompt, the selector picks the examples
+most relevant to the input (BM25 over the example texts) up to a number of examples and a token budget.
+The lexical index is built once and updated incrementally when new examples show up.
+"""
+
+import math
+import re as regex
+import threading
+from collections import Counter
+from typing import Callable, Iterable
+
+from scrumit.store import Example, example_key
+from scrumit.transcript import estimate_tokens
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    This function splits the text to the lowercase terms of the index.
+    """
+    return [term for term in regex.findall(r"\w+", text.lower()) if len(term) > 1]
+
+
+class BM25Index:
+    """
+    This class implements the incremental BM25 index of the examples.
+
+    The examples are identified by their content, so the same example loaded again is not indexed twice.
+    """
+
+    def __init__(self, field: str, k1: float = 1.5, b: float = 0.75):
+        """
+        This method initializes the index.
+
+        :param field: The field of the examples the index is built over (e.g. raw).
+        :param k1: The term frequency saturation of BM25.
+        :param b: The length normalization of BM25.
+        """
+        self.field = field
+        self.k1 = k1
+        self.b = b
+        self._documents: dict[tuple, int] = {}
+        self._lengths: list[int] = []
+        self._postings: dict[str, dict[int, int]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, examples: Iterable[Example]) -> list[int]:
+        """
+        This method indexes the examples not indexed yet.
+
+        :param examples: The examples.
+        :return: The document ids of the examples (in the same order).
+        """
+        ids: list[int] = []
+        with self._lock:
+            for example in examples:
+                key = example_key(example)
+                if key not in self._documents:
+                    self._documents[key] = self._index(getattr(example, self.field) or "")
+                ids.append(self._documents[key])
+        return ids
+
+    def scores(self, query: str, ids: Iterable[int]) -> dict[int, float]:
+        """
+        This method scores the documents against the query.
+
+        :param query: The query text (e.g. the input text).
+        :param ids: The ids of the documents to score.
+        :return: The BM25 scores of the documents.
+        """
+        scores = dict.fromkeys(ids, 0.0)
+        with self._lock:
+            average = self._total_length / len(self._lengths) if self._lengths else 0
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (len(self._lengths) - len(postings) + 0.5) / (len(postings) + 0.5))
+                for document, frequency in postings.items():
+                    if document in scores:
+                        norm = self.k1 * (1 - self.b + self.b * self._lengths[document] / average)
+                        scores[document] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def _index(self, text: str) -> int:
+        document = len(self._lengths)
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[document] = frequency
+        length = sum(terms.values())
+        self._lengths.append(length)
+        self._total_length += length
+        return document
+
+
+def example_tokens(example: Example) -> int:
+    """
+    This function estimates the number of prompt tokens of the example.
+    """
+    return estimate_tokens(" ".join(str(value) for value in example.__dict__.values() if value))
+
+
+class ExampleSelector:
+    """
+    This class selects the examples most relevant to the input under a count and a token budget.
+    """
+
+    def __init__(
+        self,
+        field: str,
+        max_examples: int = None,
+        max_tokens: int = None,
+        count_tokens: Callable[[Example], int] = example_tokens,
+    ):
+        """
+        This method initializes the selector.
+
+        :param field: The field of the examples matched against the input (e.g. raw).
+        :param max_examples: The maximum number of the selected examples. Not limited if not provided.
+        :param max_tokens: The token budget of the selected examples. Not limited if not provided.
+        :param count_tokens: The function estimating the prompt tokens of an example.
+        """
+        self.index = BM25Index(field)
+        self.max_examples = max_examples
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+
+    def select(self, query: str, examples: list[Example], pinned: list[Example] = None) -> list[Example]:
+        """
+        This method selects the examples for the input.
+
+        The pinned examples (e.g. provided with the input) are always kept and spend the budget first,
+        the rest are taken by relevance (the library order breaks the ties) while they fit.
+
+        :param query: The input text.
+        :param examples: The candidate examples (without duplicates).
+        :param pinned: The examples to keep regardless of their relevance.
+        :return: The selected examples (the pinned ones first).
+        """
+        pinned_keys = {example_key(example) for example in pinned or []}
+        selected = [example for example in examples if example_key(example) in pinned_keys]
+        candidates = [example for example in examples if example_key(example) not in pinned_keys]
+        ids = self.index.add(candidates)
+        scores = self.index.scores(query, ids)
+        ranked = sorted(range(len(candidates)), key=lambda position: -scores[ids[position]])
+
+        budget = self.max_tokens - sum(map(self.count_tokens, selected)) if self.max_tokens is not None else math.inf
+        for position in ranked:
+            if self.max_examples is not None and len(selected) >= self.max_examples:
+                break
+            tokens = self.count_tokens(candidates[position])
+            if tokens <= budget:
+                selected.append(candidates[position])
+                budget -= tokens
+        return selected
@@ -0,0 +1,196 @@
+"""
+This module contains the HTTP service of the scrumit application.
+
+The service holds one scrumer (warm backends, example stores and connections) for all the requests.
+The conversions are run by a fixed number of workers fed from a bounded queue, a request arriving
+when the queue is full is rejected (503 with Retry-After) instead of piling up.
+The identical requests in flight (same text, domain and examples) are coalesced, they share one conversion.
+"""
+
+import asyncio
+import logging
+
+from aiohttp import web
+from pydantic import ValidationError
+
+from scrumit.cache import make_key
+from scrumit.config import settings
+from scrumit.entity import paraphraser as paraphraser_entities, recognizer as recognizer_entities
+from scrumit.entity.scrumit import Input, Output
+from scrumit.paraphraser.exceptions import ParaphraserException
+from scrumit.recognizer.exceptions import RecognizerException
+from scrumit.scrumer.base import ScrumerBase
+from scrumit.scrumer.exceptions import ScrumitException
+from scrumit.store import example_store
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_ERRORS = (RecognizerException, ParaphraserException, ScrumitException)
+
+
+class ConversionQueue:
+    """
+    This class runs the conversions with a fixed number of workers and coalesces the identical ones.
+    """
+
+    def __init__(self, scrumer: ScrumerBase, workers: int = 8, max_queue: int = 64):
+        """
+        This method initializes the queue.
+
+        :param scrumer: The scrumer converting the inputs.
+        :param workers: The number of the conversions run concurrently.
+        :param max_queue: The number of the conversions waiting for a worker, the next ones are rejected.
+        """
+        self.scrumer = scrumer
+        self.workers = max(1, workers)
+        self._queue: asyncio.Queue[tuple[Input, asyncio.Future]] = asyncio.Queue(maxsize=max(1, max_queue))
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._tasks: list[asyncio.Task] = []
+        self.coalesced = 0
+
+    @property
+    def pending(self) -> int:
+        """
+        The number of the conversions waiting for a worker.
+        """
+        return self._queue.qsize()
+
+    @property
+    def inflight(self) -> int:
+        """
+        The number of the distinct conversions queued or running.
+        """
+        return len(self._inflight)
+
+    def start(self):
+        """
+        This method starts the workers (within the running event loop).
+        """
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        This method stops the workers, the queued conversions are cancelled.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for future in self._inflight.values():
+            future.cancel()
+        self._inflight.clear()
+
+    async def convert(self, inp: Input) -> Output:
+        """
+        This method converts the input, joining the identical conversion in flight if there is one.
+
+        :param inp: The input of the scrumit application.
+        :return: The output of the conversion.
+        :raises asyncio.QueueFull: If the queue is full.
+        """
+        key = make_key(**inp.dict())
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait((inp, future))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shielded, so a disconnected client does not cancel the conversion shared with the others
+        return await asyncio.shield(future)
+
+    async def _work(self):
+        while True:
+            inp, future = await self._queue.get()
+            try:
+                if not future.done():
+                    output = await self.scrumer.aconvert(inp)
+                    if not future.done():
+                        future.set_result(output)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+
+QUEUE = web.AppKey("queue", ConversionQueue)
+
+
+def warm_up():
+    """
+    This function loads the configured example files to the example store ahead of the first request.
+    """
+    files = [
+        (recognizer_entities.RecognizerExample, settings.default_recognizer_examples_json),
+        (recognizer_entities.RecognizerExample, settings.recognizer_examples_json),
+        (paraphraser_entities.ParaphraserExample, settings.default_paraphraser_examples_json),
+        (paraphraser_entities.ParaphraserExample, settings.paraphraser_examples_json),
+    ]
+    for model, path in files:
+        if path:
+            try:
+                example_store.load(model, path)
+            except Exception as e:
+                logger.warning("Could not load the examples file %s: %s", path, e)
+
+
+async def convert(request: web.Request) -> web.Response:
+    """
+    This function handles the conversion requests (the Input as JSON, the Output as JSON).
+    """
+    try:
+        inp = Input.parse_raw(await request.read())
+    except ValidationError as e:
+        raise web.HTTPBadRequest(text=e.json(), content_type="application/json")
+    try:
+        output = await request.app[QUEUE].convert(inp)
+    except asyncio.QueueFull:
+        raise web.HTTPServiceUnavailable(text="The service is overloaded.", headers={"Retry-After": "1"})
+    except UPSTREAM_ERRORS as e:
+        raise web.HTTPBadGateway(text=str(e))
+    return web.Response(text=output.json(), content_type="application/json")
+
+
+async def health(request: web.Request) -> web.Response:
+    """
+    This function reports the state of the queue.
+    """
+    queue = request.app[QUEUE]
+    return web.json_response(
+        {"status": "ok", "pending": queue.pending, "inflight": queue.inflight, "coalesced": queue.coalesced}
+    )
+
+
+def create_app(
+    scrumer: ScrumerBase, workers: int = 8, max_queue: int = 64, domains: list[str] = None
+) -> web.Application:
+    """
+    This function creates the HTTP application (POST /convert, GET /health).
+
+    The example files are loaded and the backends of the scrumer warmed up (the prompts compiled) on startup.
+
+    :param scrumer: The scrumer converting the inputs (closed with the application).
+    :param workers: The number of the conversions run concurrently.
+    :param max_queue: The number of the conversions waiting for a worker, the next ones are rejected.
+    :param domains: The domains whose recognizer prompts are compiled on startup (the others on their first request).
+    :return: The application.
+    """
+
+    async def start(app: web.Application):
+        warm_up()
+        scrumer.warm_up(domains or [])
+        app[QUEUE] = ConversionQueue(scrumer, workers, max_queue)
+        app[QUEUE].start()
+
+    async def stop(app: web.Application):
+        await app[QUEUE].stop()
+        await scrumer.aclose()
+
+    app = web.Application()
+    app.router.add_post("/convert", convert)
+    app.router.add_get("/health", health)
+    app.on_startup.append(start)
+    app.on_cleanup.append(stop)
+    return app
@@ -0,0 +1,109 @@
+"""
+This module contains the example store of the scrumit application.
+
+The store loads and validates the examples JSON files once and reuses the parsed examples
+until the file changes, so the backends do not hit the disk on every call.
+"""
+
+import dataclasses
+import hashlib
+import os
+import threading
+from typing import Any, Iterable, TypeVar
+
+from pydantic import BaseModel
+from pydantic.tools import parse_raw_as
+
+Example = TypeVar("Example", bound=BaseModel)
+
+
+@dataclasses.dataclass
+class _Entry:
+    mtime: int
+    size: int
+    digest: str
+    examples: list[Any]
+
+
+class ExampleStore:
+    """
+    This class caches the parsed examples files.
+
+    A file is re-read only when its modification time or size changes
+    and re-validated only when its content hash changes as well.
+    """
+
+    def __init__(self):
+        """
+        This method initializes the example store.
+        """
+        self._entries: dict[tuple[str, type], _Entry] = {}
+        self._lock = threading.Lock()
+
+    def load(self, model: type[Example], path: str) -> list[Example]:
+        """
+        This method returns the examples of the file.
+
+        :param model: The example model (e.g. ParaphraserExample).
+        :param path: Path to the examples JSON file.
+        :return: The parsed examples (a new list, the examples themselves are shared).
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get((path, model))
+            if entry is None or (entry.mtime, entry.size) != (stat.st_mtime_ns, stat.st_size):
+                entry = self._refresh(model, path, stat, entry)
+            return list(entry.examples)
+
+    def invalidate(self, path: str = None):
+        """
+        This method drops the cached examples of the file (or of all files).
+
+        :param path: Path to the examples JSON file.
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                return
+            path = os.path.abspath(path)
+            for key in [key for key in self._entries if key[0] == path]:
+                del self._entries[key]
+
+    def _refresh(self, model: type[Example], path: str, stat: os.stat_result, entry: _Entry | None) -> _Entry:
+        with open(path, "rb") as file:
+            content = file.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if entry is None or entry.digest != digest:
+            entry = _Entry(stat.st_mtime_ns, stat.st_size, digest, parse_raw_as(list[model], content))
+        else:
+            entry.mtime, entry.size = stat.st_mtime_ns, stat.st_size
+        self._entries[(path, model)] = entry
+        return entry
+
+
+def example_key(example: Example) -> tuple:
+    """
+    This function returns the key identifying the example by its content.
+    """
+    return (type(example), *example.__dict__.values())
+
+
+def unique_examples(examples: Iterable[Example]) -> list[Example]:
+    """
+    This function removes the duplicated examples keeping the first occurrence of each.
+
+    :param examples: The examples.
+    :return: The examples without duplicates (in the original order).
+    """
+    seen: set[tuple] = set()
+    result: list[Example] = []
+    for example in examples:
+        key = example_key(example)
+        if key not in seen:
+            seen.add(key)
+            result.append(example)
+    return result
+
+
+example_store = ExampleStore()
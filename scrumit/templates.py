@@ -0,0 +1,77 @@
+"""
+This module contains the prompt template cache of the scrumit application.
+
+A prompt is a template rendered with the examples (static for many calls) and the input text (variable).
+The template is rendered once per template and example set with a sentinel in place of the input text
+and split around it, so every call only splices the input text into the cached parts.
+The parts before the input text are the static prefix of the prompt (e.g. for provider-side prompt caching).
+"""
+
+import collections
+import dataclasses
+import threading
+from typing import Callable, Hashable
+
+SENTINEL = "\x00scrumit:text\x00"
+
+
+@dataclasses.dataclass(frozen=True)
+class CompiledPrompt:
+    """
+    This class contains the prompt rendered with everything but the input text.
+    """
+
+    parts: tuple[str, ...]
+
+    @property
+    def prefix(self) -> str:
+        """
+        The static part of the prompt before the input text.
+        """
+        return self.parts[0]
+
+    def render(self, text: str) -> str:
+        """
+        This method returns the prompt for the input text.
+
+        :param text: The input text.
+        :return: The prompt.
+        """
+        return text.join(self.parts)
+
+
+class TemplateCache:
+    """
+    This class caches the compiled prompts (LRU).
+    """
+
+    def __init__(self, max_entries: int = 256):
+        """
+        This method initializes the cache.
+
+        :param max_entries: The maximum number of the compiled prompts, the least recently used ones are evicted.
+        """
+        self.max_entries = max_entries
+        self._entries: collections.OrderedDict[Hashable, CompiledPrompt] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, key: Hashable, render: Callable[[str], str]) -> CompiledPrompt:
+        """
+        This method returns the compiled prompt of the key, rendering it on a miss.
+
+        :param key: The key of the template and everything it is rendered with except the input text.
+        :param render: The function rendering the template with the given input text.
+        The input text must be passed through as is (not escaped nor at the very edge of the stripped prompt).
+        :return: The compiled prompt.
+        """
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                return compiled
+        compiled = CompiledPrompt(tuple(render(SENTINEL).split(SENTINEL)))
+        with self._lock:
+            self._entries[key] = compiled
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compiled
@@ -0,0 +1,139 @@
+"""
+This module contains the helpers splitting the conversation transcripts.
+
+A transcript is split to speaker turns (one per non-blank line) and the turns are packed
+into token-budgeted, overlapping windows small enough for a single model request.
+"""
+
+import dataclasses
+import zlib
+from typing import Callable, Iterable, Iterator
+
+
+@dataclasses.dataclass(frozen=True)
+class Turn:
+    """
+    This class contains a single speaker turn of the transcript.
+    """
+
+    text: str
+    start: int
+    end: int
+
+
+@dataclasses.dataclass(frozen=True)
+class Window:
+    """
+    This class contains consecutive speaker turns sent to the model together.
+    """
+
+    index: int
+    turns: tuple[Turn, ...]
+
+    @property
+    def text(self) -> str:
+        return "\n".join(turn.text for turn in self.turns)
+
+    @property
+    def start(self) -> int:
+        return self.turns[0].start
+
+    @property
+    def end(self) -> int:
+        return self.turns[-1].end
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    This function estimates the number of tokens of the text (~4 characters per token for English).
+
+    :param text: The text.
+    :return: The estimated number of tokens.
+    """
+    return len(text) // 4 + 1
+
+
+def split_turns(lines: Iterable[str]) -> Iterator[Turn]:
+    """
+    This function splits the transcript to speaker turns lazily.
+
+    :param lines: The lines of the transcript including the line endings (e.g. an open file).
+    :return: The turns with their character offsets in the transcript.
+    """
+    offset = 0
+    for line in lines:
+        text = line.strip()
+        if text:
+            start = offset + line.index(text[0])
+            yield Turn(text=text, start=start, end=start + len(text))
+        offset += len(line)
+
+
+def iter_windows(
+    turns: Iterable[Turn],
+    max_tokens: int,
+    overlap_turns: int = 1,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[Window]:
+    """
+    This function packs the turns into windows lazily.
+
+    A window holds as many whole turns as fit into the token budget (at least one)
+    and starts with the last overlap_turns turns of the previous window.
+
+    :param turns: The speaker turns.
+    :param max_tokens: The token budget of a window.
+    :param overlap_turns: The number of turns shared by the consecutive windows.
+    :param count_tokens: The function counting the tokens of a turn.
+    :return: The windows.
+    """
+    index, fresh, total = 0, 0, 0
+    current: list[tuple[Turn, int]] = []
+    for turn in turns:
+        tokens = count_tokens(turn.text)
+        if fresh and total + tokens > max_tokens:
+            yield Window(index=index, turns=tuple(item for item, _ in current))
+            index, fresh = index + 1, 0
+            current = current[-overlap_turns:] if overlap_turns else []
+            total = sum(size for _, size in current)
+            while current and total + tokens > max_tokens:
+                total -= current.pop(0)[1]
+        current.append((turn, tokens))
+        fresh, total = fresh + 1, total + tokens
+    if fresh:
+        yield Window(index=index, turns=tuple(item for item, _ in current))
+
+
+def iter_chunks(
+    turns: Iterable[Turn],
+    max_tokens: int,
+    average_turns: int = 8,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[Window]:
+    """
+    This function packs the turns into content-defined chunks lazily (without overlap).
+
+    A chunk ends after a turn whose hash is divisible by average_turns or when the next turn does not fit
+    into the token budget. The boundaries depend only on the turns around them, so an edited or appended turn
+    changes its own chunk (and rarely the next one) instead of shifting all the following chunks.
+
+    :param turns: The speaker turns.
+    :param max_tokens: The token budget of a chunk.
+    :param average_turns: The average number of turns per chunk (when the budget allows).
+    :param count_tokens: The function counting the tokens of a turn.
+    :return: The chunks.
+    """
+    index, total = 0, 0
+    current: list[Turn] = []
+    for turn in turns:
+        tokens = count_tokens(turn.text)
+        if current and total + tokens > max_tokens:
+            yield Window(index=index, turns=tuple(current))
+            index, total, current = index + 1, 0, []
+        current.append(turn)
+        total += tokens
+        if zlib.crc32(turn.text.encode("utf-8")) % average_turns == 0:
+            yield Window(index=index, turns=tuple(current))
+            index, total, current = index + 1, 0, []
+    if current:
+        yield Window(index=index, turns=tuple(current))
@@ -0,0 +1,96 @@
+import json
+import os
+
+import pytest
+
+from scrumit.batch import PARTIAL_SUFFIX, Job, Result, discover, run_batch, run_batch_sharded
+from scrumit.entity.scrumit import Output, TaskFailure, UserStory
+from scrumit.scrumer.base import ScrumerBase
+
+
+class LineScrumer(ScrumerBase):
+    """
+    One story per line, failing with an assertion (not a scrumit error) on the line "broken".
+    """
+
+    def convert(self, text):
+        return Output(stories=[])
+
+    def convert_stream(self, text, ordered=False, lines=()):
+        for line in lines:
+            if line.strip() == "broken":
+                raise AssertionError("unknown model")
+            yield UserStory(task=line.strip(), story=f"story: {line.strip()}")
+
+
+def line_scrumer() -> LineScrumer:
+    return LineScrumer()
+
+
+def broken_factory() -> LineScrumer:
+    raise RuntimeError("no API key")
+
+
+def make_jobs() -> list[Job]:
+    texts = ["first\nsecond", "third", "broken", "fourth\nbroken", "fifth", "sixth"]
+    return [Job(name=f"t{index}", domain="software", text=text) for index, text in enumerate(texts, 1)]
+
+
+def check_results(results, output_dir: str):
+    by_name = {result.job.name: result for result in results}
+    assert sorted(by_name) == ["t1", "t2", "t3", "t4", "t5", "t6"]
+    assert {name for name, result in by_name.items() if result.error} == {"t3", "t4"}
+    assert by_name["t3"].error == "unknown model"
+    assert (by_name["t1"].stories, by_name["t6"].stories) == (2, 1)
+    assert sorted(os.listdir(output_dir)) == [f"t{index}.txt" for index in (1, 2, 5, 6)]
+    with open(os.path.join(output_dir, "t1.txt")) as file:
+        assert file.read() == "1) story: first\n2) story: second\n"
+
+
+def write_manifest(tmp_path, items: list[dict]) -> str:
+    path = tmp_path / "batch.jsonl"
+    path.write_text("\n".join(json.dumps(item) for item in items))
+    return str(path)
+
+
+def test_manifest_items_become_jobs(tmp_path):
+    (tmp_path / "first.txt").write_text("Alice: fix it")
+    path = write_manifest(
+        tmp_path, [{"id": "first", "source": "first.txt"}, {"id": "..second", "text": "Bob: ship it", "domain": "web"}]
+    )
+    jobs = discover(path, "software")
+    assert [(job.name, job.domain) for job in jobs] == [("first", "software"), ("..second", "web")]
+    assert jobs[0].source == str(tmp_path / "first.txt")
+
+
+@pytest.mark.parametrize("identifier", ["../../escaped", "nested/name", "back\\\\slash", "..", ".", ""])
+def test_manifest_ids_must_be_file_names(tmp_path, identifier):
+    path = write_manifest(tmp_path, [{"id": identifier, "text": "Alice: fix it"}])
+    with pytest.raises(ValueError, match="file name"):
+        discover(path, "software")
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_failing_transcript_does_not_abort_the_batch(tmp_path, workers):
+    output_dir = str(tmp_path / "stories")
+    check_results(list(run_batch(LineScrumer(), make_jobs(), output_dir, workers=workers)), output_dir)
+    assert not any(name.endswith(PARTIAL_SUFFIX) for name in os.listdir(output_dir))
+
+
+def test_result_record_round_trip():
+    job = make_jobs()[0]
+    result = Result(job=job, stories=2, failures=[TaskFailure(task="third", reason="boom")], error=None)
+    assert Result.from_record(job, result.to_record()) == result
+
+
+def test_sharded_batch_records_every_transcript(tmp_path):
+    output_dir = str(tmp_path / "stories")
+    results = list(run_batch_sharded(line_scrumer, make_jobs(), output_dir, processes=2, chunk_size=2))
+    check_results(results, output_dir)
+    rerun = list(run_batch_sharded(line_scrumer, make_jobs(), output_dir, processes=2, chunk_size=2))
+    assert sorted(result.job.name for result in rerun if result.skipped) == ["t1", "t2", "t5", "t6"]
+
+
+def test_sharded_batch_fails_the_transcripts_of_a_broken_process(tmp_path):
+    results = list(run_batch_sharded(broken_factory, make_jobs(), str(tmp_path), processes=2, chunk_size=4))
+    assert sorted(result.job.name for result in results if result.error) == ["t1", "t2", "t3", "t4", "t5", "t6"]
@@ -0,0 +1,81 @@
+import pytest
+
+from scrumit.cache import MemoryCache, SQLiteCache, TieredCache, make_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("scrumit.cache.time.monotonic", lambda: now[0])
+    monkeypatch.setattr("scrumit.cache.time.time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=60, max_entries=3)
+    yield cache
+    cache.close()
+
+
+def test_key_ignores_the_order_of_the_parameters():
+    assert make_key(prompt="p", n=1) == make_key(n=1, prompt="p")
+    assert make_key(prompt="p", n=1) != make_key(prompt="p", n=2)
+
+
+def test_memory_entries_expire(clock):
+    cache = MemoryCache(ttl=60)
+    cache.set("key", "value")
+    clock[0] += 59
+    assert cache.get("key") == "value"
+    clock[0] += 2
+    assert cache.get("key") is None
+
+
+def test_memory_evicts_the_least_recently_used(clock):
+    cache = MemoryCache(max_entries=2)
+    cache.set("first", 1)
+    cache.set("second", 2)
+    assert cache.get("first") == 1
+    cache.set("third", 3)
+    assert (cache.get("first"), cache.get("second"), cache.get("third")) == (1, None, 3)
+
+
+def test_sqlite_entries_expire(clock, sqlite_cache):
+    sqlite_cache.set("key", {"story": "value"})
+    clock[0] += 59
+    assert sqlite_cache.get("key") == {"story": "value"}
+    clock[0] += 2
+    assert sqlite_cache.get("key") is None
+
+
+def test_sqlite_evicts_the_expired_and_the_least_recently_used(clock, sqlite_cache, monkeypatch):
+    monkeypatch.setattr(SQLiteCache, "EVICT_EVERY", 1)
+    sqlite_cache.set("stale", 0)
+    clock[0] += 61
+    for index in range(3):
+        sqlite_cache.set(f"key {index}", index)
+        clock[0] += 1
+    assert sqlite_cache.get("key 0") == 0
+    clock[0] += 1
+    sqlite_cache.set("key 3", 3)
+    count = sqlite_cache._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    assert count == 3
+    assert [sqlite_cache.get(f"key {index}") for index in range(4)] == [0, None, 2, 3]
+
+
+def test_sqlite_is_shared_by_the_connections(clock, tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer, reader = SQLiteCache(path), SQLiteCache(path)
+    writer.set("key", [1, 2])
+    assert reader.get("key") == [1, 2]
+    writer.close()
+    reader.close()
+
+
+def test_tiered_promotes_the_disk_entries(clock, sqlite_cache):
+    memory = MemoryCache(ttl=60)
+    sqlite_cache.set("key", "value")
+    cache = TieredCache(memory, sqlite_cache)
+    assert cache.get("key") == "value"
+    assert memory.get("key") == "value"
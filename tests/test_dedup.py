@@ -0,0 +1,60 @@
+import random
+import string
+
+from scrumit.dedup import TaskDeduplicator, TaskIndex
+from scrumit.entity.recognizer import RecognizerTask
+
+TASKS = [
+    RecognizerTask(description="Fix chat delays", persona="user"),
+    RecognizerTask(description="Messages get delayed in the chat", persona="admins", deadline="Friday"),
+    RecognizerTask(description="Fix the login page", persona="user"),
+    RecognizerTask(description="Fix the chat layout", persona="user"),
+    RecognizerTask(description="The login page is broken", persona="user", deadline="ASAP"),
+    RecognizerTask(description="Add dark mode to the dashboard", persona="user"),
+    RecognizerTask(description="Dashboard should support a dark theme", persona="user"),
+    RecognizerTask(description="Update the documentation", persona="user"),
+]
+
+
+def distinct_words(count: int) -> list[list[str]]:
+    generator = random.Random(0)
+    return [["".join(generator.choices(string.ascii_lowercase, k=7)) for _ in range(3)] for _ in range(count)]
+
+
+def distinct_tasks(count: int) -> list[RecognizerTask]:
+    return [RecognizerTask(description=" ".join(words)) for words in distinct_words(count)]
+
+
+def test_duplicates_are_merged_into_the_representative():
+    clusters = TaskDeduplicator().cluster(TASKS)
+    assert [[task.description for task in cluster.members] for cluster in clusters] == [
+        ["Fix chat delays", "Messages get delayed in the chat"],
+        ["Fix the login page", "The login page is broken"],
+        ["Fix the chat layout"],
+        ["Add dark mode to the dashboard", "Dashboard should support a dark theme"],
+        ["Update the documentation"],
+    ]
+    chat = clusters[0].task
+    assert (chat.description, chat.persona, chat.deadline) == ("Messages get delayed in the chat", "admins", "Friday")
+    assert clusters[1].task.deadline == "ASAP"
+
+
+def test_distinct_tasks_stay_apart():
+    index = TaskIndex()
+    for task in distinct_tasks(50):
+        index.add(task)
+    assert index.clusters == 50
+
+
+def test_duplicates_are_found_at_scale():
+    index, tasks = TaskIndex(), distinct_tasks(1500)
+    labels = [index.add(task)[0] for task in tasks]
+    duplicates = [
+        RecognizerTask(description=f"Please {second} the {first} {third}")
+        for first, second, third in distinct_words(1500)
+    ]
+    assert [index.add(task) for task in duplicates] == [(label, False) for label in labels]
+    assert index.clusters == 1500
+    clusters = index.groups()
+    assert len(clusters) == 1500
+    assert all(len(cluster.members) == 2 for cluster in clusters)
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from scrumit.entity import recognizer as recognizer_entities
+from scrumit.entity.scrumit import Input
+from scrumit.incremental import IncrementalScrumer
+from scrumit.recognizer.base import RecognizerBase
+from scrumit.scrumer import Scrumer
+from tests.test_scrumit import CountingParaphraser
+
+TEXT = "\n".join(f"Alice: task number {index}" for index in range(40))
+
+
+class ChunkRecognizer(RecognizerBase):
+    """
+    One task per line, failing on the chunks with the given line.
+    """
+
+    def __init__(self, broken: str = None):
+        self.broken = broken
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def recognize(self, text, **kwargs):
+        with self._lock:
+            self.calls += 1
+        lines = [line.split(":", 1)[1].strip() for line in text.text.splitlines() if line.strip()]
+        if self.broken in lines:
+            raise ValueError("broken recognizer")
+        return recognizer_entities.RecognizerOutput(
+            tasks=[recognizer_entities.RecognizerTask(description=line) for line in lines]
+        )
+
+    async def arecognize(self, text, **kwargs):
+        return self.recognize(text, **kwargs)
+
+
+def make_scrumer(recognizer: RecognizerBase, state_path: str, max_workers: int) -> IncrementalScrumer:
+    scrumer = Scrumer(recognizer, CountingParaphraser(), max_workers=max_workers)
+    return IncrementalScrumer(scrumer, state_path, chunk_tokens=30, average_turns=4)
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_reruns_recognize_only_the_changed_chunks(tmp_path, max_workers):
+    state = str(tmp_path / "state.json")
+    recognizer = ChunkRecognizer()
+    output = make_scrumer(recognizer, state, max_workers).convert(Input(text=TEXT, domain="software"))
+    chunks = recognizer.calls
+    assert chunks > 2 and len(output.stories) == 40
+
+    recognizer = ChunkRecognizer()
+    text = TEXT.replace("task number 20", "task number twenty")
+    output = make_scrumer(recognizer, state, max_workers).convert(Input(text=text, domain="software"))
+    # the edited turn changes its own chunk and rarely the next one
+    assert recognizer.calls <= 2 < chunks
+    assert [story.story for story in output.stories].count("story: task number twenty") == 1
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_recognized_chunks_are_saved_when_the_conversion_fails(tmp_path, max_workers):
+    state = str(tmp_path / "state.json")
+    with pytest.raises(ValueError, match="broken recognizer"):
+        make_scrumer(ChunkRecognizer(broken="task number 39"), state, max_workers).convert(
+            Input(text=TEXT, domain="software")
+        )
+    with open(state) as file:
+        assert json.load(file)["segments"]
+
+    recognizer = ChunkRecognizer()
+    output = make_scrumer(recognizer, state, max_workers).convert(Input(text=TEXT, domain="software"))
+    assert recognizer.calls == 1 and len(output.stories) == 40
+
+
+def test_async_recognized_chunks_are_saved_when_the_conversion_fails(tmp_path):
+    state = str(tmp_path / "state.json")
+    failing = make_scrumer(ChunkRecognizer(broken="task number 0"), state, 4)
+    with pytest.raises(ValueError, match="broken recognizer"):
+        asyncio.run(failing.aconvert(Input(text=TEXT, domain="software")))
+
+    recognizer = ChunkRecognizer()
+    output = asyncio.run(make_scrumer(recognizer, state, 4).aconvert(Input(text=TEXT, domain="software")))
+    assert recognizer.calls == 1 and len(output.stories) == 40
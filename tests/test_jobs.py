@@ -0,0 +1,126 @@
+import dataclasses
+import os
+import time
+
+from scrumit.batch import Job
+from scrumit.entity import recognizer as recognizer_entities
+from scrumit.jobs import RECOGNITION, JobQueue
+from scrumit.recognizer.base import RecognizerBase
+from scrumit.scrumer import Scrumer
+from tests.test_scrumit import CountingParaphraser, LineRecognizer
+
+TASKS = [recognizer_entities.RecognizerTask(description=f"Task {index}") for index in range(3)]
+
+
+def make_queue(tmp_path, **kwargs) -> JobQueue:
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), **kwargs)
+    queue.submit(
+        [Job(name="first", domain="software", text="Alice: fix it"), Job(name="second", domain="software", text="")]
+    )
+    return queue
+
+
+def test_submit_ignores_the_queued_transcripts(tmp_path):
+    queue = make_queue(tmp_path)
+    assert queue.submit([Job(name="first", domain="software", text="again")]) == 0
+    assert queue.progress().units == {"pending": 2}
+
+
+def test_recognition_is_claimed_alone_and_paraphrasing_first(tmp_path):
+    queue = make_queue(tmp_path)
+    [unit] = queue.claim("worker", limit=8)
+    assert unit.recognition and unit.job.name == "first"
+    queue.complete_recognition(unit, TASKS, [[] for _ in TASKS])
+    units = queue.claim("worker", limit=8)
+    assert [(unit.job.name, unit.position) for unit in units] == [("first", 0), ("first", 1), ("first", 2)]
+
+
+def test_failed_units_are_retried_independently(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2, retry_delay=0.0)
+    [unit] = queue.claim("worker")
+    queue.complete_recognition(unit, TASKS, [[] for _ in TASKS])
+    first, second, third = queue.claim("worker", limit=3)
+    assert not queue.complete_story(first, "story 0")
+    assert not queue.fail(second, "boom")
+    assert not queue.complete_story(third, "story 2")
+    [retried] = queue.claim("worker", limit=3)
+    assert (retried.position, retried.attempts) == (1, 2)
+    assert queue.fail(retried, "boom again")
+    stories, failures, error = queue.output("first")
+    assert [story.story for story in stories] == ["story 0", "story 2"]
+    assert [(failure.task, failure.reason) for failure in failures] == [("Task 1", "boom again")]
+    assert error is None
+    assert queue.unwritten() == ["first"]
+
+
+def test_expired_leases_are_claimed_again_and_finish_the_transcript(tmp_path):
+    queue = make_queue(tmp_path, lease=0.01, max_attempts=2)
+    [unit] = queue.claim("dead")
+    time.sleep(0.02)
+    [again] = queue.claim("alive")
+    assert (again.job.name, again.position, again.attempts) == (unit.job.name, RECOGNITION, 2)
+    time.sleep(0.02)
+    # the second lease expires at max_attempts, the unit fails for good and its transcript is finished
+    queue.claim("alive")
+    assert queue.progress().jobs["failed"] == 1
+
+
+def test_transcript_is_done_only_once_its_output_is_written(tmp_path):
+    from scrumit.jobs import Worker
+
+    queue = make_queue(tmp_path)
+    [unit] = queue.claim("worker")
+    assert queue.complete_recognition(unit, [], [])
+    assert queue.unwritten() == ["first"]
+    assert not queue.progress().finished
+    worker = Worker(None, queue, str(tmp_path / "out"))
+    os.makedirs(worker.output_dir)
+    worker.write_output("first")
+    assert queue.unwritten() == []
+    assert os.path.exists(tmp_path / "out" / "first.txt")
+    assert queue.progress().jobs["done"] == 1
+
+
+class UnknownModelRecognizer(RecognizerBase):
+    def recognize(self, text, **kwargs):
+        raise AssertionError("unknown model")
+
+
+class UnknownModelParaphraser(CountingParaphraser):
+    def paraphrase_batch(self, inputs, return_exceptions=False, **kwargs):
+        raise KeyError("choices")
+
+
+def test_worker_fails_the_units_on_any_error(tmp_path):
+    from scrumit.jobs import Worker
+
+    queue = make_queue(tmp_path, max_attempts=1)
+    worker = Worker(Scrumer(UnknownModelRecognizer(), CountingParaphraser()), queue, str(tmp_path / "out"))
+    assert sorted(worker.run(poll_interval=0)) == ["first", "second"]
+    assert queue.progress().jobs == {"failed": 2}
+    assert queue.output("first")[2] == "unknown model"
+
+    (tmp_path / "paraphrasing").mkdir()
+    queue = make_queue(tmp_path / "paraphrasing", max_attempts=1)
+    [unit] = queue.claim("worker")
+    queue.complete_recognition(unit, TASKS, [[] for _ in TASKS])
+    worker = Worker(Scrumer(LineRecognizer(), UnknownModelParaphraser()), queue, str(tmp_path / "out"))
+    worker.run(poll_interval=0)
+    stories, failures, _ = queue.output("first")
+    assert stories == [] and [failure.reason for failure in failures] == ["'choices'"] * 3
+
+
+def test_late_worker_does_not_overwrite_a_reclaimed_unit(tmp_path):
+    queue = make_queue(tmp_path, lease=0.01, max_attempts=5)
+    [unit] = queue.claim("slow")
+    time.sleep(0.02)
+    [again] = queue.claim("fast")
+    assert not queue.fail(unit, "timeout upstream")
+    assert not queue.complete_recognition(unit, TASKS, [[] for _ in TASKS])
+    assert queue.progress().units == {"pending": 1, "running": 1}
+    queue.complete_recognition(again, TASKS[:1], [[]])
+    [story] = queue.claim("fast")
+    assert queue.complete_story(story, "story 0")
+    assert not queue.fail(story, "late failure")
+    assert not queue.complete_story(dataclasses.replace(story, worker="slow"), "late story")
+    assert queue.output("first")[0][0].story == "story 0"
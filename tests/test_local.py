@@ -0,0 +1,89 @@
+import asyncio
+
+import numpy as np
+
+from scrumit.entity import recognizer as entities
+from scrumit.recognizer.backends.local import ActionabilityModel, RecognizerLocal, training_data
+from scrumit.recognizer.base import RecognizerBase
+from scrumit.recognizer.cascade import CascadeRecognizer
+
+TEXT = """Alice: Hi everyone, good morning.
+Bob: We need to fix the login page for admins by Friday.
+Carol: The export is broken.
+Dan: Thanks, sounds good.
+Eve: Please update the docs for our customers before next week.
+Frank: I had a nice weekend with the family."""
+
+
+class RecordingRecognizer(RecognizerBase):
+    """
+    Recognizes "Fix the export" and records the texts it is asked about.
+    """
+
+    def __init__(self):
+        self.texts: list[str] = []
+
+    def recognize(self, text, **kwargs):
+        self.texts.append(text.text)
+        return entities.RecognizerOutput(tasks=[entities.RecognizerTask(description="Fix the export")])
+
+    async def arecognize(self, text, **kwargs):
+        return self.recognize(text, **kwargs)
+
+
+def local_recognizer() -> RecognizerLocal:
+    # the priors only, so the scores do not depend on the example files
+    return RecognizerLocal(include_default_examples=False, combine_ud_examples=False)
+
+
+def test_local_tasks_with_deadline_and_persona():
+    tasks = local_recognizer().recognize(entities.RecognizerInput(text=TEXT, domain="software")).tasks
+    assert [(task.description, task.persona, task.deadline) for task in tasks] == [
+        ("Fix the login page for admins", "admins", "Friday"),
+        ("Update the docs for our customers", "customers", "next week"),
+    ]
+    assert TEXT[tasks[0].start : tasks[0].end] == "We need to fix the login page for admins by Friday."
+
+
+def test_cascade_asks_only_about_the_uncertain_sentences():
+    wrapped = RecordingRecognizer()
+    cascade = CascadeRecognizer(wrapped, local_recognizer(), accept=0.8, reject=0.2)
+    tasks = cascade.recognize(entities.RecognizerInput(text=TEXT, domain="software")).tasks
+    assert wrapped.texts == ["The export is broken."]
+    assert [task.description for task in tasks] == [
+        "Fix the login page for admins",
+        "Update the docs for our customers",
+        "Fix the export",
+    ]
+    assert TEXT[tasks[-1].start : tasks[-1].end] == "The export is broken."
+
+
+def test_cascade_without_uncertain_sentences_makes_no_call():
+    wrapped = RecordingRecognizer()
+    cascade = CascadeRecognizer(wrapped, local_recognizer(), accept=0.8, reject=0.2)
+    text = "Alice: Thanks, sounds good.\nBob: Please fix the login page by Friday."
+    output = asyncio.run(cascade.arecognize(entities.RecognizerInput(text=text, domain="software")))
+    assert wrapped.texts == []
+    assert [task.description for task in output.tasks] == ["Fix the login page"]
+
+
+def test_training_data_labels_the_task_sentence():
+    example = entities.RecognizerExample(
+        raw="Hello all. The export of the reports fails for admins. Please fix it ASAP. Nice weather today.",
+        task="Fix the export of the reports",
+    )
+    texts, labels = training_data([example])
+    assert list(zip(texts, labels)) == [
+        ("Hello all.", 0),
+        ("The export of the reports fails for admins.", 1),
+        ("Nice weather today.", 0),
+    ]
+
+
+def test_sparse_scores_match_the_dense_features():
+    model = ActionabilityModel().fit(*training_data([entities.RecognizerExample(raw="Fix the export.", task="Fix")]))
+    texts = ["We need to fix the login page.", "Thanks!", "The export is broken for admins."]
+    rows, columns = model.hashes(texts)
+    dense = np.zeros((len(texts), model.dimensions))
+    np.add.at(dense, (rows, columns), 1.0)
+    assert np.allclose(model.predict(texts), 1.0 / (1.0 + np.exp(-(dense @ model.weights))))
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import pytest
+
+from scrumit.cache import MemoryCache
+from scrumit.entity.paraphraser import ParaphraserInput
+from scrumit.paraphraser.backends.openai import ParaphraserOpenAI
+from scrumit.paraphraser.stream import StoryStream
+
+STORY = "As a user, I want e.g. dark mode. So that my eyes rest at night, i.e. later. As an admin, I want more."
+
+
+class StreamingClient:
+    def __init__(self, text: str = STORY):
+        self.text = text
+        self.calls: list[bool] = []
+        self.n: list[int] = []
+
+    def create(self, stream: bool = False, n: int = 1, **kwargs):
+        self.calls.append(stream)
+        self.n.append(n)
+        if stream:
+            return ({"choices": [{"text": self.text[index : index + 4]}]} for index in range(0, len(self.text), 4))
+        return SimpleNamespace(choices=[SimpleNamespace(text=self.text)])
+
+
+def assemble(story: StoryStream, text: str, step: int) -> str:
+    pieces = []
+    for index in range(0, len(text), step):
+        pieces.append(story.add(text[index : index + step]))
+        if story.complete:
+            break
+    return "".join(pieces) + story.flush()
+
+
+@pytest.mark.parametrize("step", [1, 3, 7])
+def test_story_is_cut_at_the_end_of_the_template(step):
+    story = StoryStream()
+    assert (
+        assemble(story, "  " + STORY, step)
+        == "As a user, I want e.g. dark mode. So that my eyes rest at night, i.e. later."
+    )
+    assert story.complete
+
+
+@pytest.mark.parametrize("step", [1, 2, 5])
+def test_story_is_cut_at_the_stop_sequence(step):
+    story = StoryStream(stop_when_complete=False, stop=["###", "\n\n"])
+    assert assemble(story, "As a user, I want it###As a", step) == "As a user, I want it"
+
+
+def test_story_without_the_template_is_not_cut():
+    assert assemble(StoryStream(), "The user wants dark mode. Really.", 3) == "The user wants dark mode. Really."
+
+
+def test_streamed_stories_are_cached_apart_from_the_full_completions():
+    client = StreamingClient()
+    paraphraser = ParaphraserOpenAI(client, cache=MemoryCache())
+    inp = ParaphraserInput(text="dark mode", examples=[])
+    cut = "".join(paraphraser.paraphrase_stream(inp))
+    assert cut == "As a user, I want e.g. dark mode. So that my eyes rest at night, i.e. later."
+    assert paraphraser.paraphrase(inp).user_story == STORY
+    assert "".join(paraphraser.paraphrase_stream(inp, stop_when_complete=False)) == STORY
+    assert "".join(paraphraser.paraphrase_stream(inp)) == cut
+    assert client.calls == [True, False, True]
+
+
+class CandidatesClient:
+    def __init__(self, texts: list[str]):
+        self.texts = texts
+        self.calls = 0
+
+    def create(self, n: int = 1, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(text=text) for text in self.texts[:n]])
+
+
+def test_candidates_are_returned_with_the_cache_enabled():
+    client = CandidatesClient(["Dark mode.", "As a user, I want dark mode so that my eyes rest at night."])
+    paraphraser = ParaphraserOpenAI(client, cache=MemoryCache(), candidates=2)
+    inp = ParaphraserInput(text="dark mode", examples=[])
+    for _ in range(2):
+        output = paraphraser.paraphrase(inp, return_candidates=True)
+        assert [candidate.user_story for candidate in output.candidates] == client.texts[::-1]
+    assert client.calls == 2
+    assert paraphraser.paraphrase(inp).user_story == client.texts[1]
+    assert client.calls == 2
+
+
+def test_streamed_requests_generate_a_single_completion():
+    client = StreamingClient()
+    paraphraser = ParaphraserOpenAI(client, candidates=3)
+    "".join(paraphraser.paraphrase_stream(ParaphraserInput(text="dark mode", examples=[])))
+    paraphraser.paraphrase(ParaphraserInput(text="dark mode", examples=[]))
+    assert client.n == [1, 3]
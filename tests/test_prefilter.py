@@ -0,0 +1,69 @@
+import asyncio
+
+from scrumit.entity import recognizer as entities
+from scrumit.recognizer.base import RecognizerBase
+from scrumit.recognizer.prefilter import PrefilterRecognizer
+from tests.test_local import local_recognizer
+
+TEXT = """Alice: Hi everyone, good morning.
+Bob: The export crashes on large reports.
+Carol: Thanks, sounds good.
+Dan: Please fix it before Friday.
+Eve: Great, bye."""
+
+
+class TurnRecognizer(RecognizerBase):
+    """
+    One task per line (without the speaker), recording the texts it is asked about.
+    """
+
+    def __init__(self):
+        self.texts: list[str] = []
+
+    def recognize(self, text, **kwargs):
+        self.texts.append(text.text)
+        lines = [line.split(": ", 1)[-1] for line in text.text.splitlines() if line.strip()]
+        return entities.RecognizerOutput(tasks=[entities.RecognizerTask(description=line) for line in lines])
+
+    async def arecognize(self, text, **kwargs):
+        return self.recognize(text, **kwargs)
+
+
+def prefilter(wrapped: RecognizerBase, **kwargs) -> PrefilterRecognizer:
+    return PrefilterRecognizer(wrapped, local_recognizer(), **kwargs)
+
+
+def test_small_talk_turns_are_dropped():
+    wrapped = TurnRecognizer()
+    prefilter(wrapped).recognize(entities.RecognizerInput(text=TEXT, domain="software"))
+    assert wrapped.texts == ["Bob: The export crashes on large reports.\nDan: Please fix it before Friday."]
+
+
+def test_context_turns_are_forwarded_before_an_actionable_turn():
+    wrapped = TurnRecognizer()
+    text = "Bob: The export looks odd on large reports.\nCarol: Thanks.\nDan: Please fix it before Friday."
+    prefilter(wrapped, threshold=0.5, context_turns=1).recognize(entities.RecognizerInput(text=text, domain="web"))
+    assert wrapped.texts == ["Carol: Thanks.\nDan: Please fix it before Friday."]
+    wrapped.texts.clear()
+    prefilter(wrapped, threshold=0.5, context_turns=2).recognize(entities.RecognizerInput(text=text, domain="web"))
+    assert wrapped.texts == [text]
+
+
+def test_wrapped_recognizer_is_not_called_without_actionable_turns():
+    wrapped = TurnRecognizer()
+    text = "Alice: Hi everyone, good morning.\nCarol: Thanks, sounds good."
+    recognizer = prefilter(wrapped)
+    assert recognizer.recognize(entities.RecognizerInput(text=text, domain="software")).tasks == []
+    assert asyncio.run(recognizer.arecognize(entities.RecognizerInput(text=text, domain="software"))).tasks == []
+    assert list(recognizer.recognize_stream(text.splitlines(keepends=True), "software")) == []
+    assert wrapped.texts == []
+
+
+def test_tasks_are_traced_to_the_source_turns():
+    tasks = prefilter(TurnRecognizer()).recognize(entities.RecognizerInput(text=TEXT, domain="software")).tasks
+    assert [TEXT[task.start : task.end] for task in tasks] == [
+        "Bob: The export crashes on large reports.",
+        "Dan: Please fix it before Friday.",
+    ]
+    streamed = list(prefilter(TurnRecognizer()).recognize_stream(TEXT.splitlines(keepends=True), "software"))
+    assert [(task.start, task.end) for task in streamed] == [(task.start, task.end) for task in tasks]
@@ -0,0 +1,53 @@
+import pytest
+
+from scrumit.recognizer.parser import TaskParser, parse_tasks
+
+
+def described(tasks) -> list[tuple]:
+    return [(task.description, task.persona, task.deadline) for task in tasks]
+
+
+def test_json_tasks_with_prose_around():
+    completion = (
+        'Here are the tasks:\n[{"Task": "Fix the login", "Persona": "user", "Deadline": "Friday"},'
+        ' {"Deadline": null, "Task": "Add dark mode"}]\nHope it helps!'
+    )
+    assert described(parse_tasks(completion)) == [("Fix the login", "user", "Friday"), ("Add dark mode", "user", None)]
+
+
+def test_python_literals_with_apostrophes():
+    completion = "[{'Task': 'Fix Bob's login page', 'Persona': 'None'}, {'task': 'Ship it', 'persona': 'admin'}]"
+    assert described(parse_tasks(completion)) == [("Fix Bob's login page", "user", None), ("Ship it", "admin", None)]
+
+
+def test_json_lines_and_escapes():
+    completion = '{"Task": "Say \\"hi\\"\\u0021"}\n{"Task": "Line\\nbreak"}\n{"Persona": "no task"}'
+    assert described(parse_tasks(completion)) == [('Say "hi"!', "user", None), ("Line\nbreak", "user", None)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 7])
+def test_chunked_feed_matches_the_whole_completion(size):
+    completion = "[{'Task': 'Fix Bob's login', 'Deadline': 'ASAP'}, {\"Task\": \"Add, then ship: it\"}]"
+    chunks = [completion[index : index + size] for index in range(0, len(completion), size)]
+    assert described(parse_tasks(chunks)) == described(parse_tasks(completion))
+    assert described(parse_tasks(completion)) == [
+        ("Fix Bob's login", "user", "ASAP"),
+        ("Add, then ship: it", "user", None),
+    ]
+
+
+def test_tasks_are_emitted_as_soon_as_their_object_closes():
+    parser = TaskParser()
+    assert parser.feed('[{"Task": "First"') == []
+    assert described(parser.feed('}, {"Task": "Sec')) == [("First", "user", None)]
+    assert parser.feed('ond"') == []
+    assert parser.close() == []
+
+
+def test_missing_and_empty_fields_keep_the_defaults():
+    completion = "[{'Task': 'Fix it', 'Persona': 'N/A', 'Deadline': ''}, {'Task': 'null'}, {'Persona': 'admin'}]"
+    assert described(parse_tasks(completion)) == [("Fix it", "user", None)]
+
+
+def test_unclosed_objects_are_dropped():
+    assert described(parse_tasks('[{"Task": "Done"}, {"Task": "Cut off')) == [("Done", "user", None)]
@@ -0,0 +1,42 @@
+import pytest
+
+from scrumit.paraphraser.rerank import StoryReranker
+
+SOURCE = "Add dark mode to the dashboard"
+STORY = "As a user, I want dark mode on the dashboard so that my eyes rest at night."
+
+
+@pytest.mark.parametrize(
+    "story, score",
+    [
+        (STORY, 1.0),
+        ("as an admin i would like to export the reports, so the auditors are happy", 1.0),
+        ("As an admin I need exports", 0.5),
+        ("Dark mode for the dashboard", 0.0),
+    ],
+)
+def test_template_score(story, score):
+    assert StoryReranker.template_score(story) == score
+
+
+@pytest.mark.parametrize("words, score", [(3, 0.3), (10, 1.0), (45, 1.0), (60, 2 / 3), (100, 0.0)])
+def test_length_score(words, score):
+    assert StoryReranker().length_score(" ".join(["word"] * words)) == pytest.approx(score)
+
+
+def test_overlap_score_counts_the_content_words_of_the_source():
+    assert StoryReranker.overlap_score("As a user, I want dark mode", SOURCE) == 0.5
+    assert StoryReranker.overlap_score(STORY, SOURCE) == 0.75
+    assert StoryReranker.overlap_score("anything", "to the") == 1.0
+
+
+def test_rank_puts_the_best_first():
+    candidates = StoryReranker().rank(["Dark mode.", STORY, "As a user, I want dark mode"], SOURCE)
+    assert [candidate.user_story for candidate in candidates] == [STORY, "As a user, I want dark mode", "Dark mode."]
+    assert candidates[0].score == pytest.approx(0.5 + 0.2 + 0.3 * 0.75)
+
+
+def test_rank_keeps_the_earlier_candidate_on_ties_and_drops_duplicates():
+    candidates = StoryReranker().rank(["", "first story here", " first story here ", "second story here"], "story")
+    assert [candidate.user_story for candidate in candidates] == ["first story here", "second story here"]
+    assert candidates[0].score == candidates[1].score
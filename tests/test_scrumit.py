@@ -0,0 +1,97 @@
+import asyncio
+import threading
+
+import pytest
+
+from scrumit.entity import paraphraser as paraphraser_entities, recognizer as recognizer_entities
+from scrumit.entity.scrumit import Input, UserStory
+from scrumit.paraphraser.base import ParaphraserBase
+from scrumit.recognizer.base import RecognizerBase
+from scrumit.scrumer import Scrumer
+
+
+class LineRecognizer(RecognizerBase):
+    """
+    One task per non-empty line, optionally failing after the given number of tasks.
+    """
+
+    def __init__(self, fail_after: int = None):
+        self.fail_after = fail_after
+
+    def recognize(self, text, **kwargs):
+        return recognizer_entities.RecognizerOutput(tasks=list(self.recognize_stream(text.text.splitlines(), "")))
+
+    def recognize_stream(self, lines, domain, examples=None, **kwargs):
+        for index, line in enumerate(line for line in lines if line.strip()):
+            if self.fail_after is not None and index == self.fail_after:
+                raise ValueError("broken recognizer")
+            yield recognizer_entities.RecognizerTask(description=line.strip())
+
+
+class CountingParaphraser(ParaphraserBase):
+    """
+    Paraphrases every text to "story: <text>" and records the sizes of the batches.
+    """
+
+    def __init__(self):
+        self.batches: list[int] = []
+        self._lock = threading.Lock()
+
+    def paraphrase(self, inp, **kwargs):
+        return paraphraser_entities.ParaphraserOutput(user_story=f"story: {inp.text}")
+
+    def paraphrase_batch(self, inputs, return_exceptions=False, **kwargs):
+        with self._lock:
+            self.batches.append(len(inputs))
+        return super().paraphrase_batch(inputs, return_exceptions, **kwargs)
+
+    async def aparaphrase_batch(self, inputs, return_exceptions=False, **kwargs):
+        return self.paraphrase_batch(inputs, return_exceptions, **kwargs)
+
+
+TEXT = "\n".join(f"Task number {index}" for index in range(10))
+
+
+def test_convert_stream_raises_producer_errors():
+    scrumer = Scrumer(LineRecognizer(fail_after=3), CountingParaphraser())
+    with pytest.raises(ValueError, match="broken recognizer"):
+        list(scrumer.convert_stream(Input(text=TEXT, domain="software")))
+
+
+def test_aconvert_stream_raises_producer_errors():
+    scrumer = Scrumer(LineRecognizer(fail_after=3), CountingParaphraser())
+
+    async def collect():
+        return [item async for item in scrumer.aconvert_stream(Input(text=TEXT, domain="software"))]
+
+    with pytest.raises(ValueError, match="broken recognizer"):
+        asyncio.run(asyncio.wait_for(collect(), timeout=10))
+
+
+def test_convert_stream_emits_all_stories_in_order():
+    scrumer = Scrumer(LineRecognizer(), CountingParaphraser())
+    stories = list(scrumer.convert_stream(Input(text=TEXT, domain="software"), ordered=True))
+    assert all(isinstance(story, UserStory) for story in stories)
+    assert [story.story for story in stories] == [f"story: Task number {index}" for index in range(10)]
+
+
+def test_convert_stream_packs_the_ready_tasks():
+    paraphraser = CountingParaphraser()
+    scrumer = Scrumer(LineRecognizer(), paraphraser, batch_size=4)
+    stories = list(scrumer.convert_stream(Input(text=TEXT, domain="software")))
+    assert len(stories) == 10
+    assert sum(paraphraser.batches) == 10
+    assert max(paraphraser.batches) == 4
+    assert len(paraphraser.batches) == 3
+
+
+def test_aconvert_stream_packs_the_ready_tasks():
+    paraphraser = CountingParaphraser()
+    scrumer = Scrumer(LineRecognizer(), paraphraser, batch_size=4)
+
+    async def collect():
+        return [item async for item in scrumer.aconvert_stream(Input(text=TEXT, domain="software"), ordered=True)]
+
+    stories = asyncio.run(collect())
+    assert [story.story for story in stories] == [f"story: Task number {index}" for index in range(10)]
+    assert paraphraser.batches == [4, 4, 2]
@@ -0,0 +1,101 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from scrumit.entity.scrumit import Input, Output, UserStory
+from scrumit.scrumer.base import ScrumerBase
+from scrumit.server import create_app
+
+
+class EchoScrumer(ScrumerBase):
+    """
+    One story per input, recording the warmed up domains.
+    """
+
+    def __init__(self):
+        self.domains: list[str] = []
+        self.closed = False
+
+    def warm_up(self, domains):
+        self.domains.extend(domains)
+
+    def convert(self, inp: Input) -> Output:
+        return Output(stories=[UserStory(task=inp.text, story=f"story: {inp.text}")])
+
+    async def aconvert(self, inp: Input) -> Output:
+        return self.convert(inp)
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_backends_are_warmed_up_on_startup_and_closed_on_cleanup():
+    scrumer = EchoScrumer()
+
+    async def run():
+        async with TestClient(TestServer(create_app(scrumer, workers=2, domains=["software", "web"]))) as client:
+            assert scrumer.domains == ["software", "web"]
+            response = await client.post("/convert", data=Input(text="Fix it", domain="software").json())
+            assert response.status == 200
+            assert Output.parse_raw(await response.text()).stories[0].story == "story: Fix it"
+            assert (await (await client.get("/health")).json())["status"] == "ok"
+
+    asyncio.run(run())
+    assert scrumer.closed
+
+
+class BlockingScrumer(EchoScrumer):
+    """
+    Holds every conversion until released, counting the upstream calls.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def aconvert(self, inp: Input) -> Output:
+        self.calls += 1
+        await self.release.wait()
+        return self.convert(inp)
+
+
+async def wait_for_calls(scrumer: BlockingScrumer, calls: int):
+    while scrumer.calls < calls:
+        await asyncio.sleep(0.001)
+
+
+def test_identical_requests_share_one_conversion():
+    scrumer = BlockingScrumer()
+
+    async def run():
+        async with TestClient(TestServer(create_app(scrumer, workers=4))) as client:
+            data = Input(text="Fix it", domain="software").json()
+            requests = [asyncio.create_task(client.post("/convert", data=data)) for _ in range(5)]
+            await asyncio.wait_for(wait_for_calls(scrumer, 1), timeout=5)
+            await asyncio.sleep(0.05)
+            scrumer.release.set()
+            responses = await asyncio.gather(*requests)
+            assert [response.status for response in responses] == [200] * 5
+            assert scrumer.calls == 1
+            assert (await (await client.get("/health")).json())["coalesced"] == 4
+
+    asyncio.run(run())
+
+
+def test_full_queue_rejects_the_request():
+    scrumer = BlockingScrumer()
+
+    async def run():
+        async with TestClient(TestServer(create_app(scrumer, workers=1, max_queue=1))) as client:
+            running = asyncio.create_task(client.post("/convert", data=Input(text="first", domain="web").json()))
+            await asyncio.wait_for(wait_for_calls(scrumer, 1), timeout=5)
+            queued = asyncio.create_task(client.post("/convert", data=Input(text="second", domain="web").json()))
+            while (await (await client.get("/health")).json())["pending"] < 1:
+                await asyncio.sleep(0.001)
+            rejected = await client.post("/convert", data=Input(text="third", domain="web").json())
+            assert rejected.status == 503 and rejected.headers["Retry-After"] == "1"
+            scrumer.release.set()
+            assert [(await running).status, (await queued).status] == [200, 200]
+
+    asyncio.run(run())